@@ -0,0 +1,244 @@
+import base64
+import json
+import os
+import threading
+
+import anyio
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+
+from app.agents.shared_state import SQLiteState, shared_state
+
+
+################### GRAPH RUN CHECKPOINTS #########################
+# ------------------------------------------------------ #
+# Optional. /generate and /evaluate then run the graph with this
+# checkpointer, keyed by the request's run id. LangGraph saves the state
+# after every step, plus the output of every task that finished in a step
+# that later failed (e.g. the sections that were written when one
+# generate_section call failed). A retried request with the same run id
+# resumes after the last completed node instead of starting over at START.
+#
+# Checkpoints live on a shared state backend (app/agents/shared_state.py):
+# a SQLite file at CHECKPOINT_DB_PATH, or SHARED_STATE_URL with
+# CHECKPOINTS_SHARED=true, so a retry that lands on another worker resumes
+# the run too. A run is claimed while it executes, so the same run id on
+# two workers at once is refused.
+#
+# Once a run succeeds, its response payload is kept and its checkpoints
+# are dropped. A retry after a lost response gets the same payload back
+# without a new run. Every key expires CHECKPOINT_TTL_SECONDS after the
+# run last wrote it.
+
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "")
+CHECKPOINTS_SHARED = os.getenv("CHECKPOINTS_SHARED", "false").lower() == "true"
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", "86400"))
+# A worker that dies mid-run holds its claim this long
+CHECKPOINT_RUN_LEASE_SECONDS = float(os.getenv("CHECKPOINT_RUN_LEASE_SECONDS", "900"))
+
+
+def _dump(serde, value):
+    value_type, blob = serde.dumps_typed(value)
+    return [value_type, base64.b64encode(blob).decode("ascii")]
+
+
+def _load(serde, pair):
+    value_type, blob = pair
+    return serde.loads_typed((value_type, base64.b64decode(blob)))
+
+
+class StateCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver on a shared state backend. Each checkpoint
+    is stored whole, channel values included; a run has a few dozen at
+    most. Keys, per run (thread) and checkpoint namespace:
+        checkpoint:{thread}:{ns}:{id}    the checkpoint, its metadata and parent
+        checkpoint-writes:{thread}:{ns}:{id}   task outputs saved against it
+        checkpoint-index:{thread}        [ns, id] of every checkpoint, oldest first
+    A run only ever executes on one worker at a time (see `claim`), so
+    read-modify-write of its keys needs no lock across workers.
+    """
+
+    def __init__(self, state, ttl_seconds=CHECKPOINT_TTL_SECONDS):
+        super().__init__()
+        self.state = state
+        self.ttl_seconds = ttl_seconds
+        self.resumed = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+
+    # ---- checkpoint saver interface ----
+
+    def _index(self, thread_id):
+        return json.loads(self.state.get(f"checkpoint-index:{thread_id}") or "[]")
+
+    def _tuple(self, thread_id, checkpoint_ns, checkpoint_id):
+        record, writes = self.state.get_many([
+            f"checkpoint:{thread_id}:{checkpoint_ns}:{checkpoint_id}",
+            f"checkpoint-writes:{thread_id}:{checkpoint_ns}:{checkpoint_id}",
+        ])
+        if record is None:
+            return None
+        record = json.loads(record)
+        writes = json.loads(writes or "[]")
+        writes.sort(key=lambda w: writes_sort_key(w[4], w[0], w[1]))
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=_load(self.serde, record["checkpoint"]),
+            metadata=_load(self.serde, record["metadata"]),
+            parent_config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": record["parent_id"],
+            }} if record["parent_id"] else None,
+            pending_writes=[
+                (task_id, channel, _load(self.serde, value))
+                for task_id, _, channel, value, _ in writes
+            ],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            # Checkpoint ids sort by time
+            ids = [cid for ns, cid in self._index(thread_id) if ns == checkpoint_ns]
+            if not ids:
+                return None
+            checkpoint_id = max(ids)
+        return self._tuple(thread_id, checkpoint_ns, checkpoint_id)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        # Listing needs a run: the backends can't enumerate keys
+        if not config:
+            return
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns")
+        checkpoint_id = get_checkpoint_id(config)
+        found = 0
+        for ns, cid in sorted(self._index(thread_id), key=lambda entry: entry[1], reverse=True):
+            if checkpoint_ns is not None and ns != checkpoint_ns:
+                continue
+            if checkpoint_id and cid != checkpoint_id:
+                continue
+            if before and get_checkpoint_id(before) and cid >= get_checkpoint_id(before):
+                continue
+            item = self._tuple(thread_id, ns, cid)
+            if item is None:
+                continue
+            if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield item
+            found += 1
+            if limit is not None and found >= limit:
+                break
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        record = {
+            "parent_id": config["configurable"].get("checkpoint_id"),
+            "checkpoint": _dump(self.serde, checkpoint),
+            "metadata": _dump(self.serde, get_checkpoint_metadata(config, metadata)),
+        }
+        with self._lock:
+            self.state.set(
+                f"checkpoint:{thread_id}:{checkpoint_ns}:{checkpoint['id']}", json.dumps(record), self.ttl_seconds
+            )
+            index = self._index(thread_id)
+            index.append([checkpoint_ns, checkpoint["id"]])
+            self.state.set(f"checkpoint-index:{thread_id}", json.dumps(index), self.ttl_seconds)
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        configurable = config["configurable"]
+        key = (
+            f"checkpoint-writes:{configurable['thread_id']}:"
+            f"{configurable.get('checkpoint_ns', '')}:{configurable['checkpoint_id']}"
+        )
+        # Parallel tasks of one step save their writes concurrently
+        with self._lock:
+            stored = {(w[0], w[1]): w for w in json.loads(self.state.get(key) or "[]")}
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                # Regular writes are kept from the first attempt; special ones (errors, interrupts) are replaced
+                if idx >= 0 and (task_id, idx) in stored:
+                    continue
+                stored[(task_id, idx)] = [task_id, idx, channel, _dump(self.serde, value), task_path]
+            self.state.set(key, json.dumps(list(stored.values())), self.ttl_seconds)
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            keys = [f"checkpoint-index:{thread_id}"]
+            for ns, cid in self._index(thread_id):
+                keys += [f"checkpoint:{thread_id}:{ns}:{cid}", f"checkpoint-writes:{thread_id}:{ns}:{cid}"]
+            self.state.delete(*keys)
+
+    # The graph runs on the event loop; the backends are called in a worker
+    # thread, so a slow shared backend doesn't stall the worker's other requests
+
+    async def aget_tuple(self, config):
+        return await anyio.to_thread.run_sync(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await anyio.to_thread.run_sync(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await anyio.to_thread.run_sync(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await anyio.to_thread.run_sync(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await anyio.to_thread.run_sync(self.delete_thread, thread_id)
+
+    # ---- runs ----
+
+    def claim(self, run_key):
+        """ Marks the run as executing here; False if it already is, on any worker """
+        return self.state.add(f"run-active:{run_key}", "1", CHECKPOINT_RUN_LEASE_SECONDS)
+
+    def release(self, run_key):
+        self.state.delete(f"run-active:{run_key}")
+
+    def finished_payload(self, run_key):
+        """ The response payload of a run that already succeeded, or None """
+        payload = self.state.get(f"run-result:{run_key}")
+        return json.loads(payload) if payload else None
+
+    def finish(self, run_key, payload):
+        """ Keeps the payload of a successful run and drops its checkpoints """
+        self.state.set(f"run-result:{run_key}", json.dumps(payload), self.ttl_seconds)
+        self.delete_thread(run_key)
+
+    def stats(self):
+        return {
+            "backend": self.state.name,
+            "resumed": self.resumed,
+            "replayed": self.replayed,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def build_checkpointer():
+    if CHECKPOINT_DB_PATH:
+        return StateCheckpointer(SQLiteState(CHECKPOINT_DB_PATH))
+    if CHECKPOINTS_SHARED:
+        return StateCheckpointer(shared_state)
+    return None
+
+
+checkpointer = build_checkpointer()
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from app.agents.llm_cache import prompt_text
+
+
+################### DETERMINISTIC FAKE CHAT MODEL #########################
+# ------------------------------------------------------ #
+# Offline stand-in for the provider clients, for load tests and profiling.
+# Enable it for every node with FAKE_LLM="true", or per node through model
+# routing ("fake:<any name>").
+#
+# It answers with schema-valid JSON for the response schema it was built
+# with (GeneratedState, GeneratedConfig, EvaluatorState). Content is
+# derived from the prompt, so the same prompt always gets the same answer.
+# Latency, failures and 429s are drawn from an RNG seeded with the prompt
+# and how many times that prompt was sent, so a run is reproducible
+# whatever the interleaving of concurrent calls. Each client counts the
+# prompts it was sent, keeping the most recent _MAX_TRACKED_PROMPTS.
+#
+# Streaming: it is a langchain chat model, so under `astream_events`
+# (/generate/stream) the reply arrives in chunks of _CHUNK_CHARS spread
+# over the generation time, like a provider's token stream.
+#
+# Malformed replies: FAKE_LLM_MALFORMED_RATE of the replies come back cut
+# off, or with the JSON of one item broken, to exercise reply repair.
+#
+# Refine-loop depth: every semantic rewrite tags a section "(revision n)".
+# The evaluator asks for another semantic_refine until the document has
+# reached FAKE_LLM_REFINE_DEPTH revisions.
+
+
+class FakeLLMConfig:
+    def __init__(self):
+        # Time to first token: lognormal around the median (sigma 0 = fixed)
+        self.latency_median = float(os.getenv("FAKE_LLM_LATENCY_MEDIAN", "0.5"))
+        self.latency_sigma = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.3"))
+        # Output generation speed, added on top of the first-token latency
+        self.tokens_per_second = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200"))
+        self.failure_rate = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+        self.rate_limit_rate = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+        self.malformed_rate = float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0"))
+        self.refine_depth = int(os.getenv("FAKE_LLM_REFINE_DEPTH", "1"))
+        self.section_words = int(os.getenv("FAKE_LLM_SECTION_WORDS", "150"))
+        # Sections drafted when the user gave none (dynamic generation)
+        self.default_sections = int(os.getenv("FAKE_LLM_DEFAULT_SECTIONS", "4"))
+        self.seed = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+
+fake_llm_config = FakeLLMConfig()
+
+
+class FakeLLMError(Exception):
+    """ Simulated provider failure """
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_WORDS = (
+    "the system document section report analysis result market growth risk plan team customer data "
+    "process quality review strategy cost value performance model design outcome scope timeline goal"
+).split()
+
+_JSON_TEMPLATE = re.compile(r'\{ "section_name": "(.+?)", "content": "\.\.\." \}')
+_NUMBERED = re.compile(r"^\d+\. (.+?)(?: \(CHANGED\)| :)", re.MULTILINE)
+_SAMPLE_SECTIONS = re.compile(r"## User Defined Sample Sections: \n\n(.*?)(?:\n\n[^\d\n]|\Z)", re.DOTALL)
+_REVISION = re.compile(r"\(revision (\d+)\)")
+_ITEM_TEXT = re.compile(r'"(?:content|issue)": "')
+
+_MAX_TRACKED_PROMPTS = 10_000
+_CHUNK_CHARS = 64
+
+
+def _text(seed, words):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _revision(text):
+    return max((int(n) for n in _REVISION.findall(text)), default=0)
+
+
+class FakeChatModel(BaseChatModel):
+    """ Takes the same constructor arguments as the provider clients in LLMRegistry """
+
+    model: str = "fake"
+    response_schema: Optional[dict] = None
+    config: Any = None
+
+    _sent: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, context):
+        super().model_post_init(context)
+        self.config = self.config or fake_llm_config
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    @property
+    def _schema_name(self):
+        return (self.response_schema or {}).get("title", "GeneratedState")
+
+    # ---- responses ----
+
+    def _sections(self, prompt):
+        match = _SAMPLE_SECTIONS.search(prompt)
+        names = _NUMBERED.findall(match.group(1)) if match else []
+        return names or [f"Section {i}" for i in range(1, self.config.default_sections + 1)]
+
+    def _section(self, name, revision):
+        content = _text(name, self.config.section_words)
+        return content + (f" (revision {revision})" if revision else "")
+
+    def _generated_state(self, prompt):
+        return {"generated_content": [{"section_name": name, "content": self._section(name, 0)} for name in self._sections(prompt)]}
+
+    def _generated_config(self, prompt):
+        names = _JSON_TEMPLATE.findall(prompt)
+        name = names[-1] if names else "Section"
+        # Rewrites (semantic_refine) bump the revision of the section they were given
+        revision = _revision(prompt) + 1 if "SEMANTIC FEEDBACK" in prompt else 0
+        return {"section_name": name, "content": self._section(name, revision)}
+
+    def _evaluation(self, prompt):
+        revision = _revision(prompt)
+        depth = self.config.refine_depth
+        if revision >= depth:
+            return {
+                "coherency_score": 0.9,
+                "semantic_issues": "None",
+                "structural_changes": "None",
+                "next_action": "no_action",
+                "evaluator_diagnostic_summary": f"Fake evaluation: done after {revision} revision(s).",
+            }
+        # Flag every section in the prompt; ones the document doesn't have are ignored by the graph
+        names = list(dict.fromkeys(_NUMBERED.findall(prompt)))
+        return {
+            "coherency_score": round(0.9 - 0.1 * (depth - revision), 3),
+            "semantic_issues": [
+                {"section_name": name, "issue": "Fake issue.", "suggestion": "Rewrite it."} for name in names
+            ],
+            "structural_changes": "None",
+            "next_action": "semantic_refine",
+            "evaluator_diagnostic_summary": f"Fake evaluation: revision {revision} of {depth}.",
+        }
+
+    def _respond(self, prompt):
+        if self._schema_name == "EvaluatorState":
+            return self._evaluation(prompt)
+        if self._schema_name == "GeneratedConfig":
+            return self._generated_config(prompt)
+        return self._generated_state(prompt)
+
+    # ---- timing and failures ----
+
+    def _damage(self, content, rng):
+        """ Breaks the JSON of one item's text, or cuts the reply off """
+        starts = [m.end() for m in _ITEM_TEXT.finditer(content)]
+        if starts and rng.random() < 0.5:
+            i = rng.choice(starts)
+            return content[:i] + '"' + content[i:]
+        return content[:int(len(content) * rng.uniform(0.3, 0.95))]
+
+    def _draw(self, messages):
+        """ (time to first token, error or None, response message) for one call """
+        # A plain string prompt arrives as one human message
+        prompt = messages[0].content if len(messages) == 1 else prompt_text(messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._sent.pop(digest, 0)
+            self._sent[digest] = attempt + 1
+            if len(self._sent) > _MAX_TRACKED_PROMPTS:
+                self._sent.popitem(last=False)
+        rng = random.Random(f"{self.config.seed}:{digest}:{attempt}")
+
+        ttft = self.config.latency_median * rng.lognormvariate(0, self.config.latency_sigma)
+        roll = rng.random()
+        if roll < self.config.rate_limit_rate:
+            return ttft, FakeLLMError("429 RESOURCE_EXHAUSTED (fake)", 429), None
+        if roll < self.config.rate_limit_rate + self.config.failure_rate:
+            return ttft, FakeLLMError("503 UNAVAILABLE (fake)", 503), None
+
+        content = json.dumps(self._respond(prompt))
+        if rng.random() < self.config.malformed_rate:
+            content = self._damage(content, rng)
+        input_tokens = len(prompt) // 4
+        output_tokens = len(content) // 4
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+        return ttft, None, message
+
+    def _generation_seconds(self, message):
+        return message.usage_metadata["output_tokens"] / self.config.tokens_per_second
+
+    # ---- BaseChatModel ----
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        ttft, error, message = self._draw(messages)
+        time.sleep(ttft)
+        if error:
+            raise error
+        time.sleep(self._generation_seconds(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        ttft, error, message = self._draw(messages)
+        await asyncio.sleep(ttft)
+        if error:
+            raise error
+        await asyncio.sleep(self._generation_seconds(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        ttft, error, message = self._draw(messages)
+        await asyncio.sleep(ttft)
+        if error:
+            raise error
+        content = message.content
+        starts = range(0, len(content), _CHUNK_CHARS)
+        delay = self._generation_seconds(message) / max(len(starts), 1)
+        for start in starts:
+            await asyncio.sleep(delay)
+            last = start + _CHUNK_CHARS >= len(content)
+            # Usage comes with the last chunk, as providers report it
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=content[start:start + _CHUNK_CHARS],
+                usage_metadata=message.usage_metadata if last else None,
+            ))
+
+    def reset(self):
+        """ Forget prompt counts, so a rerun draws the same latencies again """
+        with self._lock:
+            self._sent.clear()
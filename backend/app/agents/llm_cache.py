@@ -0,0 +1,172 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import anyio
+
+from app.agents.shared_state import shared_state
+
+
+################### LLM RESPONSE CACHE #########################
+# ------------------------------------------------------ #
+
+def prompt_text(prompt):
+    """ A prompt (string or chat messages) as one string """
+    if isinstance(prompt, str):
+        return prompt
+    return "\n\n".join(f"{message.type}: {message.content}" for message in prompt)
+
+
+def cache_key(model, temperature, schema_name, prompt):
+    """ Content address of one LLM call: the fully formatted prompt plus model settings """
+    digest = hashlib.sha256()
+    for part in (model, str(temperature), schema_name, prompt_text(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """ In-process LRU with entry-count and TTL eviction """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """ On-disk cache that survives restarts; expired rows are dropped lazily """
+
+    def __init__(self, path, ttl_seconds=3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT, stored_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+            self._conn.commit()
+
+
+class SharedCache:
+    """ Cache entries on the shared state backend, so each worker reuses every worker's responses """
+
+    def __init__(self, state, ttl_seconds=3600):
+        self.state = state
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        return self.state.get(f"llm-cache:{key}")
+
+    def set(self, key, value):
+        self.state.set(f"llm-cache:{key}", value, self.ttl_seconds)
+
+
+class ResponseCache:
+    """
+    Two-tier cache for raw LLM response content: the in-process LRU is
+    checked first, then the optional SQLite or shared backend (promoting hits).
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    # Called on the event loop: the in-process tier is read inline, the SQLite
+    # or shared tier in a worker thread, so a slow backend doesn't stall other requests
+
+    async def aget(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await anyio.to_thread.run_sync(self.disk.get, key)
+            if value is not None:
+                self.memory.set(key, value)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def aset(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await anyio.to_thread.run_sync(self.disk.set, key, value)
+
+    def stats(self):
+        return {
+            "entries": len(self.memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk": self.disk is not None,
+            "shared": isinstance(self.disk, SharedCache),
+        }
+
+
+def build_response_cache():
+    ttl = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    memory = LRUCache(int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")), ttl)
+    sqlite_path = os.getenv("LLM_CACHE_SQLITE_PATH")
+    disk = SQLiteCache(sqlite_path, ttl) if sqlite_path else None
+    if shared_state.shared:
+        # With several workers the shared backend is the second tier, LLM_CACHE_SQLITE_PATH or not
+        disk = SharedCache(shared_state, ttl)
+    return ResponseCache(memory, disk)
+
+
+# Temperature-0 nodes are deterministic enough to cache by default;
+# the evaluator (temperature 0.3) is opt-in via LLM_CACHE_EVALUATOR=true.
+CACHEABLE_NODES = {"generate_initial_draft", "generate_section", "semantic_refine", "structural_refine"}
+if os.getenv("LLM_CACHE_EVALUATOR", "false").lower() == "true":
+    CACHEABLE_NODES.add("evaluator")
+
+response_cache = build_response_cache()
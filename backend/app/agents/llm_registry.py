@@ -0,0 +1,114 @@
+import os
+import threading
+
+from app.agents.model_routing import parse_model
+
+
+################### LLM CLIENT REGISTRY #########################
+# ------------------------------------------------------ #
+
+def _google_client(**kwargs):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(**kwargs)
+
+
+def _vertexai_client(**kwargs):
+    from langchain_google_vertexai import ChatVertexAI
+    return ChatVertexAI(**kwargs)
+
+
+def _fake_client(**kwargs):
+    from app.agents.fake_llm import FakeChatModel
+    return FakeChatModel(**kwargs)
+
+
+def _groq_client(response_schema=None, response_mime_type=None, **kwargs):
+    # Groq has no response schema; JSON mode keeps the output parseable
+    # (the prompts already spell out the expected fields)
+    from langchain_groq import ChatGroq
+    return ChatGroq(model_kwargs={"response_format": {"type": "json_object"}}, **kwargs)
+
+
+# Provider SDKs are imported when their first client is built (by the
+# startup warm-up, or when routing selects them), not when the app starts
+_PROVIDER_FACTORIES = {
+    "google": _google_client,
+    "vertexai": _vertexai_client,
+    "groq": _groq_client,
+    "fake": _fake_client,
+}
+
+# Offline load tests: every node gets the deterministic fake model
+FAKE_LLM = os.getenv("FAKE_LLM", "false").lower() == "true"
+
+
+class LLMRegistry:
+    """
+    Process-wide cache of chat model clients keyed by
+    (model, temperature, response schema, timeout). `model` is a
+    "provider:model" string from model routing.
+
+    Clients are built once and shared by every node and request, so the
+    underlying HTTP connection pool, auth setup and serialized response
+    schema are reused across refine-loop iterations and requests.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory
+        self._clients = {}
+        self._schemas = {}
+        self._lock = threading.Lock()
+        self.built = 0
+        self.reused = 0
+
+    def set_factory(self, factory):
+        """ Swap the client constructor (e.g. for a stub) and drop cached clients """
+        with self._lock:
+            self._factory = factory
+            self._clients.clear()
+
+    def _schema_for(self, schema):
+        # Serialize each pydantic schema once instead of on every node call
+        if schema not in self._schemas:
+            self._schemas[schema] = schema.model_json_schema()
+        return self._schemas[schema]
+
+    def get(self, model, temperature, schema, timeout=None):
+        key = (model, temperature, schema, timeout)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.reused += 1
+                return client
+
+            provider, name = parse_model(model)
+            factory = self._factory or _PROVIDER_FACTORIES[provider]
+            client = factory(
+                model=name,
+                temperature=temperature,
+                max_tokens=None,
+                timeout=timeout,
+                # Retries and fallbacks are driven by ainvoke_llm so they can be counted
+                max_retries=0,
+                response_schema=self._schema_for(schema),
+                response_mime_type='application/json',
+            )
+            self._clients[key] = client
+            self.built += 1
+            return client
+
+    def stats(self):
+        return {
+            "clients": len(self._clients),
+            "built": self.built,
+            "reused": self.reused,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self.built = 0
+            self.reused = 0
+
+
+llm_registry = LLMRegistry(factory=_fake_client if FAKE_LLM else None)
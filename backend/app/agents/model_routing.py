@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+import time
+
+from app.agents.tracing import LLM_TRIAGE
+
+
+################### PER-NODE MODEL ROUTING #########################
+# ------------------------------------------------------ #
+# Which models each node calls, in fallback order. A model is written
+# "provider:model" (providers: google, vertexai, groq, fake); a bare name means
+# google. The first model is tried first; when a call fails, the next model
+# takes over right away, and only the last one is retried with backoff.
+# A model that fails LLM_CIRCUIT_FAILURES times in a row is moved to the
+# back of every chain for LLM_CIRCUIT_COOLDOWN_SECONDS, so a provider that
+# is down or timing out isn't paid for on every call.
+#
+# The evaluator can run a triage pass first: a small model scores the
+# document, and only scores inside the grey zone are re-scored by the
+# evaluator's own models.
+#
+# Configured by a JSON file (MODEL_ROUTING_FILE), then per-node env vars:
+#   LLM_MODELS_<NODE>="groq:llama-3.3-70b-versatile,google:gemini-2.5-flash"
+#   LLM_TRIAGE_MODELS="groq:llama-3.1-8b-instant"  LLM_TRIAGE_GREY_ZONE="0.6,0.85"
+#
+# {
+#   "nodes": {
+#     "semantic_refine": {"models": ["google:gemini-2.5-pro", "vertexai:gemini-2.5-pro"], "timeout": 90},
+#     "evaluator": {
+#       "models": ["google:gemini-2.5-pro"],
+#       "triage": {"models": ["groq:llama-3.1-8b-instant"], "grey_zone": [0.6, 0.85]}
+#     }
+#   },
+#   "prices": {"google:gemini-2.5-pro": {"input": 1.25, "output": 10.0}}
+# }
+
+PROVIDERS = ("google", "vertexai", "groq", "fake")
+NODES = ("generate_initial_draft", "generate_section", "evaluator", "semantic_refine", "structural_refine", "repair_section")
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+MODEL_ROUTING_FILE = os.getenv("MODEL_ROUTING_FILE", "")
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+# USD per 1M tokens (list prices); the routing file's "prices" override these
+DEFAULT_PRICES = {
+    "google:gemini-2.5-flash": {"input": 0.30, "output": 2.50},
+    "google:gemini-2.5-flash-lite": {"input": 0.10, "output": 0.40},
+    "google:gemini-2.5-pro": {"input": 1.25, "output": 10.0},
+    "vertexai:gemini-2.5-flash": {"input": 0.30, "output": 2.50},
+    "vertexai:gemini-2.5-pro": {"input": 1.25, "output": 10.0},
+    "groq:llama-3.1-8b-instant": {"input": 0.05, "output": 0.08},
+    "groq:llama-3.3-70b-versatile": {"input": 0.59, "output": 0.79},
+}
+
+
+class ModelRoutingError(Exception):
+    """ Invalid model routing configuration """
+
+
+def parse_model(model):
+    """ "provider:model" -> (provider, model); a bare name is a google model """
+    provider, sep, name = model.partition(":")
+    if not sep:
+        return "google", model
+    if provider not in PROVIDERS:
+        raise ModelRoutingError(f"Unknown LLM provider {provider!r} in {model!r}")
+    return provider, name
+
+
+def canonical_model(model):
+    """ "provider:model" for a model written either way, e.g. "gemini-2.5-flash" -> "google:gemini-2.5-flash" """
+    return "{}:{}".format(*parse_model(model))
+
+
+def _model_list(value):
+    models = value.split(",") if isinstance(value, str) else list(value)
+    models = [m.strip() for m in models if m.strip()]
+    for model in models:
+        parse_model(model)
+    return models
+
+
+def load_routing_config(path=MODEL_ROUTING_FILE, environ=os.environ):
+    """ Routing file (if any) with LLM_MODELS_<NODE> / LLM_TRIAGE_* env overrides applied """
+    config = {"nodes": {}, "prices": {}}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            config.update(json.load(f))
+
+    nodes = {node: dict(spec) for node, spec in config.get("nodes", {}).items()}
+    for node in NODES:
+        models = environ.get(f"LLM_MODELS_{node.upper()}")
+        if models:
+            nodes.setdefault(node, {})["models"] = models
+
+    triage_models = environ.get("LLM_TRIAGE_MODELS")
+    if triage_models:
+        evaluator = nodes.setdefault("evaluator", {})
+        evaluator["triage"] = {
+            **evaluator.get("triage", {}),
+            "models": triage_models,
+            "grey_zone": environ.get("LLM_TRIAGE_GREY_ZONE", "0.6,0.85"),
+        }
+    config["nodes"] = nodes
+    return config
+
+
+class _ModelStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.cost = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+
+class ModelRouter:
+    """
+    Fallback chains per node, circuit state per model, and latency/cost
+    per (node, model). Thread-safe; shared by every graph run.
+    """
+
+    def __init__(self, config=None):
+        self._lock = threading.Lock()
+        self.configure(config or {})
+
+    def configure(self, config):
+        """ Replaces the routing (a dict shaped like the routing file) and resets stats """
+        routes = {}
+        timeouts = {}
+        triage = None
+        for node, spec in config.get("nodes", {}).items():
+            if node not in NODES:
+                raise ModelRoutingError(f"Unknown node {node!r} in model routing")
+            if spec.get("models"):
+                routes[node] = _model_list(spec["models"])
+            if spec.get("timeout") is not None:
+                timeouts[node] = float(spec["timeout"])
+            if node == "evaluator" and spec.get("triage"):
+                triage = self._triage(spec["triage"])
+
+        prices = dict(DEFAULT_PRICES)
+        prices.update({canonical_model(m): p for m, p in config.get("prices", {}).items()})
+
+        with self._lock:
+            self._routes = routes
+            self._timeouts = timeouts
+            self._triage_route = triage
+            self._prices = prices
+            self._failures = {}  # model -> consecutive failures
+            self._open_until = {}  # model -> monotonic time the circuit closes
+            self._stats = {}
+            self._triage_counts = {"accepted": 0, "escalated": 0}
+
+    @staticmethod
+    def _triage(spec):
+        grey_zone = spec.get("grey_zone", (0.6, 0.85))
+        if isinstance(grey_zone, str):
+            grey_zone = grey_zone.split(",")
+        low, high = (float(x) for x in grey_zone)
+        if low > high:
+            raise ModelRoutingError(f"Triage grey zone {low}..{high} is empty")
+        return {"models": _model_list(spec["models"]), "grey_zone": (low, high), "timeout": spec.get("timeout")}
+
+    # ---- routing ----
+
+    def models(self, node):
+        """ Configured fallback chain for `node` (evaluator_triage is the triage pass) """
+        if node == "evaluator_triage":
+            return list(self._triage_route["models"])
+        return list(self._routes.get(node, [DEFAULT_MODEL]))
+
+    def chain(self, node):
+        """ `models(node)` with models whose circuit is open moved to the back """
+        models = self.models(node)
+        now = time.monotonic()
+        with self._lock:
+            healthy = [m for m in models if self._open_until.get(m, 0) <= now]
+        return healthy + [m for m in models if m not in healthy]
+
+    def timeout(self, node):
+        if node == "evaluator_triage":
+            return self._triage_route["timeout"]
+        return self._timeouts.get(node)
+
+    @property
+    def triage_enabled(self):
+        return self._triage_route is not None
+
+    def needs_escalation(self, score):
+        """ Triage scores inside the grey zone are re-scored by the evaluator's models """
+        low, high = self._triage_route["grey_zone"]
+        escalate = score is None or low <= score <= high
+        result = "escalated" if escalate else "accepted"
+        LLM_TRIAGE.inc(result=result)
+        with self._lock:
+            self._triage_counts[result] += 1
+        return escalate
+
+    # ---- accounting ----
+
+    def cost(self, model, usage):
+        price = self._prices.get(canonical_model(model))
+        if not price or not usage:
+            return 0.0
+        return (usage.get("input_tokens", 0) * price["input"] + usage.get("output_tokens", 0) * price["output"]) / 1e6
+
+    def _model_stats(self, node, model):
+        return self._stats.setdefault((node, model), _ModelStats())
+
+    def record_success(self, node, model, seconds, usage=None):
+        """ Closes the model's circuit and returns the call's cost in USD """
+        usage = usage or {}
+        cost = self.cost(model, usage)
+        with self._lock:
+            self._failures[model] = 0
+            self._open_until.pop(model, None)
+            stats = self._model_stats(node, model)
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.cost += cost
+            stats.prompt_tokens += usage.get("input_tokens", 0)
+            stats.completion_tokens += usage.get("output_tokens", 0)
+        return cost
+
+    def record_failure(self, node, model, seconds):
+        with self._lock:
+            stats = self._model_stats(node, model)
+            stats.failures += 1
+            stats.seconds += seconds
+            failures = self._failures.get(model, 0) + 1
+            self._failures[model] = failures
+            if failures >= LLM_CIRCUIT_FAILURES:
+                self._open_until[model] = time.monotonic() + LLM_CIRCUIT_COOLDOWN_SECONDS
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "routes": {node: self.models(node) for node in NODES},
+                "triage": None if self._triage_route is None else {
+                    "models": self._triage_route["models"],
+                    "grey_zone": list(self._triage_route["grey_zone"]),
+                    **self._triage_counts,
+                },
+                "open_circuits": [m for m, until in self._open_until.items() if until > now],
+                "calls": [
+                    {
+                        "node": node,
+                        "model": model,
+                        "calls": s.calls,
+                        "failures": s.failures,
+                        "mean_seconds": round(s.seconds / max(s.calls + s.failures, 1), 4),
+                        "prompt_tokens": s.prompt_tokens,
+                        "completion_tokens": s.completion_tokens,
+                        "cost_usd": round(s.cost, 6),
+                    }
+                    for (node, model), s in sorted(self._stats.items())
+                ],
+            }
+
+
+model_router = ModelRouter(load_routing_config())
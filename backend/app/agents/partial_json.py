@@ -0,0 +1,103 @@
+import json
+import re
+
+from pydantic import ValidationError
+
+
+################### INCREMENTAL JSON PARSING #########################
+# ------------------------------------------------------ #
+# LLM replies are one JSON object wrapping a list of items (generated
+# sections, semantic issues). One truncated or malformed item makes
+# json.loads reject the whole reply, and with it every other item.
+# scan_list reads the list item by item instead, validates each one
+# against its pydantic model as it is decoded, and reports which items
+# could not be read, so callers only re-request those.
+
+
+class PartialJSONError(Exception):
+    """ An LLM reply could not be read, even after repair """
+
+
+_decoder = json.JSONDecoder()
+_SECTION_NAME = re.compile(r'"section_name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# Start of the next item after a broken one: the end of an object, a comma, a new object with a key
+_NEXT_ITEM = re.compile(r'\}\s*,\s*(?=\{\s*")')
+
+
+class PartialList:
+    """ What scan_list could read from one JSON list """
+
+    def __init__(self):
+        self.items = []          # validated items, as dicts, in reply order
+        self.order = []          # section_name of every readable or broken item, in reply order
+        self.broken = []         # section_name of every item that failed to decode or validate
+        self.unreadable = 0      # broken items whose section_name couldn't be read either
+        self.found = False       # the key and the opening bracket were there
+        self.complete = False    # the closing bracket was reached
+
+
+def _skip(text, pos, chars):
+    while pos < len(text) and text[pos] in chars:
+        pos += 1
+    return pos
+
+
+def _book_broken(result, fragment):
+    match = _SECTION_NAME.search(fragment)
+    if match:
+        name = json.loads(f'"{match.group(1)}"')
+        result.broken.append(name)
+        result.order.append(name)
+    else:
+        result.unreadable += 1
+
+
+def scan_list(text, key, model):
+    """
+    Reads the list under `key` one item at a time. Items that decode and
+    pass `model` validation are kept; a broken item is skipped up to the
+    next item boundary, and reading carries on after it.
+    """
+    result = PartialList()
+    match = re.search(rf'"{re.escape(key)}"\s*:\s*\[', text)
+    if not match:
+        return result
+    result.found = True
+
+    pos = match.end()
+    while True:
+        pos = _skip(text, pos, " \t\r\n,")
+        if pos >= len(text):
+            break
+        if text[pos] == "]":
+            result.complete = True
+            break
+        try:
+            item, end = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            boundary = _NEXT_ITEM.search(text, pos)
+            end = boundary.end() if boundary else len(text)
+            _book_broken(result, text[pos:end])
+            pos = end
+            continue
+        try:
+            result.items.append(model.model_validate(item).model_dump())
+            result.order.append(result.items[-1].get("section_name"))
+        except ValidationError:
+            _book_broken(result, json.dumps(item) if isinstance(item, dict) else "")
+        pos = end
+    return result
+
+
+def scan_fields(text, names):
+    """ Top-level `names` whose values decode, even when the rest of the reply doesn't """
+    fields = {}
+    for name in names:
+        match = re.search(rf'"{re.escape(name)}"\s*:\s*', text)
+        if not match:
+            continue
+        try:
+            fields[name], _ = _decoder.raw_decode(text, match.end())
+        except json.JSONDecodeError:
+            pass
+    return fields
@@ -0,0 +1,386 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import anyio
+
+from app.agents.model_routing import canonical_model
+from app.agents.shared_state import shared_state
+
+
+################### PROCESS-WIDE LLM RATE LIMITER #########################
+# ------------------------------------------------------ #
+# Every LLM call from every graph run goes through one limiter per model:
+# a sliding one-minute window for requests and one for tokens. Waiting
+# calls are granted by priority lane, then arrival order, so interactive
+# /evaluate calls go ahead of bulk generation. A provider 429 halves the
+# model's effective rate (recovering gradually on success), and retries use
+# jittered exponential backoff, so concurrent runs don't retry in lockstep.
+#
+# With a shared state backend (SHARED_STATE_URL), the request and token
+# windows are counted there instead, so all workers together stay within
+# one quota rather than each using all of it. Lanes and the 429 throttle
+# stay per worker.
+
+LANES = {"interactive": 0, "default": 1, "bulk": 2}
+
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "1000"))
+LLM_DEFAULT_TPM = float(os.getenv("LLM_DEFAULT_TPM", "1000000"))
+# Per-model overrides, e.g. {"gemini-2.5-flash": {"rpm": 1000, "tpm": 1000000}}; a bare
+# name is a google model, as in model routing
+LLM_RATE_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+# Output tokens reserved per call until the real usage is known
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "2048"))
+LLM_RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_MAX_BACKOFF_SECONDS", "30"))
+
+# Adaptive throttle: multiplicative decrease on 429, additive recovery on success
+_MIN_THROTTLE = 0.05
+_THROTTLE_RECOVERY = 0.05
+# Other workers' calls change a shared window without waking anyone here,
+# so the first call in line re-checks one at least this often
+_SHARED_RECHECK_SECONDS = 1.0
+
+_lane = contextvars.ContextVar("minidocs_llm_lane", default="default")
+
+
+def set_llm_lane(lane):
+    """ Priority lane for LLM calls made from the current context (request, job, task) """
+    if lane not in LANES:
+        raise ValueError(f"Unknown LLM lane: {lane}")
+    _lane.set(lane)
+
+
+def current_lane():
+    return _lane.get()
+
+
+def estimate_tokens(prompt):
+    # ~4 characters per token for English prose
+    return len(prompt) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+def is_rate_limit_error(exc):
+    """ 429 / quota errors from any provider SDK (or a fake) """
+    for attr in ("status_code", "code", "status"):
+        if getattr(exc, attr, None) in (429, "429", "RESOURCE_EXHAUSTED"):
+            return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "rate limit" in text.lower()
+
+
+def backoff_seconds(attempt, base):
+    """ Full-jitter exponential backoff: uniform in [0, base * 2**attempt], capped """
+    return random.uniform(0, min(LLM_RETRY_MAX_BACKOFF_SECONDS, base * 2 ** attempt))
+
+
+class SlidingWindow:
+    """
+    Usage over the last minute, counted the way providers count their
+    per-minute quotas. A refilling token bucket would let through up to
+    twice the quota in the first minute and trip 429s.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.entries = deque()  # [time, amount]
+        self.used = 0
+
+    def expire(self, now):
+        while self.entries and now - self.entries[0][0] >= 60:
+            self.used -= self.entries.popleft()[1]
+
+    def add(self, now, amount):
+        """ Books `amount`; returns its entry, for `adjust` """
+        entry = [now, amount]
+        self.entries.append(entry)
+        self.used += amount
+        return entry
+
+    def adjust(self, now, entry, delta):
+        """ Corrects a booked amount in place, while it is still in the window """
+        self.expire(now)
+        if now - entry[0] < 60:
+            entry[1] += delta
+            self.used += delta
+
+    def wait_for(self, now, amount, throttle):
+        """ Seconds until `amount` fits (amounts above the limit wait for an empty window) """
+        limit = self.capacity * throttle
+        excess = self.used + min(amount, limit) - limit
+        wait = 0.0
+        for at, used in self.entries:
+            if excess <= 0:
+                break
+            excess -= used
+            wait = at + 60 - now
+        return max(0.0, wait)
+
+
+class SharedWindow:
+    """
+    SlidingWindow counted on the shared state backend, as a sliding
+    window counter: this minute's total plus last minute's, weighted by
+    how much of last minute is still inside the window. Wall-clock
+    minutes, since the workers' monotonic clocks don't agree; the `now`
+    arguments are ignored.
+
+    Checking and adding are two steps, so workers granting in the same
+    instant can overshoot by a call each. Provider quotas are enforced
+    per minute, and the 429 throttle absorbs that.
+    """
+
+    def __init__(self, state, key, per_minute):
+        self.state = state
+        self.key = key
+        self.capacity = per_minute
+
+    def _window_keys(self, now):
+        minute = int(now // 60)
+        return f"{self.key}:{minute}", f"{self.key}:{minute - 1}"
+
+    def expire(self, now):
+        pass
+
+    def add(self, now, amount):
+        """ Books `amount` in this minute; returns the minute's key, for `adjust` """
+        key = self._window_keys(time.time())[0]
+        # Two minutes: this window, then the next one's look back at it
+        self.state.incr(key, int(amount), 120)
+        return key
+
+    def adjust(self, now, key, delta):
+        """ Corrects an amount booked in minute `key`, while that minute still counts """
+        if key in self._window_keys(time.time()):
+            self.state.incr(key, int(delta), 120)
+
+    def wait_for(self, now, amount, throttle):
+        now = time.time()
+        limit = self.capacity * throttle
+        current, previous = (int(value or 0) for value in self.state.get_many(self._window_keys(now)))
+        elapsed = (now % 60) / 60
+        room = limit - min(amount, limit) - current
+        if previous * (1 - elapsed) <= room:
+            return 0.0
+        if room < 0:
+            # This minute alone is full: wait for the next one
+            return 60 - now % 60
+        # Until last minute's weighted share has shrunk enough
+        return ((1 - room / previous) - elapsed) * 60
+
+
+class ModelLimiter:
+    def __init__(self, model, rpm, tpm, state=None):
+        self.model = model
+        self.shared = state is not None
+        if state is None:
+            self.requests = SlidingWindow(rpm)
+            self.tokens = SlidingWindow(tpm)
+        else:
+            self.requests = SharedWindow(state, f"rate:{model}:requests", rpm)
+            self.tokens = SharedWindow(state, f"rate:{model}:tokens", tpm)
+        self.throttle = 1.0
+        self.waiting = []  # heap of (lane rank, seq)
+        self.wakeups = {}  # ticket -> (event loop, asyncio.Event its caller sleeps on)
+        self.granted = 0
+        self.rate_limited = 0
+
+
+class Reservation:
+    """ A granted call: its place in the model's token window, and how long it waited """
+
+    def __init__(self, limiter, amount, entry, waited):
+        self.limiter = limiter
+        self.amount = amount
+        self.entry = entry
+        self.waited = waited
+
+
+class RateLimiter:
+    """
+    Used by every graph run, from any event loop. `aacquire` waits until the
+    call may start and returns its Reservation; `asettle` corrects the
+    reserved token estimate with real usage.
+
+    Only the first call in a model's line checks the windows. It sleeps
+    until its quota frees up, or until `asettle` may have freed some;
+    every call behind it sleeps until the calls ahead have gone.
+    """
+
+    def __init__(self, limits=None, default_rpm=LLM_DEFAULT_RPM, default_tpm=LLM_DEFAULT_TPM, state=None):
+        # Keyed "provider:model", so a bare name and its google: form share one quota
+        self.limits = {
+            canonical_model(model): quota for model, quota in (LLM_RATE_LIMITS if limits is None else limits).items()
+        }
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        # Shared state backend for the windows; None counts in this process
+        self.state = state
+        self._models = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _model(self, model):
+        model = canonical_model(model)
+        limiter = self._models.get(model)
+        if limiter is None:
+            quota = self.limits.get(model, {})
+            limiter = ModelLimiter(
+                model, quota.get("rpm", self.default_rpm), quota.get("tpm", self.default_tpm), self.state
+            )
+            self._models[model] = limiter
+        return limiter
+
+    def _enqueue(self, model, lane):
+        with self._lock:
+            limiter = self._model(model)
+            ticket = (LANES[lane], next(self._seq))
+            heapq.heappush(limiter.waiting, ticket)
+            wakeup = asyncio.Event()
+            limiter.wakeups[ticket] = (asyncio.get_running_loop(), wakeup)
+            return limiter, ticket, wakeup
+
+    @staticmethod
+    def _wake_first(limiter):
+        """ Wakes the call at the front of the line (caller holds the lock) """
+        if not limiter.waiting:
+            return
+        loop, wakeup = limiter.wakeups[limiter.waiting[0]]
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wakeup.set()
+        else:
+            # A call waiting on another thread's loop (sync graph runs, see workflow.run_sync)
+            loop.call_soon_threadsafe(wakeup.set)
+
+    @staticmethod
+    def _wait(limiter, amount, throttle):
+        now = time.monotonic()
+        limiter.requests.expire(now)
+        limiter.tokens.expire(now)
+        return max(limiter.requests.wait_for(now, 1, throttle), limiter.tokens.wait_for(now, amount, throttle))
+
+    @staticmethod
+    def _book(limiter, amount):
+        """ Adds the call to both windows; returns its token window entry """
+        now = time.monotonic()
+        limiter.requests.add(now, 1)
+        return limiter.tokens.add(now, amount)
+
+    def _grant(self, limiter, ticket):
+        """ Takes the granted call out of the line and wakes the next one (caller holds the lock) """
+        if limiter.waiting[0] == ticket:
+            heapq.heappop(limiter.waiting)
+        else:
+            # A call that arrived in a higher lane while the shared windows were checked
+            limiter.waiting.remove(ticket)
+            heapq.heapify(limiter.waiting)
+        del limiter.wakeups[ticket]
+        limiter.granted += 1
+        self._wake_first(limiter)
+
+    async def _try_grant(self, limiter, ticket, amount):
+        """
+        (None, token window entry) when granted. Otherwise (None, None)
+        while another call is ahead, or (seconds to wait, None).
+        """
+        with self._lock:
+            if limiter.waiting[0] != ticket:
+                # A higher-priority or earlier call goes first
+                return None, None
+            if not limiter.shared:
+                wait = self._wait(limiter, amount, limiter.throttle)
+                if wait > 0:
+                    return wait, None
+                entry = self._book(limiter, amount)
+                self._grant(limiter, ticket)
+                return None, entry
+            throttle = limiter.throttle
+
+        # Shared windows are read and written in a worker thread, outside the lock,
+        # so a slow backend neither blocks the event loop nor the other models
+        wait = await anyio.to_thread.run_sync(self._wait, limiter, amount, throttle)
+        if wait > 0:
+            return min(wait, _SHARED_RECHECK_SECONDS), None
+        entry = await anyio.to_thread.run_sync(self._book, limiter, amount)
+        with self._lock:
+            self._grant(limiter, ticket)
+        return None, entry
+
+    def _abandon(self, limiter, ticket):
+        with self._lock:
+            if ticket in limiter.waiting:
+                limiter.waiting.remove(ticket)
+                heapq.heapify(limiter.waiting)
+                del limiter.wakeups[ticket]
+                self._wake_first(limiter)
+
+    async def aacquire(self, model, amount, lane=None):
+        """ Waits until the call may start; returns its Reservation """
+        start = time.monotonic()
+        limiter, ticket, wakeup = self._enqueue(model, lane or current_lane())
+        try:
+            while True:
+                # Cleared before checking, so a wake-up that comes after the check isn't lost
+                wakeup.clear()
+                wait, entry = await self._try_grant(limiter, ticket, amount)
+                if entry is not None:
+                    return Reservation(limiter, amount, entry, time.monotonic() - start)
+                if wait is None:
+                    await wakeup.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(wakeup.wait(), wait)
+                except TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(limiter, ticket)
+            raise
+
+    async def asettle(self, reservation, usage=None):
+        """ Replaces the token estimate with real usage and lets the throttle recover """
+        limiter = reservation.limiter
+        if usage:
+            delta = usage.get("input_tokens", 0) + usage.get("output_tokens", 0) - reservation.amount
+            if limiter.shared:
+                await anyio.to_thread.run_sync(limiter.tokens.adjust, time.monotonic(), reservation.entry, delta)
+            else:
+                with self._lock:
+                    limiter.tokens.adjust(time.monotonic(), reservation.entry, delta)
+        with self._lock:
+            limiter.throttle = min(1.0, limiter.throttle + _THROTTLE_RECOVERY)
+            # Usage below the estimate may have made room for the next call
+            self._wake_first(limiter)
+
+    def on_rate_limited(self, model):
+        """ Provider said 429: halve the effective limits """
+        with self._lock:
+            limiter = self._model(model)
+            limiter.rate_limited += 1
+            limiter.throttle = max(_MIN_THROTTLE, limiter.throttle / 2)
+
+    def stats(self):
+        with self._lock:
+            return {
+                model: {
+                    "rpm": limiter.requests.capacity,
+                    "tpm": limiter.tokens.capacity,
+                    "throttle": round(limiter.throttle, 3),
+                    "waiting": len(limiter.waiting),
+                    "granted": limiter.granted,
+                    "rate_limited": limiter.rate_limited,
+                }
+                for model, limiter in self._models.items()
+            }
+
+
+rate_limiter = RateLimiter(state=shared_state if shared_state.shared else None)
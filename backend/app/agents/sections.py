@@ -0,0 +1,14 @@
+import hashlib
+
+
+################### SECTION HASHES #########################
+# ------------------------------------------------------ #
+# Shared by the workflow (evaluation snapshots, changed-section detection)
+# and the document store (section versions). Kept out of workflow.py so
+# the store doesn't load LangChain to hash a section.
+
+
+def section_hash(section):
+    """ Stable content hash of one section (name + content) """
+    raw = f"{section['section_name']}\0{section['content']}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
@@ -0,0 +1,356 @@
+import os
+import select
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+
+################### SHARED STATE #########################
+# ------------------------------------------------------ #
+# Key-value state that every worker process serving the API can see: the
+# LLM response cache, background job status, rate-limit windows and run
+# checkpoints. Without it each worker has its own copy of all of these,
+# so N workers repeat each other's LLM calls and together send N times
+# the per-minute quota. SHARED_STATE_URL picks the backend:
+#
+#   memory://              this process only (default, the single-worker setup)
+#   sqlite:///state.db     one SQLite file, shared by the workers on one host
+#   redis://host:6379/0    any server that speaks the Redis protocol, shared across hosts
+#
+# Every backend has the same small interface. Values are strings, and
+# any key can carry a TTL in seconds:
+#   get(key) / get_many(keys) / set(key, value, ttl) / delete(*keys)
+#   add(key, value, ttl)     sets only if the key is absent; True if it did (claims, leases)
+#   incr(key, amount, ttl)   atomic add to an integer; the TTL applies when the key is created
+#   stats()
+# `shared` is False for the memory backend, so callers that keep their
+# own in-process copy anyway (cache, jobs, rate limiter) skip it.
+
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+SHARED_STATE_TIMEOUT_SECONDS = float(os.getenv("SHARED_STATE_TIMEOUT_SECONDS", "5"))
+# Expired SQLite rows are deleted at most this often
+_PURGE_INTERVAL_SECONDS = 60
+
+
+class SharedStateError(Exception):
+    """ The shared state backend refused a command or could not be reached """
+
+
+def _expires_at(ttl):
+    return time.time() + ttl if ttl else None
+
+
+class MemoryState:
+    """ Dict with per-key expiry; one process only """
+
+    name = "memory"
+    shared = False
+
+    def __init__(self):
+        self._entries = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._entries[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def get_many(self, keys):
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, _expires_at(ttl))
+
+    def add(self, key, value, ttl=None):
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._entries[key] = (value, _expires_at(ttl))
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def incr(self, key, amount, ttl=None):
+        with self._lock:
+            current = self._get(key)
+            if current is None:
+                value, expires_at = amount, _expires_at(ttl)
+            else:
+                value, expires_at = int(current) + amount, self._entries[key][1]
+            self._entries[key] = (str(value), expires_at)
+            return value
+
+    def stats(self):
+        return {"backend": self.name, "keys": len(self._entries)}
+
+
+class SQLiteState:
+    """
+    One table in a SQLite file. Every worker opens its own connection;
+    WAL lets them read while one writes, and each operation is a single
+    statement, so it is atomic across processes.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path, timeout=SHARED_STATE_TIMEOUT_SECONDS):
+        self.path = path
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.commit()
+
+    def _write(self, query, params):
+        with self._lock:
+            try:
+                row = self._conn.execute(query, params).fetchone()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                raise SharedStateError(f"SQLite shared state: {e}")
+        self._purge()
+        return row
+
+    def _purge(self):
+        now = time.time()
+        if now - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+
+    def get(self, key):
+        return self.get_many([key])[0]
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        with self._lock:
+            rows = dict(self._conn.execute(
+                f"SELECT key, value FROM shared_state WHERE key IN ({', '.join('?' * len(keys))}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (*keys, time.time()),
+            ).fetchall())
+        return [rows.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        self._write("INSERT OR REPLACE INTO shared_state VALUES (?, ?, ?)", (key, value, _expires_at(ttl)))
+
+    def add(self, key, value, ttl=None):
+        # Takes over an expired row; leaves a live one alone
+        row = self._write(
+            "INSERT INTO shared_state VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE "
+            "SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE shared_state.expires_at IS NOT NULL AND shared_state.expires_at <= ? RETURNING key",
+            (key, value, _expires_at(ttl), time.time()),
+        )
+        return row is not None
+
+    def delete(self, *keys):
+        if keys:
+            self._write(f"DELETE FROM shared_state WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def incr(self, key, amount, ttl=None):
+        now = time.time()
+        row = self._write(
+            "INSERT INTO shared_state VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN shared_state.expires_at <= ? THEN excluded.value "
+            "ELSE CAST(shared_state.value AS INTEGER) + ? END, "
+            "expires_at = CASE WHEN shared_state.expires_at <= ? THEN excluded.expires_at "
+            "ELSE shared_state.expires_at END RETURNING value",
+            (key, str(amount), _expires_at(ttl), now, amount, now),
+        )
+        return int(row[0])
+
+    def stats(self):
+        with self._lock:
+            keys = self._conn.execute(
+                "SELECT COUNT(*) FROM shared_state WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        return {"backend": self.name, "path": self.path, "keys": keys}
+
+
+class RedisState:
+    """
+    Minimal Redis protocol (RESP2) client over one socket: GET, MGET, SET
+    (PX/NX), DEL and INCRBY, which Redis, Valkey, KeyDB and the like all
+    speak. Commands are serialized on the connection; each is one
+    round trip, short next to the LLM calls they guard.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, timeout=SHARED_STATE_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    # ---- protocol ----
+
+    @staticmethod
+    def _encode(command):
+        parts = [f"*{len(command)}\r\n".encode()]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the shared state server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise SharedStateError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) < length + 2:
+                raise ConnectionError("Connection closed by the shared state server")
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise SharedStateError(f"Unexpected reply from the shared state server: {line!r}")
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._send(setup)
+
+    def _close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._reader = None
+
+    def _send(self, commands):
+        self._sock.sendall(b"".join(self._encode(command) for command in commands))
+        replies = []
+        error = None
+        for _ in commands:
+            # Read every reply, even after an error, so the connection stays in step
+            try:
+                replies.append(self._read_reply())
+            except SharedStateError as e:
+                error = error or e
+        if error:
+            raise error
+        return replies
+
+    def _dropped(self):
+        """ True when the idle connection has something to read: the server closed it (or it is out of step) """
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        return bool(readable)
+
+    def _pipeline(self, *commands):
+        """
+        Sends the commands in one write and returns their replies. A
+        connection the server closed while idle is replaced before
+        sending. Commands are never sent twice: once written, the server
+        may have run them, and a repeated INCRBY would count twice.
+        """
+        with self._lock:
+            try:
+                if self._sock is not None and self._dropped():
+                    self._close()
+                if self._sock is None:
+                    self._connect()
+            except OSError as e:
+                self._close()
+                raise SharedStateError(f"Shared state server {self.host}:{self.port} unreachable: {e}")
+            try:
+                return self._send(commands)
+            except OSError as e:
+                self._close()
+                raise SharedStateError(f"Connection to shared state server {self.host}:{self.port} lost: {e}")
+
+    # ---- interface ----
+
+    def get(self, key):
+        return self._pipeline(("GET", key))[0]
+
+    def get_many(self, keys):
+        return self._pipeline(("MGET", *keys))[0] if keys else []
+
+    def set(self, key, value, ttl=None):
+        command = ("SET", key, value, "PX", int(ttl * 1000)) if ttl else ("SET", key, value)
+        self._pipeline(command)
+
+    def add(self, key, value, ttl=None):
+        command = ("SET", key, value, "NX", "PX", int(ttl * 1000)) if ttl else ("SET", key, value, "NX")
+        return self._pipeline(command)[0] == "OK"
+
+    def delete(self, *keys):
+        if keys:
+            self._pipeline(("DEL", *keys))
+
+    def incr(self, key, amount, ttl=None):
+        if not ttl:
+            return self._pipeline(("INCRBY", key, amount))[0]
+        # Creates the key with its TTL first, so INCRBY never makes a key that doesn't expire
+        return self._pipeline(("SET", key, 0, "NX", "PX", int(ttl * 1000)), ("INCRBY", key, amount))[1]
+
+    def stats(self):
+        return {"backend": self.name, "server": f"{self.host}:{self.port}/{self.db}", "keys": self._pipeline(("DBSIZE",))[0]}
+
+
+def build_shared_state(url=SHARED_STATE_URL):
+    parsed = urlparse(url)
+    if parsed.scheme in ("", "memory"):
+        return MemoryState()
+    if parsed.scheme == "sqlite":
+        # sqlite:///state.db is relative to the working directory, sqlite:////var/lib/state.db absolute
+        return SQLiteState(parsed.path[1:] if parsed.path.startswith("/") else parsed.path)
+    if parsed.scheme == "redis":
+        return RedisState(
+            parsed.hostname or "127.0.0.1",
+            parsed.port or 6379,
+            int(parsed.path.strip("/") or 0),
+            parsed.password,
+        )
+    raise ValueError(f"Unknown SHARED_STATE_URL scheme: {parsed.scheme}")
+
+
+shared_state = build_shared_state()
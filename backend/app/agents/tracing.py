@@ -0,0 +1,215 @@
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import defaultdict
+
+
+################### PROMETHEUS-STYLE METRICS #########################
+# ------------------------------------------------------ #
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._counts = {}
+        self._sums = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1  # +Inf
+            self._sums[key] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, counts in sorted(self._counts.items()):
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+NODE_DURATION = Histogram("minidocs_node_duration_seconds", "Wall time per graph node run")
+LLM_CALL_DURATION = Histogram("minidocs_llm_call_duration_seconds", "Wall time per LLM call, including retries")
+LLM_TOKENS = Counter("minidocs_llm_tokens_total", "LLM tokens by node and kind (prompt/completion)")
+LLM_RETRIES = Counter("minidocs_llm_retries_total", "LLM call retries by node")
+LLM_CACHE = Counter("minidocs_llm_cache_total", "LLM response cache lookups by node and result (hit/miss)")
+LLM_QUEUE_WAIT = Histogram("minidocs_llm_queue_wait_seconds", "Time LLM calls waited for the rate limiter, by lane")
+LLM_RATE_LIMITED = Counter("minidocs_llm_rate_limited_total", "Provider 429 responses by node")
+LLM_COST = Counter("minidocs_llm_cost_usd_total", "Estimated LLM spend in USD by node and model")
+LLM_TRIAGE = Counter("minidocs_llm_triage_total", "Evaluator triage results (accepted/escalated)")
+LLM_REPAIRS = Counter("minidocs_llm_repairs_total", "Unreadable LLM replies by node and repair (section/resend/salvaged)")
+GRAPH_RUN_REQUESTS = Counter(
+    "minidocs_graph_run_requests_total", "/generate and /evaluate requests by endpoint and run (started/coalesced)"
+)
+
+METRICS = [
+    NODE_DURATION, LLM_CALL_DURATION, LLM_TOKENS, LLM_RETRIES, LLM_CACHE, LLM_QUEUE_WAIT, LLM_RATE_LIMITED,
+    LLM_COST, LLM_TRIAGE, LLM_REPAIRS, GRAPH_RUN_REQUESTS,
+]
+
+
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+################### PER-REQUEST TRACES #########################
+# ------------------------------------------------------ #
+
+class RunTrace:
+    """ Node runs and LLM calls of one graph run, attached to responses in debug mode """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.nodes = []
+        self.llm_calls = []
+        self._lock = threading.Lock()
+
+    def add_node(self, record):
+        with self._lock:
+            self.nodes.append(record)
+
+    def add_llm_call(self, record):
+        with self._lock:
+            self.llm_calls.append(record)
+
+    def to_dict(self):
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "nodes": self.nodes,
+            "llm_calls": self.llm_calls,
+            "totals": {
+                "prompt_tokens": sum(c["prompt_tokens"] for c in self.llm_calls),
+                "completion_tokens": sum(c["completion_tokens"] for c in self.llm_calls),
+                "retries": sum(c["retries"] for c in self.llm_calls),
+                "cache_hits": sum(1 for c in self.llm_calls if c["cache_hit"]),
+                "queue_seconds": round(sum(c["queue_seconds"] for c in self.llm_calls), 4),
+                "cost_usd": round(sum(c["cost_usd"] for c in self.llm_calls), 6),
+            },
+        }
+
+
+_current_trace = contextvars.ContextVar("minidocs_trace", default=None)
+
+
+def start_trace():
+    """ Starts a trace for the graph run in the current context and returns it """
+    trace = RunTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def record_llm_call(node, seconds, usage=None, retries=0, cache_hit=None, queue_seconds=0.0, lane=None, rate_limited=0,
+                    model=None, cost=0.0):
+    """
+    `cache_hit` is None for nodes that don't use the response cache.
+    `queue_seconds` is the time spent waiting for the rate limiter in `lane`.
+    `model` is the model that answered (or failed last); `cost` is in USD.
+    """
+    usage = usage or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+
+    if cache_hit is not None:
+        LLM_CACHE.inc(node=node, result="hit" if cache_hit else "miss")
+    if not cache_hit:
+        LLM_CALL_DURATION.observe(seconds, node=node, model=model or "")
+        LLM_TOKENS.inc(prompt_tokens, node=node, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, node=node, kind="completion")
+    if retries:
+        LLM_RETRIES.inc(retries, node=node)
+    if lane is not None:
+        LLM_QUEUE_WAIT.observe(queue_seconds, lane=lane)
+    if rate_limited:
+        LLM_RATE_LIMITED.inc(rate_limited, node=node)
+    if cost:
+        LLM_COST.inc(cost, node=node, model=model)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_call({
+            "node": node,
+            "model": model,
+            "seconds": round(seconds, 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "retries": retries,
+            "cache_hit": bool(cache_hit),
+            "queue_seconds": round(queue_seconds, 4),
+            "cost_usd": round(cost, 6),
+        })
+
+
+def _record_node(node, state, seconds):
+    NODE_DURATION.observe(seconds, node=node)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_node({
+            "node": node,
+            "seconds": round(seconds, 4),
+            "iteration": state.get("iteration", 0) if isinstance(state, dict) else 0,
+        })
+
+
+def traced_node(node):
+    """ Records wall time (and loop iteration) for every run of a sync or async node """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(state):
+                start = time.perf_counter()
+                try:
+                    return await fn(state)
+                finally:
+                    _record_node(node, state, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(state):
+            start = time.perf_counter()
+            try:
+                return fn(state)
+            finally:
+                _record_node(node, state, time.perf_counter() - start)
+        return wrapper
+    return decorator
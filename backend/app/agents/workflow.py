@@ -1,6 +1,5 @@
-from dotenv import load_dotenv
 import os
-load_dotenv()
+import functools
 
 from typing import TypedDict, List, Dict, Optional, Union, Literal
 from pydantic import BaseModel
@@ -75,16 +74,16 @@ class EvaluatorState(BaseModel):
 
 from langchain_core.prompts import ChatPromptTemplate
 
-full_gen_prompt = ChatPromptTemplate.from_template("""
-You are an expert content generation model. Your job is to generate high-quality, coherent text for each given section of a document based on the user configuration.
-
-Below is the information provided by the user. Use ALL of it carefully.
+# Each prompt is a static system message (role, instructions, output
+# format) followed by a human message with the per-call data, user config
+# first. The system message is byte-identical on every call of a node, and
+# the user config stays the same across a run's refine loop, so provider
+# prompt caching can reuse the longest possible prefix.
 
-=========================
-        USER CONFIG
-=========================
+FULL_GEN_SYSTEM = """
+You are an expert content generation model. Your job is to generate high-quality, coherent text for each given section of a document based on the user configuration.
 
-{USER_CONFIG}
+The user configuration is provided in the next message. Use ALL of it carefully.
 
 =========================
        INSTRUCTIONS
@@ -99,7 +98,7 @@ Below is the information provided by the user. Use ALL of it carefully.
 5. Ensure continuity and coherence across all sections.
 6. Use mordern markdown format if needed.
 7. Your final output MUST be valid JSON in this structure:
-  
+
 {{
   "generated_content": [
     {{ "section_name": "...", "content": "..." }},
@@ -107,33 +106,33 @@ Below is the information provided by the user. Use ALL of it carefully.
 }}
 
 Return parseable JSON only, with no commentary.
-""")
+"""
+
+full_gen_prompt = ChatPromptTemplate.from_messages([
+    ("system", FULL_GEN_SYSTEM),
+    ("human", """
+=========================
+        USER CONFIG
+=========================
+
+{USER_CONFIG}
+"""),
+])
 
 
-evaluator_prompt = ChatPromptTemplate.from_template("""
-Your role is to act as a strict, high-signal evaluator of the generated document.  
+EVALUATOR_SYSTEM = """
+Your role is to act as a strict, high-signal evaluator of the generated document.
 You must determine whether the content is acceptable as-is, or if it requires:
-1. Semantic refinements  
-2. Structural modifications  
-3. No changes  
+1. Semantic refinements
+2. Structural modifications
+3. No changes
 
 Your evaluation determines which refinement node the system executes next.
 
-ONLY report issues that meaningfully affect understanding, correctness, coherence, structure, or alignment with user constraints.  
+ONLY report issues that meaningfully affect understanding, correctness, coherence, structure, or alignment with user constraints.
 Ignore trivial or cosmetic matters.
 
-========================================================
-                 USER OBJECTIVES
-========================================================
-
-{USER_CONFIG}
-
-ALLOW_DYNAMIC_CONTENT_GENERATION = {ALLOW_DYNAMIC_CONTENT_GENERATION}
-
-========================================================
-           GENERATED CONTENT TO EVALUATE
-========================================================
-{GENERATED_CONTENT}
+The user objectives, ALLOW_DYNAMIC_CONTENT_GENERATION and the content to evaluate are provided in the next message.
 
 ========================================================
            EVALUATION INSTRUCTIONS
@@ -147,16 +146,16 @@ semantic quality and structural quality.
 --------------------------------------------------------
 Identify semantic issues ONLY if they meaningfully harm:
 
-- clarity or understanding  
-- coherence or logical flow  
-- correctness or internal consistency  
-- alignment with topic  
-- adherence to constraints in a non-trivial way  
+- clarity or understanding
+- coherence or logical flow
+- correctness or internal consistency
+- alignment with topic
+- adherence to constraints in a non-trivial way
 
 For each semantic issue:
 Return a SemanticChangeConfig object:
-- section_name  
-- issue  
+- section_name
+- issue
 - suggestion (clear, actionable, non-trivial improvement)
 
 If there are NO meaningful semantic issues, return "None".
@@ -185,17 +184,17 @@ B. FLEXIBLE MODE (ALLOW_DYNAMIC_CONTENT_GENERATION = "true")
 The evaluator is permitted to make **controlled creative suggestions** IF they help clarity, structure, or alignment with constraints.
 
 Allowed creativity:
-- Propose new sections when meaningfully valuable  
-- Suggest renaming sections for stronger clarity or alignment  
-- Suggest reordering for better narrative flow  
-- Suggest merging or splitting sections  
-- Suggest more expressive or more natural hierarchical organization  
+- Propose new sections when meaningfully valuable
+- Suggest renaming sections for stronger clarity or alignment
+- Suggest reordering for better narrative flow
+- Suggest merging or splitting sections
+- Suggest more expressive or more natural hierarchical organization
 
 BUT all creativity must obey:
-1. Do NOT contradict user constraints  
-2. Do NOT violate topic, tone, or mandatory elements  
-3. Do NOT overwrite user-intended meaning  
-4. Creativity must be purposeful, not decorative  
+1. Do NOT contradict user constraints
+2. Do NOT violate topic, tone, or mandatory elements
+3. Do NOT overwrite user-intended meaning
+4. Creativity must be purposeful, not decorative
 
 This mode is for users who want guided, intelligent expansion.
 
@@ -207,23 +206,23 @@ If no structural modifications are required, return "None".
 
 Return exactly ONE of:
 
-- "structural_refine"  
+- "structural_refine"
       → if structural_changes list is NOT "None"
 
-- "semantic_refine"  
+- "semantic_refine"
       → if structural_changes = "None" AND semantic_issues list is NOT "None"
 
-- "no_action"  
+- "no_action"
       → if BOTH semantic_issues and structural_changes are "None"
 
 --------------------------------------------------------
 4. EVALUATOR DIAGNOSTIC SUMMARY (User-facing only)
 --------------------------------------------------------
 Provide a 2–4 sentence expert summary of:
-- overall quality  
-- useful high-level insights  
-- potential conceptual improvements  
-- structural opportunities (even in rigid mode)  
+- overall quality
+- useful high-level insights
+- potential conceptual improvements
+- structural opportunities (even in rigid mode)
 
 This field is **ALWAYS allowed**, regardless of dynamic mode.
 
@@ -236,10 +235,10 @@ IMPORTANT:
 5. COHERENCY SCORE
 --------------------------------------------------------
 Provide a coherency score (0–1) based on:
-- overall logical clarity  
-- organization  
-- semantic cohesion  
-- conceptual soundness  
+- overall logical clarity
+- organization
+- semantic cohesion
+- conceptual soundness
 
 This score is INDEPENDENT of refinement rules or dynamic mode.
 
@@ -275,61 +274,114 @@ Return ONLY a JSON object matching EXACTLY this schema:
 }}
 
 Return parseable JSON only, with no commentary.
-""")
+"""
+
+evaluator_prompt = ChatPromptTemplate.from_messages([
+    ("system", EVALUATOR_SYSTEM),
+    ("human", """
+========================================================
+                 USER OBJECTIVES
+========================================================
 
+{USER_CONFIG}
 
+ALLOW_DYNAMIC_CONTENT_GENERATION = {ALLOW_DYNAMIC_CONTENT_GENERATION}
 
-semantic_refine_prompt = ChatPromptTemplate.from_template("""
-You are an expert rewriting and refinement model. Your job is to improve the already generated document sections **only where required**, based on evaluator feedback.
+========================================================
+           GENERATED CONTENT TO EVALUATE
+========================================================
+{GENERATED_CONTENT}
+"""),
+])
 
-=========================
-        USER CONFIG
-=========================
+
+INCREMENTAL_EVALUATOR_SYSTEM = """
+Your role is to act as a strict, high-signal evaluator of a document the user has just EDITED.
+The document was fully evaluated before; only the sections listed under CHANGED SECTIONS were modified since.
+
+ONLY report issues that meaningfully affect understanding, correctness, coherence, structure, or alignment with user constraints.
+Ignore trivial or cosmetic matters.
+
+The user objectives, the document outline (unchanged sections abridged) and the CHANGED SECTIONS are provided in the next message.
+
+========================================================
+           EVALUATION INSTRUCTIONS
+========================================================
+
+1. semantic_issues: report issues ONLY for the CHANGED SECTIONS (SemanticChangeConfig objects), or "None".
+2. Check that the changed sections still connect coherently with their neighbours in the outline.
+3. structural_changes: MUST be "None" when ALLOW_DYNAMIC_CONTENT_GENERATION is "false".
+   Otherwise propose structural actions only if the edits made them necessary.
+4. next_action: "structural_refine" if structural_changes is not "None",
+   else "semantic_refine" if semantic_issues is not "None", else "no_action".
+5. evaluator_diagnostic_summary: 2–4 sentences for the user about the edited document.
+6. coherency_score (0–1): for the WHOLE document as it reads now.
+
+========================================================
+              OUTPUT JSON FORMAT (STRICT)
+========================================================
+
+{{
+  "coherency_score": <float 0–1>,
+  "semantic_issues": "None" OR [{{ "section_name": "...", "issue": "...", "suggestion": "..." }}],
+  "structural_changes": "None" OR [{{ "action": "add" | "remove" | "rename" | "reorder", "section_name": "...", "context": "..." }}],
+  "next_action": "semantic_refine" | "structural_refine" | "no_action",
+  "evaluator_diagnostic_summary": "..."
+}}
+
+Return parseable JSON only, with no commentary.
+"""
+
+incremental_evaluator_prompt = ChatPromptTemplate.from_messages([
+    ("system", INCREMENTAL_EVALUATOR_SYSTEM),
+    ("human", """
+========================================================
+                 USER OBJECTIVES
+========================================================
 
 {USER_CONFIG}
 
-=========================
-    ORIGINAL GENERATED CONTENT
-=========================
-{GENERATED_CONTENT}
+ALLOW_DYNAMIC_CONTENT_GENERATION = {ALLOW_DYNAMIC_CONTENT_GENERATION}
 
-=========================
-     SEMANTIC FEEDBACK
-=========================
+========================================================
+      DOCUMENT OUTLINE (unchanged sections abridged)
+========================================================
+{OUTLINE}
+
+========================================================
+                 CHANGED SECTIONS
+========================================================
+{CHANGED_CONTENT}
+"""),
+])
 
-{SEMANTIC_FEEDBACK}
+
+SEMANTIC_REFINE_SYSTEM = """
+You are an expert rewriting and refinement model. Your job is to improve ONE already generated document section, based on evaluator feedback.
+Other flagged sections are refined in parallel; unflagged sections are kept as they are.
+
+The user config, the document outline, the section to refine and the semantic feedback are provided in the next message.
 
 =========================
         INSTRUCTIONS
 =========================
 
-1. **Refine ONLY the sections the evaluator marked as problematic.**
+1. Rewrite ONLY this section.
 2. When refining:
    - Fix coherence issues
    - Follow evaluator's suggestions precisely
    - Follow all original constraints (tone, style, length rules)
-3. Preserve the section names. Only update the text.
-4. For sections with *no issues*, return the existing text unchanged.
+3. Preserve the section name. Only update the text.
+4. Keep the parts of the text that the feedback does not touch.
 5. Use mordern markdown format if needed.
-6. You MUST output valid JSON in the following exact format:
-
-{{
-  "generated_content": [
-    {{ "section_name": "...", "content": "..." }},
-  ]
-}}
+6. You MUST output valid JSON in the exact format given at the end of the next message.
 
 Return parseable JSON only, with no commentary.
-""")
-
-
-structural_refine_prompt = ChatPromptTemplate.from_template("""
-You are a structural refinement model. Your job is to update the
-document’s SECTION OUTLINE and CONTENT according to evaluator
-structural feedback.
-
-You MUST follow the evaluator’s structural_changes exactly.
+"""
 
+semantic_refine_prompt = ChatPromptTemplate.from_messages([
+    ("system", SEMANTIC_REFINE_SYSTEM),
+    ("human", """
 =========================
         USER CONFIG
 =========================
@@ -337,14 +389,39 @@ You MUST follow the evaluator’s structural_changes exactly.
 {USER_CONFIG}
 
 =========================
-     ORIGINAL CONTENT
+     DOCUMENT OUTLINE
 =========================
-{GENERATED_CONTENT}
+{OUTLINE}
 
 =========================
-   STRUCTURAL FEEDBACK
+    SECTION TO REFINE
 =========================
-{STRUCTURAL_FEEDBACK}
+{SECTION_NAME} :
+ - {SECTION_CONTENT}
+
+=========================
+     SEMANTIC FEEDBACK
+=========================
+
+{SEMANTIC_FEEDBACK}
+
+=========================
+      OUTPUT FORMAT
+=========================
+
+{{ "section_name": "{SECTION_NAME}", "content": "..." }}
+"""),
+])
+
+
+STRUCTURAL_REFINE_SYSTEM = """
+You are a structural refinement model. Your job is to update the
+document’s SECTION OUTLINE and CONTENT according to evaluator
+structural feedback.
+
+You MUST follow the evaluator’s structural_changes exactly.
+
+The user config, the original content and the structural feedback are provided in the next message.
 
 =========================
         INSTRUCTIONS
@@ -375,30 +452,149 @@ Return JSON in the following exact format:
 }}
 
 Return parseable JSON only, with no commentary.
-""")
+"""
+
+structural_refine_prompt = ChatPromptTemplate.from_messages([
+    ("system", STRUCTURAL_REFINE_SYSTEM),
+    ("human", """
+=========================
+        USER CONFIG
+=========================
+
+{USER_CONFIG}
+
+=========================
+     ORIGINAL CONTENT
+=========================
+{GENERATED_CONTENT}
+
+=========================
+   STRUCTURAL FEEDBACK
+=========================
+{STRUCTURAL_FEEDBACK}
+"""),
+])
+
+
+SECTION_GEN_SYSTEM = """
+You are an expert content generation model. You are writing ONE section of a larger document.
+Other sections are written in parallel by other writers, so stay strictly within your section.
+
+The user config, the document outline and your section are provided in the next message.
+
+=========================
+       INSTRUCTIONS
+=========================
+
+1. Write **clear, structured, coherent text** for YOUR SECTION only.
+2. Do NOT repeat material that belongs to other sections of the outline.
+3. Write so the section reads naturally after the previous section and before the next one.
+4. Respect ALL constraints strictly (tone, style, transformation rules, etc.).
+5. Use mordern markdown format if needed.
+6. Your final output MUST be valid JSON in the exact format given at the end of the next message.
+
+Return parseable JSON only, with no commentary.
+"""
+
+section_gen_prompt = ChatPromptTemplate.from_messages([
+    ("system", SECTION_GEN_SYSTEM),
+    ("human", """
+=========================
+        USER CONFIG
+=========================
+
+{USER_CONFIG}
+
+=========================
+     DOCUMENT OUTLINE
+=========================
+{OUTLINE}
+
+=========================
+     YOUR SECTION
+=========================
+Section {SECTION_INDEX}: {SECTION_NAME}
+Description: {SECTION_DESCRIPTION}
+
+=========================
+      OUTPUT FORMAT
+=========================
+
+{{ "section_name": "{SECTION_NAME}", "content": "..." }}
+"""),
+])
 
 ################### HELPER FUNCTIONS #########################
 # ------------------------------------------------------ #
 
 
-def format_user_config(usr_inp):
-    lines =[]
-    lines.append(f"\n## Main Topic: {usr_inp['main_topic']}.")
+# Token budgets (~4 characters per token) for the user's `context` field.
+# Drafting sees more of it than the evaluate/refine loop, which re-sends it
+# on every call. 0 disables the limit.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "32000"))
+LOOP_CONTEXT_TOKEN_BUDGET = int(os.getenv("LOOP_CONTEXT_TOKEN_BUDGET", "4000"))
 
-    if usr_inp.get('sections'):
-        lines.append("## User Defined Sample Sections: ")
-        sections = usr_inp["sections"]
-        for i,sec in enumerate(sections, start = 1 ):
-            lines.append(f"{i}. {sec['section_name']} : \n - {sec['description']}")
 
-    if usr_inp.get('expected_sections_count'):
-        lines.append(f"## Number of Sections User Expects: {usr_inp['expected_sections_count']}")
+def fit_context(text, budget_tokens):
+    """
+    Cuts `text` to about `budget_tokens`. The head (usually the brief) and
+    the tail (usually the latest details) are kept, cut at paragraph or
+    sentence boundaries, with a marker for what was left out.
+    """
+    limit = budget_tokens * 4
+    if budget_tokens <= 0 or len(text) <= limit:
+        return text
 
-    lines.append(f"## User defined CONSTRAINTS: {usr_inp.get('constraints',"None")}")
-    lines.append(f"## Additional User Context: {usr_inp.get('context',"None")}")
+    head = text[:int(limit * 0.7)]
+    cut = max(head.rfind("\n\n"), head.rfind(". ") + 1)
+    if cut > len(head) // 2:
+        head = head[:cut]
+
+    tail = text[len(text) - int(limit * 0.3):]
+    cut = min((i for i in (tail.find("\n\n"), tail.find(". ")) if i >= 0), default=-1)
+    if 0 <= cut < len(tail) // 2:
+        tail = tail[cut:].lstrip(". \n")
+
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head.rstrip()}\n\n[... {omitted:,} characters of context omitted ...]\n\n{tail}"
+
+
+def format_user_config(usr_inp, context_budget=CONTEXT_TOKEN_BUDGET):
+    sections = tuple((sec["section_name"], sec["description"]) for sec in usr_inp.get("sections") or ())
+    return _format_user_config(
+        usr_inp["main_topic"], usr_inp.get("constraints", "None"), usr_inp.get("context", "None"),
+        usr_inp.get("expected_sections_count"), sections, context_budget,
+    )
+
+
+# Every node of a run formats the same user config (the refine loop on
+# every iteration), so it is formatted once per distinct config
+@functools.lru_cache(maxsize=64)
+def _format_user_config(main_topic, constraints, context, expected_sections_count, sections, context_budget):
+    lines =[]
+    # Fields that documents of one batch usually share come first, so their
+    # prompts share a long prefix (provider-side prompt caching)
+    lines.append(f"\n## Main Topic: {main_topic}.")
+    lines.append(f"## User defined CONSTRAINTS: {constraints}")
+    if isinstance(context, str):
+        context = fit_context(context, context_budget)
+    lines.append(f"## Additional User Context: {context}")
+
+    if expected_sections_count:
+        lines.append(f"## Number of Sections User Expects: {expected_sections_count}")
+
+    if sections:
+        lines.append("## User Defined Sample Sections: ")
+        for i, (name, description) in enumerate(sections, start = 1 ):
+            lines.append(f"{i}. {name} : \n - {description}")
 
     return "\n\n".join(lines)
 
+
+def shared_prefix_key(usr_inp):
+    """ The leading part of format_user_config that batch items can share """
+    return (usr_inp.get("main_topic"), usr_inp.get("constraints"), usr_inp.get("context"))
+
 # def format_sections(sections):
 #     lines =[]
 #     for i,sec in enumerate(sections, start = 1 ):
@@ -450,13 +646,87 @@ def format_evaluation(evaluator_state):
     # If neither structural nor semantic — next_action = no_action
     return "\n".join(lines)
 
+
+def evaluation_snapshot(generated_content, evaluator_state):
+    """
+    What a client sends back as `previous_evaluation` so the next /evaluate
+    only re-scores the sections that changed.
+    """
+    return {
+        "sections": [
+            {"section_name": sec["section_name"], "hash": section_hash(sec)}
+            for sec in generated_content
+        ],
+        "coherency_score": evaluator_state["coherency_score"],
+        "semantic_issues": evaluator_state["semantic_issues"],
+    }
+
 ################### LANG-GRAPH LOGIC #########################
 # ------------------------------------------------------ #
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.runnables import RunnableLambda
+from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, END, START
+from langgraph.types import Send
+from typing import Annotated
+import asyncio
+import operator
 import json
+import threading
+import time
+
+from app.agents.llm_registry import llm_registry
+from app.agents.model_routing import model_router
+from app.agents.llm_cache import response_cache, cache_key, prompt_text, CACHEABLE_NODES
+from app.agents.tracing import traced_node, record_llm_call, LLM_REPAIRS
+from app.agents.rate_limit import rate_limiter, estimate_tokens, is_rate_limit_error, backoff_seconds, current_lane
+from app.agents.partial_json import PartialJSONError, scan_list, scan_fields
+from app.agents.sections import section_hash
+from app.agents.checkpoints import checkpointer
+
+
+################### REFINE LOOP BUDGET #########################
+# ------------------------------------------------------ #
+
+# Max number of refine rounds (semantic or structural) per run
+MAX_REFINE_ITERATIONS = int(os.getenv("MAX_REFINE_ITERATIONS", "3"))
+# Stop once coherency_score improves by no more than this between evaluations
+CONVERGENCE_THRESHOLD = float(os.getenv("CONVERGENCE_THRESHOLD", "0.02"))
+# Wall-clock budget per request, checked after every evaluation
+REFINE_DEADLINE_SECONDS = float(os.getenv("REFINE_DEADLINE_SECONDS", "180"))
+
+
+def new_run_budget():
+    """ Loop-control fields to merge into a fresh graph input state """
+    return {
+        "iteration": 0,
+        "deadline": time.time() + REFINE_DEADLINE_SECONDS,
+    }
+
+
+def loop_stop_reason(state):
+    """
+    Returns why the refine loop should stop after the latest evaluation,
+    or None to keep refining.
+    """
+    if state["evaluator_state"]["next_action"] == "no_action":
+        return "no_action"
+
+    if state.get("iteration", 0) >= MAX_REFINE_ITERATIONS:
+        return "max_iterations"
+
+    history = state.get("evaluator_history", [])
+    if len(history) >= 2:
+        improvement = history[-1]["coherency_score"] - history[-2]["coherency_score"]
+        if improvement <= CONVERGENCE_THRESHOLD:
+            return "converged"
+
+    deadline = state.get("deadline")
+    if deadline is not None and time.time() >= deadline:
+        return "deadline"
+
+    return None
 
   
 class GraphState(TypedDict):
@@ -467,24 +737,416 @@ class GraphState(TypedDict):
     evaluator_state: EvaluatorState
     iteration: int
     evaluator_history: List[dict] = []
+    # ===== LOOP CONTROL =======
+    deadline: float
+    stop_reason: Optional[str]
+    # ===== SECTION-PARALLEL GENERATION =======
+    outline: List[dict]
+    section_drafts: Annotated[List[dict], operator.add]
+    # ===== INCREMENTAL RE-EVALUATION =======
+    previous_evaluation: Optional[dict]
+    # ===== STORED DOCUMENT (carried through for the response, unused by the nodes) =======
+    document_id: Optional[str]
+
+
+class SectionTask(TypedDict):
+    """ Payload sent to each parallel `generate_section` worker """
+    user_state: UserState
+    outline: List[dict]
+    index: int
     
     
 
 # Create nodes (functions)
-def generate_initial_draft(state: GraphState) -> GraphState:
+def _print_banner(title):
     print("\n" + "="*60)
-    print("---GENERATE INITIAL DRAFT NODE---")
+    print(f"---{title}---")
     print("="*60 + "\n")
-    
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    response_schema=GeneratedState.model_json_schema(),  
-    response_mime_type = 'application/json',
+
+
+# (temperature, response schema) used by each node; models come from model_router
+NODE_LLM_SPECS = {
+    "generate_initial_draft": (0, GeneratedState),
+    "generate_section": (0, GeneratedConfig),
+    "evaluator": (0.3, EvaluatorState),
+    "evaluator_triage": (0.3, EvaluatorState),
+    "semantic_refine": (0, GeneratedConfig),
+    "structural_refine": (0, GeneratedState),
+    "repair_section": (0, GeneratedConfig),
+}
+
+
+def build_llm_clients():
+    """
+    Builds the client of every model each node can call (its whole
+    fallback chain), so the first requests don't pay for provider SDK
+    imports and client setup. Called by the startup warm-up.
+    """
+    for node, (temperature, schema) in NODE_LLM_SPECS.items():
+        if node == "evaluator_triage" and not model_router.triage_enabled:
+            continue
+        for model in model_router.chain(node):
+            try:
+                llm_registry.get(model, temperature, schema, model_router.timeout(node))
+            except Exception as e:
+                # e.g. a missing API key: the node's first call reports it
+                print(f"⚠ Could not build the {model} client for {node}: {e}")
+
+
+def _cache_key(node, prompt):
+    if node not in CACHEABLE_NODES:
+        return None
+    temperature, schema = NODE_LLM_SPECS[node]
+    return cache_key(",".join(model_router.models(node)), temperature, schema.__name__, prompt)
+
+
+# Retries are done here rather than inside the provider client, so every
+# retry is visible in traces and metrics. Every attempt first waits for the
+# process-wide rate limiter; backoff is jittered so concurrent runs spread out.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "1"))
+
+
+def _attempt_plan(node):
+    """
+    (model, retry number) for every try: each model of the fallback chain
+    once, then LLM_MAX_RETRIES backed-off retries of the last one.
+    """
+    chain = model_router.chain(node)
+    return [(model, 0) for model in chain[:-1]] + [(chain[-1], retry) for retry in range(LLM_MAX_RETRIES + 1)]
+
+
+def _on_llm_error(node, model, seconds, error, plan, i):
+    """ Books a failed try; returns True when it was the last one """
+    model_router.record_failure(node, model, seconds)
+    if is_rate_limit_error(error):
+        rate_limiter.on_rate_limited(model)
+    if i == len(plan) - 1:
+        return True
+    action = "retrying" if plan[i + 1][0] == model else f"falling back to {plan[i + 1][0]}"
+    print(f"⚠ {node}: {model} failed ({type(error).__name__}), {action}")
+    return False
+
+
+def _valid_reply(node, content):
+    """ True when `content` is a complete reply in `node`'s response schema """
+    try:
+        NODE_LLM_SPECS[node][1].model_validate_json(content)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+async def ainvoke_llm(node, prompt):
+    """ Runs one LLM call for `node` and returns the raw response content """
+    start = time.perf_counter()
+    key = _cache_key(node, prompt)
+    if key:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            record_llm_call(node, time.perf_counter() - start, cache_hit=True)
+            return cached
+
+    temperature, schema = NODE_LLM_SPECS[node]
+    timeout = model_router.timeout(node)
+    reserved = estimate_tokens(prompt_text(prompt))
+    queue_seconds = 0.0
+    rate_limited = 0
+    plan = _attempt_plan(node)
+    for i, (model, retry) in enumerate(plan):
+        if retry:
+            await asyncio.sleep(backoff_seconds(retry - 1, LLM_RETRY_BACKOFF_SECONDS))
+        reservation = await rate_limiter.aacquire(model, reserved)
+        queue_seconds += reservation.waited
+        call_start = time.perf_counter()
+        try:
+            response = await llm_registry.get(model, temperature, schema, timeout).ainvoke(prompt)
+            break
+        except Exception as e:
+            rate_limited += is_rate_limit_error(e)
+            if _on_llm_error(node, model, time.perf_counter() - call_start, e, plan, i):
+                record_llm_call(node, time.perf_counter() - start, retries=i, queue_seconds=queue_seconds,
+                                lane=current_lane(), rate_limited=rate_limited, model=model)
+                raise
+
+    usage = getattr(response, "usage_metadata", None)
+    await rate_limiter.asettle(reservation, usage)
+    cost = model_router.record_success(node, model, time.perf_counter() - call_start, usage)
+    record_llm_call(
+        node, time.perf_counter() - start, usage, retries=i, cache_hit=False if key else None,
+        queue_seconds=queue_seconds, lane=current_lane(), rate_limited=rate_limited, model=model, cost=cost,
+    )
+    # Only replies the node's schema accepts are cached, so a repeated request doesn't replay a bad one
+    if key and _valid_reply(node, response.content):
+        await response_cache.aset(key, response.content)
+    return response.content
+
+
+# Sync callers (`chain.invoke`, `invoke_llm`, scripts and notebooks) run the
+# async code on one background event loop instead of a sync copy of it
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def run_sync(coroutine):
+    """ Runs `coroutine` on the background loop and returns its result; the caller's context (trace, lane) goes along """
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="workflow-sync-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _sync_loop).result()
+
+
+def invoke_llm(node, prompt):
+    """ Sync counterpart of `ainvoke_llm` """
+    return run_sync(ainvoke_llm(node, prompt))
+
+
+################### REPLY PARSING AND REPAIR #########################
+# ------------------------------------------------------ #
+# A reply that json.loads rejects is read item by item (partial_json).
+# Readable sections are kept. Each cut-off or malformed one is requested
+# again with its own section call (node "repair_section"). When the
+# damage can't be tied to section names, the node's call is re-sent with
+# a repair note. Unreadable repair replies are re-sent the same way, up to
+# JSON_REPAIR_ATTEMPTS times; only then does the node raise
+# PartialJSONError. The run keeps the LLM calls it has already made.
+
+# "false" restores strict parsing: any unreadable reply fails the run
+JSON_REPAIR = os.getenv("JSON_REPAIR", "true").lower() == "true"
+JSON_REPAIR_ATTEMPTS = int(os.getenv("JSON_REPAIR_ATTEMPTS", "2"))
+
+REPAIR_NOTE = (
+    "Your previous reply to this message could not be parsed: it was cut off or was not valid JSON. "
+    "Reply again with the complete JSON only."
 )
+
+
+def _with_repair_note(prompt):
+    if isinstance(prompt, str):
+        return f"{prompt}\n\n{REPAIR_NOTE}"
+    return [*prompt, HumanMessage(REPAIR_NOTE)]
+
+
+async def _ainvoke_all(node, prompts):
+    """ One call per prompt, concurrently; returns {name: content} """
+    contents = await asyncio.gather(*(ainvoke_llm(node, p) for p in prompts.values()))
+    return dict(zip(prompts, contents))
+
+
+def _read_section(content):
+    """ A {"section_name", "content"} reply as a dict, or None when it can't be read """
+    try:
+        return GeneratedConfig.model_validate(json.loads(content)).model_dump()
+    except ValueError:
+        return None
+
+
+def _resend_unreadable(node, prompts, contents):
+    """ Prompts, with the repair note, of the section replies that can't be read """
+    if not JSON_REPAIR:
+        return {}
+    resend = {name: _with_repair_note(prompts[name]) for name, c in contents.items() if _read_section(c) is None}
+    if resend:
+        print(f"⚠ {node}: re-sending unreadable section replies: {list(resend)}")
+        LLM_REPAIRS.inc(len(resend), node=node, repair="resend")
+    return resend
+
+
+def _section_contents(contents):
+    sections = {name: _read_section(c) for name, c in contents.items()}
+    unreadable = [name for name, section in sections.items() if section is None]
+    if unreadable:
+        raise PartialJSONError(f"Unreadable section replies: {unreadable}")
+    return {name: section["content"] for name, section in sections.items()}
+
+
+async def aread_sections(node, prompts, contents):
+    """
+    {name: content} of single-section replies. Replies that can't be read
+    are re-sent with the repair note; only those calls are repeated.
+    """
+    for _ in range(JSON_REPAIR_ATTEMPTS):
+        resend = _resend_unreadable(node, prompts, contents)
+        if not resend:
+            break
+        contents = {**contents, **await _ainvoke_all(node, resend)}
+    return _section_contents(contents)
+
+
+def _parsed_generated_state(content):
+    try:
+        return GeneratedState.model_validate(json.loads(content)).model_dump()
+    except ValueError:
+        return None
+
+
+def _salvage_generated_state(content, outline):
+    """
+    (order, sections, missing) from a damaged generated_state reply: the
+    section names in document order, the readable sections by name and the
+    names to request again. `missing` is None when the damage can't be tied
+    to section names (e.g. a reply cut off without a known outline).
+    """
+    scan = scan_list(content, "generated_content", GeneratedConfig)
+    sections = {sec["section_name"]: sec["content"] for sec in scan.items}
+    # The outline is only trusted if the reply kept to its names
+    if outline and set(sections) <= set(outline):
+        return list(outline), sections, [name for name in outline if name not in sections]
+    if scan.found and scan.complete and not scan.unreadable:
+        order = list(dict.fromkeys(scan.order))
+        return order, sections, [name for name in order if name not in sections]
+    return None, sections, None
+
+
+def _section_repair_prompts(user_state, order, missing, descriptions):
+    """ One `section_gen_prompt` per missing section, against the document's outline """
+    outline = "\n".join(f"{i}. {name}" for i, name in enumerate(order, start=1))
+    return {
+        name: section_gen_prompt.format_messages(
+            USER_CONFIG=format_user_config(user_state),
+            OUTLINE=outline,
+            SECTION_INDEX=order.index(name) + 1,
+            SECTION_NAME=name,
+            SECTION_DESCRIPTION=descriptions.get(name, ""),
+        )
+        for name in missing
+    }
+
+
+def _plan_generated_state_repair(node, content, outline, kept):
+    """
+    Reads a generated_state reply. Returns (state, None) when it parsed,
+    (None, plan) with plan = (order, sections, missing) when only some
+    sections must be requested again, or (None, None) when the whole reply
+    must be re-sent. Missing sections found in `kept` are taken from there.
+    """
+    state = _parsed_generated_state(content)
+    if state is not None:
+        return state, None
+    order, sections, missing = _salvage_generated_state(content, outline)
+    if missing is None:
+        print(f"⚠ {node}: reply unreadable, re-sending it")
+        LLM_REPAIRS.inc(node=node, repair="resend")
+        return None, None
+    for name in missing:
+        if name in kept:
+            sections[name] = kept[name]
+    missing = [name for name in missing if name not in sections]
+    print(f"⚠ {node}: kept {len(sections)} section(s), requesting {len(missing)} again: {missing}")
+    LLM_REPAIRS.inc(len(missing), node=node, repair="section")
+    return None, (order, sections, missing)
+
+
+def _merged_generated_state(order, sections):
+    return {"generated_content": [
+        {"section_name": name, "content": sections[name]} for name in order if name in sections
+    ]}
+
+
+async def aread_generated_state(node, prompt, content, user_state, outline=None, descriptions=None, kept=None):
+    """
+    Parsed `generated_state` reply of `node`. Damaged replies keep their
+    readable sections and only the rest is requested again (see above).
+    `outline` is the section list the reply must follow, if known;
+    `kept` maps section names to content to reuse instead of a repair call.
+    """
+    if not JSON_REPAIR:
+        return json.loads(content)
+
+    state, plan = _plan_generated_state_repair(node, content, outline, kept or {})
+    for _ in range(JSON_REPAIR_ATTEMPTS):
+        if state is not None or plan is not None:
+            break
+        state, plan = _plan_generated_state_repair(node, await ainvoke_llm(node, _with_repair_note(prompt)), outline, kept or {})
+    if state is None and plan is None:
+        raise PartialJSONError(f"{node}: reply unreadable after repair")
+    if state is not None:
+        return state
+
+    order, sections, missing = plan
+    prompts = _section_repair_prompts(user_state, order, missing, descriptions or {})
+    sections.update(await aread_sections("repair_section", prompts, await _ainvoke_all("repair_section", prompts)))
+    return _merged_generated_state(order, sections)
+
+
+def _salvage_evaluation(content):
+    """
+    An evaluation rebuilt from a damaged reply: the issues and changes that
+    are readable, plus the score and next_action. None when those two are
+    lost, or next_action asks for a refine its list can't back.
+    """
+    fields = scan_fields(content, ("coherency_score", "next_action", "evaluator_diagnostic_summary"))
+    if not isinstance(fields.get("coherency_score"), (int, float)):
+        return None
+    if fields.get("next_action") not in ("semantic_refine", "structural_refine", "no_action"):
+        return None
+
+    issues = scan_list(content, "semantic_issues", SemanticChangeConfig).items or "None"
+    changes = scan_list(content, "structural_changes", StructuralChangeConfig).items or "None"
+    if (fields["next_action"] == "semantic_refine" and issues == "None") or \
+            (fields["next_action"] == "structural_refine" and changes == "None"):
+        return None
+    return {
+        "coherency_score": fields["coherency_score"],
+        "semantic_issues": issues,
+        "structural_changes": changes,
+        "next_action": fields["next_action"],
+        "evaluator_diagnostic_summary": fields.get("evaluator_diagnostic_summary") or "(evaluation reply was cut off)",
+    }
+
+
+def read_evaluation(content, node="evaluator"):
+    """ Parsed evaluator reply, salvaged if damaged; None when unreadable """
+    try:
+        return json.loads(content)
+    except ValueError:
+        if not JSON_REPAIR:
+            raise
+    eval_data = _salvage_evaluation(content)
+    LLM_REPAIRS.inc(node=node, repair="salvaged" if eval_data else "resend")
+    return eval_data
+
+
+def _triage_result(content):
+    """ Parsed triage evaluation, or None when it can't be used (escalate) """
+    try:
+        eval_data = read_evaluation(content, "evaluator_triage")
+        score = float(eval_data["coherency_score"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    return None if model_router.needs_escalation(score) else eval_data
+
+
+async def aevaluate_llm(prompt):
+    """
+    Evaluator call. With triage configured, a small model scores first and
+    its result stands unless the score is in the grey zone (or the triage
+    call fails); then the evaluator's own models score the document.
+    """
+    if model_router.triage_enabled:
+        try:
+            eval_data = _triage_result(await ainvoke_llm("evaluator_triage", prompt))
+        except Exception as e:
+            print(f"⚠ evaluator triage failed ({type(e).__name__}), escalating")
+            model_router.needs_escalation(None)
+            eval_data = None
+        if eval_data is not None:
+            return eval_data
+
+    eval_data = read_evaluation(await ainvoke_llm("evaluator", prompt))
+    for _ in range(JSON_REPAIR_ATTEMPTS):
+        if eval_data is not None:
+            break
+        print("⚠ evaluator: reply unreadable, re-sending it")
+        eval_data = read_evaluation(await ainvoke_llm("evaluator", _with_repair_note(prompt)))
+    if eval_data is None:
+        raise PartialJSONError("evaluator: reply unreadable after repair")
+    return eval_data
+
+
+def _initial_draft_prompt(state: GraphState):
     # Extract user state
     user_state = state["user_state"]
     
@@ -497,35 +1159,48 @@ def generate_initial_draft(state: GraphState) -> GraphState:
     }
 
     # Format the prompt using the template
-    prompt = full_gen_prompt.format(**prompt_load)
-    
-    # Invoke the LLM with the formatted prompt
-    response = llm.invoke(prompt)
-    
-    # Assuming the response is what you want
-    return {"generated_state":json.loads(response.content)}
+    return full_gen_prompt.format_messages(**prompt_load)
 
 
-def evaluator(state: GraphState) -> GraphState:
-    """ Evaluates the generated content """
-    print("\n" + "="*60)
-    print("---EVALUATOR NODE---")
-    print("="*60 + "\n")
-          
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0.3,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    response_schema=EvaluatorState.model_json_schema(),  
-    response_mime_type = 'application/json',
-)
+def _expected_outline(user_state):
+    """ Section names the draft must follow, or None when the model picks them (dynamic mode) """
+    if user_state.get("dynamic_generation") == "true":
+        return None
+    names = [sec["section_name"] for sec in user_state.get("sections") or [] if sec.get("section_name")]
+    return names or None
+
+
+def _section_descriptions(state: GraphState):
+    """ What each section should cover, for section repair calls """
+    descriptions = {sec["section_name"]: sec.get("description") or "" for sec in state["user_state"].get("sections") or []}
+    changes = (state.get("evaluator_state") or {}).get("structural_changes")
+    if isinstance(changes, list):
+        descriptions.update({change["section_name"]: change["context"] for change in changes})
+    return descriptions
+
+
+@traced_node("generate_initial_draft")
+async def agenerate_initial_draft(state: GraphState) -> GraphState:
+    _print_banner("GENERATE INITIAL DRAFT NODE")
+
+    prompt = _initial_draft_prompt(state)
+
+    # Await the LLM so the event loop stays free for other requests
+    content = await ainvoke_llm("generate_initial_draft", prompt)
+
+    user_state = state["user_state"]
+    return {"generated_state": await aread_generated_state(
+        "generate_initial_draft", prompt, content, user_state,
+        outline=_expected_outline(user_state), descriptions=_section_descriptions(state),
+    )}
+
+
+def _evaluator_prompt(state: GraphState):
     user_state = state["user_state"]
     generated_state = state["generated_state"]
 
     # Format the user fields as required
-    formatted_user_config = format_user_config(user_state)
+    formatted_user_config = format_user_config(user_state, LOOP_CONTEXT_TOKEN_BUDGET)
     # Format the generated content as required
     formatted_generated_content = format_generated_content(generated_state["generated_content"])
 
@@ -537,12 +1212,83 @@ def evaluator(state: GraphState) -> GraphState:
     }
 
     # Format the prompt using the template
-    prompt = evaluator_prompt.format(**prompt_load)
+    return evaluator_prompt.format_messages(**prompt_load)
+
 
-    # Invoke the LLM with the formatted prompt
-    response = llm.invoke(prompt)
-    eval_data = json.loads(response.content)
+def _changed_sections(state: GraphState):
+    """
+    Names of the sections edited since `previous_evaluation`, or None when a
+    full evaluation is needed (no previous evaluation, or the outline changed).
+    """
+    previous = state.get("previous_evaluation")
+    if not previous:
+        return None
 
+    current = state["generated_state"]["generated_content"]
+    if [s["section_name"] for s in previous["sections"]] != [sec["section_name"] for sec in current]:
+        return None
+
+    previous_hashes = {s["section_name"]: s["hash"] for s in previous["sections"]}
+    return {sec["section_name"] for sec in current if section_hash(sec) != previous_hashes[sec["section_name"]]}
+
+
+def _incremental_evaluator_prompt(state: GraphState, changed):
+    user_state = state["user_state"]
+    generated_content = state["generated_state"]["generated_content"]
+
+    # Unchanged sections are only shown as short excerpts for the cross-section coherence check
+    outline = []
+    for i, sec in enumerate(generated_content, start=1):
+        if sec["section_name"] in changed:
+            outline.append(f"{i}. {sec['section_name']} (CHANGED)")
+        else:
+            excerpt = sec["content"][:200].replace("\n", " ")
+            outline.append(f"{i}. {sec['section_name']} : {excerpt}...")
+
+    prompt_load = {
+        "USER_CONFIG": format_user_config(user_state, LOOP_CONTEXT_TOKEN_BUDGET),
+        "ALLOW_DYNAMIC_CONTENT_GENERATION": user_state["dynamic_generation"],
+        "OUTLINE": "\n".join(outline),
+        "CHANGED_CONTENT": format_generated_content([sec for sec in generated_content if sec["section_name"] in changed]),
+    }
+    return incremental_evaluator_prompt.format_messages(**prompt_load)
+
+
+def _merge_incremental_evaluation(state: GraphState, eval_data, changed):
+    """ Keeps the previous semantic issues of untouched sections and re-derives next_action """
+    previous = state["previous_evaluation"]
+
+    issues = [
+        issue for issue in (eval_data["semantic_issues"] if isinstance(eval_data["semantic_issues"], list) else [])
+        if issue["section_name"] in changed
+    ]
+    if isinstance(previous["semantic_issues"], list):
+        issues += [issue for issue in previous["semantic_issues"] if issue["section_name"] not in changed]
+    eval_data["semantic_issues"] = issues or "None"
+
+    if isinstance(eval_data["structural_changes"], list) and eval_data["structural_changes"]:
+        eval_data["next_action"] = "structural_refine"
+    elif issues:
+        eval_data["next_action"] = "semantic_refine"
+    else:
+        eval_data["next_action"] = "no_action"
+    return eval_data
+
+
+def _unchanged_evaluation(state: GraphState):
+    """ Nothing was edited: reuse the previous evaluation without an LLM call """
+    previous = state["previous_evaluation"]
+    issues = previous["semantic_issues"]
+    return {
+        "coherency_score": previous["coherency_score"],
+        "semantic_issues": issues,
+        "structural_changes": "None",
+        "next_action": "semantic_refine" if isinstance(issues, list) and issues else "no_action",
+        "evaluator_diagnostic_summary": "No sections changed since the previous evaluation.",
+    }
+
+
+def _record_evaluation(state: GraphState, eval_data) -> GraphState:
 
     # ---------- PRETTY PRINT SUMMARY ----------
     print("🔍 Evaluation Summary")
@@ -566,41 +1312,136 @@ def evaluator(state: GraphState) -> GraphState:
         "evaluator_diagnostic_summary": eval_data["evaluator_diagnostic_summary"],
     })
 
-    return state
+    state["stop_reason"] = loop_stop_reason(state)
+    if state["stop_reason"]:
+        print(f"⏹ Refine loop stopped: {state['stop_reason']} (iterations: {state.get('iteration', 0)})")
+
+    # Return only the evaluator-owned keys; echoing the whole state would
+    # re-apply reducers such as `section_drafts` on every evaluation.
+    # The previous evaluation only applies to the first pass of the run.
+    return {
+        "evaluator_state": state["evaluator_state"],
+        "evaluator_history": state["evaluator_history"],
+        "stop_reason": state["stop_reason"],
+        "previous_evaluation": None,
+    }
 
 
+@traced_node("evaluator")
+async def aevaluator(state: GraphState) -> GraphState:
+    """ Evaluates the generated content """
+    _print_banner("EVALUATOR NODE")
+
+    changed = _changed_sections(state)
+    if changed is None:
+        prompt = _evaluator_prompt(state)
+        eval_data = await aevaluate_llm(prompt)
+    elif changed:
+        print(f"Incremental evaluation of {len(changed)} changed section(s): {sorted(changed)}")
+        prompt = _incremental_evaluator_prompt(state, changed)
+        eval_data = _merge_incremental_evaluation(state, await aevaluate_llm(prompt), changed)
+    else:
+        eval_data = _unchanged_evaluation(state)
+
+    return _record_evaluation(state, eval_data)
+
     
 def should_refine_edge(state: GraphState) -> GraphState:
     """ Decides if generated content needs refinement """
-    evaluated_state = state["evaluator_state"]
-    next_action = evaluated_state["next_action"]
-    if next_action != "no_action":
-        return next_action
-    return END
+    if state.get("stop_reason"):
+        return END
+    return state["evaluator_state"]["next_action"]
     
 
 
-def semantic_refine(state:GraphState) -> GraphState:
-    """ Semantic refinement of sections """
-    print("\n" + "="*60)
-    print("---SEMANTIC REFINEMENT NODE---")
-    print("="*60 + "\n")
+def _refine_update(state: GraphState, generated_state):
+    # Every refine round counts against MAX_REFINE_ITERATIONS
+    return {
+        "generated_state": generated_state,
+        "iteration": state.get("iteration", 0) + 1,
+    }
 
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    response_schema=GeneratedState.model_json_schema(),  
-    response_mime_type = 'application/json',
-)
+
+def _flagged_sections(state: GraphState):
+    """ Maps each section named in `semantic_issues` to its issues, in document order """
+    issues = state["evaluator_state"]["semantic_issues"]
+    if not isinstance(issues, list):
+        return {}
+
+    by_name = {}
+    for issue in issues:
+        by_name.setdefault(issue["section_name"], []).append(issue)
+
+    return {
+        sec["section_name"]: by_name[sec["section_name"]]
+        for sec in state["generated_state"]["generated_content"]
+        if sec["section_name"] in by_name
+    }
+
+
+def _semantic_refine_prompts(state: GraphState):
+    """ One prompt per flagged section """
+    generated_content = state["generated_state"]["generated_content"]
+    current = {sec["section_name"]: sec["content"] for sec in generated_content}
+
+    # Format the user fields as required
+    formatted_user_config = format_user_config(state["user_state"], LOOP_CONTEXT_TOKEN_BUDGET)
+    outline = "\n".join(f"{i}. {sec['section_name']}" for i, sec in enumerate(generated_content, start=1))
+
+    prompts = {}
+    for name, issues in _flagged_sections(state).items():
+        feedback = "\n".join(
+            f"{i}. Issue: {issue['issue']}\n   - Suggestion: {issue['suggestion']}"
+            for i, issue in enumerate(issues, start=1)
+        )
+        prompt_load = {
+            "USER_CONFIG": formatted_user_config,
+            "OUTLINE": outline,
+            "SECTION_NAME": name,
+            "SECTION_CONTENT": current[name],
+            "SEMANTIC_FEEDBACK": feedback,
+        }
+        prompts[name] = semantic_refine_prompt.format_messages(**prompt_load)
+    return prompts
+
+
+def _merge_refined_sections(state: GraphState, refined):
+    """
+    Merges rewritten sections back by name. Unflagged sections are passed
+    through as-is, so they stay byte-for-byte identical.
+    """
+    generated_content = [
+        {"section_name": sec["section_name"], "content": refined[sec["section_name"]]}
+        if sec["section_name"] in refined else sec
+        for sec in state["generated_state"]["generated_content"]
+    ]
+    return {
+        "generated_state": {"generated_content": generated_content},
+        "iteration": state.get("iteration", 0) + 1,
+    }
+
+
+@traced_node("semantic_refine")
+async def asemantic_refine(state:GraphState) -> GraphState:
+    """ Semantic refinement of the flagged sections only """
+    _print_banner("SEMANTIC REFINEMENT NODE")
+
+    prompts = _semantic_refine_prompts(state)
+    print(f"Refining {len(prompts)} flagged section(s): {list(prompts)}")
+
+    # Rewrite flagged sections concurrently
+    contents = await _ainvoke_all("semantic_refine", prompts)
+
+    return _merge_refined_sections(state, await aread_sections("semantic_refine", prompts, contents))
+
+
+def _structural_refine_prompt(state: GraphState):
     user_state = state["user_state"]
     generated_state = state["generated_state"]
     evaluator_state = state["evaluator_state"]
 
     # Format the user fields as required
-    formatted_user_config = format_user_config(user_state)
+    formatted_user_config = format_user_config(user_state, LOOP_CONTEXT_TOKEN_BUDGET)
     # Format the generated content as required
     formatted_generated_content = format_generated_content(generated_state["generated_content"])
     # Format the evaluator content as required
@@ -611,68 +1452,151 @@ def semantic_refine(state:GraphState) -> GraphState:
     prompt_load = {
         "USER_CONFIG": formatted_user_config,
         "GENERATED_CONTENT": formatted_generated_content,
-        "SEMANTIC_FEEDBACK": formatted_evaluation,
+        "STRUCTURAL_FEEDBACK": formatted_evaluation,
     }
 
     # Format the prompt using the template
-    prompt = semantic_refine_prompt.format(**prompt_load)
+    return structural_refine_prompt.format_messages(**prompt_load)
+
+
+def _untouched_sections(state: GraphState):
+    """ Current sections no structural change names; they must come back unchanged """
+    changes = state["evaluator_state"]["structural_changes"]
+    touched = {change["section_name"] for change in changes} if isinstance(changes, list) else set()
+    return {
+        sec["section_name"]: sec["content"]
+        for sec in state["generated_state"]["generated_content"]
+        if sec["section_name"] not in touched
+    }
 
-    # Invoke the LLM with the formatted prompt
-    response = llm.invoke(prompt)
-    
-    return {"generated_state":json.loads(response.content)}
 
-def structural_refine(state:GraphState) -> GraphState:
+@traced_node("structural_refine")
+async def astructural_refine(state:GraphState) -> GraphState:
     """ Structural refinement of sections """
-    print("\n" + "="*60)
-    print("---STRUCTURAL REFINEMENT NODE---")
-    print("="*60 + "\n")
+    _print_banner("STRUCTURAL REFINEMENT NODE")
 
-    llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    response_schema=GeneratedState.model_json_schema(),  
-    response_mime_type = 'application/json',
-)
-    user_state = state["user_state"]
-    generated_state = state["generated_state"]
-    evaluator_state = state["evaluator_state"]
+    prompt = _structural_refine_prompt(state)
 
-    # Format the user fields as required
-    formatted_user_config = format_user_config(user_state)
-    # Format the generated content as required
-    formatted_generated_content = format_generated_content(generated_state["generated_content"])
-    # Format the evaluator content as required
-    formatted_evaluation = format_evaluation(evaluator_state)
+    content = await ainvoke_llm("structural_refine", prompt)
 
+    return _refine_update(state, await aread_generated_state(
+        "structural_refine", prompt, content, state["user_state"],
+        descriptions=_section_descriptions(state), kept=_untouched_sections(state),
+    ))
+
+################### SECTION-PARALLEL GENERATION #########################
+# ------------------------------------------------------ #
+# outline_sections → generate_section (one Send per section) → stitch_sections → evaluator
+
+
+def _outline(user_state):
+    """
+    The named user-defined sections, first occurrence of each name only:
+    sections are stitched and refined by name, so two sections sharing a
+    name would get the same rewrite.
+    """
+    outline = {}
+    for sec in user_state.get("sections") or []:
+        if sec.get("section_name") and sec["section_name"] not in outline:
+            outline[sec["section_name"]] = {"section_name": sec["section_name"], "description": sec.get("description") or ""}
+    return list(outline.values())
+
+
+@traced_node("outline_sections")
+def outline_sections(state: GraphState) -> GraphState:
+    """ Fixes the section list from the user-defined sections """
+    _print_banner("OUTLINE SECTIONS NODE")
+
+    return {"outline": _outline(state["user_state"])}
+
+
+def fan_out_sections(state: GraphState):
+    """ One `generate_section` task per outline entry, run concurrently """
+    return [
+        Send("generate_section", {"user_state": state["user_state"], "outline": state["outline"], "index": i})
+        for i in range(len(state["outline"]))
+    ]
+
+
+def _section_prompt(task: SectionTask):
+    outline = task["outline"]
+    section = outline[task["index"]]
 
-    # Prepare the input for the prompt
     prompt_load = {
-        "USER_CONFIG": formatted_user_config,
-        "GENERATED_CONTENT": formatted_generated_content,
-        "STRUCTURAL_FEEDBACK": formatted_evaluation,
+        "USER_CONFIG": format_user_config(task["user_state"]),
+        "OUTLINE": "\n".join(f"{i}. {sec['section_name']}" for i, sec in enumerate(outline, start=1)),
+        "SECTION_INDEX": task["index"] + 1,
+        "SECTION_NAME": section["section_name"],
+        "SECTION_DESCRIPTION": section["description"],
     }
+    return section_gen_prompt.format_messages(**prompt_load)
 
-    # Format the prompt using the template
-    prompt = structural_refine_prompt.format(**prompt_load)
 
-    # Invoke the LLM with the formatted prompt
-    response = llm.invoke(prompt)
-    
-    return {"generated_state":json.loads(response.content)}
+def _section_draft(task: SectionTask, content):
+    # The outline is authoritative for naming and ordering
+    return {"section_drafts": [{
+        "index": task["index"],
+        "section_name": task["outline"][task["index"]]["section_name"],
+        "content": content,
+    }]}
+
+
+@traced_node("generate_section")
+async def agenerate_section(task: SectionTask) -> GraphState:
+    prompts = {task["index"]: _section_prompt(task)}
+    contents = {task["index"]: await ainvoke_llm("generate_section", prompts[task["index"]])}
+    return _section_draft(task, (await aread_sections("generate_section", prompts, contents))[task["index"]])
+
+
+@traced_node("stitch_sections")
+def stitch_sections(state: GraphState) -> GraphState:
+    """
+    Assembles the parallel drafts in outline order. Cross-section coherence
+    is then checked by the evaluator, which routes to the refiners if needed.
+    """
+    _print_banner("STITCH SECTIONS NODE")
+
+    drafts = sorted(state["section_drafts"], key=lambda d: d["index"])
+    generated_content = [
+        {"section_name": d["section_name"], "content": d["content"]}
+        for d in drafts
+    ]
+    return {"generated_state": {"generated_content": generated_content}}
 
     
 def supervisor(state:GraphState) -> GraphState:
     supervisor_state = state["supervisor_state"]
     if supervisor_state["trigger_action"] == "generate":
+        user_state = state["user_state"]
+        # Without a named section there is nothing to fan out: draft the whole document instead
+        if user_state.get("parallel_sections") == "true" and _outline(user_state):
+            return "outline_sections"
         return "generate_initial_draft"
     elif supervisor_state["trigger_action"] == "evaluate":
         return "evaluator"
     # return "generate_initial_draft"
 
+# Sync nodes, so the compiled chain serves `chain.invoke` as well as `chain.ainvoke`
+def generate_initial_draft(state: GraphState) -> GraphState:
+    return run_sync(agenerate_initial_draft(state))
+
+
+def evaluator(state: GraphState) -> GraphState:
+    return run_sync(aevaluator(state))
+
+
+def semantic_refine(state: GraphState) -> GraphState:
+    return run_sync(asemantic_refine(state))
+
+
+def structural_refine(state: GraphState) -> GraphState:
+    return run_sync(astructural_refine(state))
+
+
+def generate_section(task: SectionTask) -> GraphState:
+    return run_sync(agenerate_section(task))
+
+
 # Create the graph
 graph = StateGraph(GraphState)
 
@@ -680,16 +1604,24 @@ graph = StateGraph(GraphState)
 graph.add_conditional_edges(
     START,
     supervisor, 
-    ["generate_initial_draft", "evaluator"]
+    ["generate_initial_draft", "outline_sections", "evaluator"]
 )
-graph.add_node("generate_initial_draft", generate_initial_draft)
-graph.add_node("evaluator",evaluator)
-graph.add_node("semantic_refine", semantic_refine)
-graph.add_node("structural_refine",structural_refine)
+# Each LLM node has a sync and an async implementation, so the compiled
+# chain serves both `chain.invoke` and `chain.ainvoke` (used by FastAPI).
+graph.add_node("generate_initial_draft", RunnableLambda(generate_initial_draft, afunc=agenerate_initial_draft))
+graph.add_node("evaluator", RunnableLambda(evaluator, afunc=aevaluator))
+graph.add_node("semantic_refine", RunnableLambda(semantic_refine, afunc=asemantic_refine))
+graph.add_node("structural_refine", RunnableLambda(structural_refine, afunc=astructural_refine))
+graph.add_node("outline_sections", outline_sections)
+graph.add_node("generate_section", RunnableLambda(generate_section, afunc=agenerate_section))
+graph.add_node("stitch_sections", stitch_sections)
 
 # Set entry point and edges
 # graph.set_entry_point("generate_initial_draft")
 graph.add_edge("generate_initial_draft", "evaluator")
+graph.add_conditional_edges("outline_sections", fan_out_sections, ["generate_section"])
+graph.add_edge("generate_section", "stitch_sections")
+graph.add_edge("stitch_sections", "evaluator")
 graph.add_edge("evaluator",END)
 graph.add_conditional_edges(
     "evaluator",
@@ -702,3 +1634,5 @@ graph.add_edge("structural_refine", "evaluator")
 
 # Compile the graph
 chain = graph.compile()
+# The same graph with per-run checkpoints, used by /generate and /evaluate (None when disabled)
+checkpointed_chain = graph.compile(checkpointer=checkpointer) if checkpointer else None
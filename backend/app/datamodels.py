@@ -27,19 +27,77 @@ class GenerateStateInput(BaseModel):
     sections: Optional[List[UserSectionDefination]] = []
     constraints: Optional[str] = ""
     context: Optional[str] = ""
+    # Generate each user-defined section concurrently instead of in one prompt
+    parallel_sections: Optional[Literal["true", "false"]] = "false"
+    # Retry key: with CHECKPOINT_DB_PATH set, a retried request resumes this run
+    run_id: Optional[str] = None
+
+
+class GenerateBatchRequest(BaseModel):
+    items: List[GenerateStateInput]
+    max_concurrency: Optional[int] = None  # capped at GENERATE_BATCH_CONCURRENCY
+
+
+# -----------------------------
+# Previous evaluation (returned by /evaluate as `evaluation_snapshot`)
+# -----------------------------
+class SectionHash(BaseModel):
+    section_name: Optional[str] = None
+    hash: str
+
+class SemanticIssue(BaseModel):
+    section_name: str
+    issue: str
+    suggestion: str
+
+class PreviousEvaluation(BaseModel):
+    sections: List[SectionHash]
+    coherency_score: float
+    semantic_issues: Union[Literal["None"], List[SemanticIssue]] = "None"
+
+
+# -----------------------------
+# Stored documents: changes sent instead of the full content
+# -----------------------------
+class SectionEdit(BaseModel):
+    id: Optional[str] = None  # omit to add a new section
+    section_name: Optional[str] = None
+    content: Optional[str] = None
+
+class DocumentDelta(BaseModel):
+    sections: List[SectionEdit] = []
+    removed: List[str] = []  # section ids
+    order: Optional[List[str]] = None  # section ids; unlisted sections keep their relative order after these
+
+class DocumentCreate(BaseModel):
+    main_topic: str
+    dynamic_generation: Optional[Literal["true", "false"]] = "false"
+    expected_sections_count: Optional[str] = ""
+    sections: Optional[List[UserSectionDefination]] = []
+    constraints: Optional[str] = ""
+    context: Optional[str] = ""
+    generated_content: List[GeneratedSectionStructure]
 
 
 # -----------------------------
 # Eval State for Graph
 # -----------------------------
 class EvalStateInput(BaseModel):
-    main_topic: str
+    # main_topic and generated_content are required unless document_id is set
+    main_topic: Optional[str] = None
     dynamic_generation: Optional[Literal["true", "false"]] = "false"
     expected_sections_count: Optional[str] = ""
     sections: Optional[List[UserSectionDefination]] = []
     constraints: Optional[str] = ""
     context: Optional[str] = ""
-    generated_content: List[GeneratedSectionStructure] 
+    generated_content: Optional[List[GeneratedSectionStructure]] = None
+    # Re-score only the sections whose hash changed since this evaluation
+    previous_evaluation: Optional[PreviousEvaluation] = None
+    # Stored document to evaluate (see DocumentDelta) instead of generated_content
+    document_id: Optional[str] = None
+    delta: Optional[DocumentDelta] = None
+    # Retry key: with CHECKPOINT_DB_PATH set, a retried request resumes this run
+    run_id: Optional[str] = None
 
 
 
@@ -53,5 +111,20 @@ class Section(BaseModel):
 
 
 class GenerateRequest(BaseModel):
+    generated_content: Optional[List[Section]] = None  # required unless document_id is set
+    type: str  # "doc" or "pptx"
+    template: Optional[str] = None  # name of an uploaded template, default built-in
+    document_id: Optional[str] = None
+    version: Optional[int] = None  # export an earlier version of the stored document
+    delta: Optional[DocumentDelta] = None
+
+
+class BatchExportItem(BaseModel):
     generated_content: List[Section]
-    type: str  # "doc" or "pptx"
\ No newline at end of file
+    name: Optional[str] = None  # file name stem inside the archive
+    template: Optional[str] = None
+
+
+class BatchExportRequest(BaseModel):
+    items: List[BatchExportItem]
+    types: List[str] = ["doc", "ppt"]  # every item is exported in each format
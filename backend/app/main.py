@@ -1,18 +1,133 @@
 from fastapi import FastAPI, HTTPException, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.datamodels import GenerateStateInput, EvalStateInput, GenerateRequest
-from app.agents.workflow import chain
+from app.datamodels import (
+    GenerateStateInput, EvalStateInput, GenerateRequest, BatchExportRequest,
+    DocumentCreate, DocumentDelta, Section, GenerateBatchRequest,
+)
+from app.agents.llm_registry import llm_registry
+from app.agents.model_routing import model_router
+from app.agents.llm_cache import response_cache
+from app.agents.tracing import start_trace, render_prometheus, GRAPH_RUN_REQUESTS
+from app.agents.rate_limit import rate_limiter, set_llm_lane
+from app.agents.shared_state import shared_state
+import asyncio
+import copy
+import functools
+import hashlib
+import importlib
+import json
+import os
+import time
 import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+import anyio
+
+
+
+from app.service.export import (
+    EXPORT_FORMATS, EXPORT_BATCH_MAX_ITEMS, EXPORT_TEMPLATE_MAX_BYTES, ExportTooLargeError,
+    build_export, iter_spool, stream_export_batch, shutdown_process_pool, TemplateNotFoundError,
+)
+from app.service.sse import stream_graph_events
+from app.service.jobs import JobManager, QueueFullError
+from app.service.batch import run_batch, GENERATE_BATCH_CONCURRENCY, GENERATE_BATCH_MAX_ITEMS
+from app.service.documents import open_document_store, delta_sections, DocumentNotFoundError, InvalidDeltaError
+
+# --------------------------
+# LAZY WORKFLOW AND WARM-UP
+# --------------------------
+# Importing app.agents.workflow loads LangChain and LangGraph and compiles
+# the graph, and the first LLM client loads its provider SDK: seconds of
+# CPU. This module doesn't import any of it, so a new worker answers `/`
+# right away. The lifespan starts a warm-up that imports the workflow,
+# builds the LLM clients and parses the export templates in a background
+# thread. Requests that need the graph before that wait for the import.
+
+_workflow = None
+_workflow_import = None
+warm_up_status = {"done": False, "seconds": None, "error": None}
+
+
+def _import_workflow():
+    global _workflow
+    _workflow = importlib.import_module("app.agents.workflow")
+    return _workflow
+
+
+async def load_workflow():
+    """ app.agents.workflow, imported off the event loop (once) """
+    global _workflow_import
+    if _workflow is not None:
+        return _workflow
+    if _workflow_import is None:
+        _workflow_import = asyncio.ensure_future(anyio.to_thread.run_sync(_import_workflow))
+    try:
+        return await asyncio.shield(_workflow_import)
+    except Exception:
+        # The next caller tries the import again
+        _workflow_import = None
+        raise
+
+
+def workflow():
+    """ app.agents.workflow, for code that runs after load_workflow() (instant by then) """
+    return _workflow or _import_workflow()
+
+
+_document_store = None
 
 
+def document_store():
+    """ The document store, opened by the lifespan (or on first use when the app runs without one) """
+    global _document_store
+    if _document_store is None:
+        _document_store = open_document_store()
+    return _document_store
 
-import io
-from docx import Document
-from pptx import Presentation
-from app.service.format_output_file import build_docx, build_pptx
 
-app = FastAPI()
+async def in_document_store(method, *args, **kwargs):
+    """ Runs a DocumentStore method in a worker thread: SQLite commits block """
+    return await anyio.to_thread.run_sync(functools.partial(getattr(document_store(), method), *args, **kwargs))
+
+
+async def load_template_cache():
+    """ The export template cache; importing it loads python-docx and python-pptx, off the event loop """
+    engine = await anyio.to_thread.run_sync(importlib.import_module, "app.service.export_engine")
+    return engine.template_cache
+
+
+async def warm_up():
+    start = time.perf_counter()
+    try:
+        wf = await load_workflow()
+        await anyio.to_thread.run_sync(wf.build_llm_clients)
+        # Parse and style the built-in export templates once, off the event loop
+        await anyio.to_thread.run_sync((await load_template_cache()).warm)
+    except Exception as e:
+        # Requests still load what they need on first use
+        warm_up_status["error"] = str(e)
+        print(f"⚠ Warm-up failed: {e}")
+    warm_up_status["done"] = True
+    warm_up_status["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"🔥 Warm-up done in {warm_up_status['seconds']}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # An unreachable shared state backend fails the worker at startup, not on its first request
+    await anyio.to_thread.run_sync(shared_state.stats)
+    store = await anyio.to_thread.run_sync(document_store)
+    print(f"📄 Document store: {store.path}")
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    await warm_up_task
+    await job_manager.shutdown()
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 origins = [
     "http://localhost:5173",
 ]
@@ -25,6 +140,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Several API workers (e.g. `fastapi run --workers 4`) share caches, job status,
+# rate-limit windows and run checkpoints through SHARED_STATE_URL, see
+# app/agents/shared_state.py
+async def load_chain():
+    return (await load_workflow()).chain
+
+
+job_manager = JobManager(load_chain, state=shared_state if shared_state.shared else None)
 
 
 @app.get("/")
@@ -32,11 +155,160 @@ async def root():
     return {"status": "online"}
 
 
+@app.get("/stats")
+async def stats():
+    checkpointer = (await load_workflow()).checkpointer
+    return {
+        "warm_up": warm_up_status,
+        "llm_clients": llm_registry.stats(),
+        "llm_cache": response_cache.stats(),
+        "jobs": job_manager.stats(),
+        "llm_rate_limits": rate_limiter.stats(),
+        "model_routing": model_router.stats(),
+        "checkpoints": checkpointer.stats() if checkpointer else None,
+        "shared_state": await anyio.to_thread.run_sync(shared_state.stats),
+        "coalescing": {**coalesce_stats, "enabled": COALESCE_REQUESTS, "in_flight": len(_in_flight_runs)},
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """ Prometheus text exposition of per-node latency, token, retry and cache metrics """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# --------------------------
+# RESUMABLE RUNS
+# --------------------------
+# With CHECKPOINT_DB_PATH set, /generate and /evaluate checkpoint every run
+# under its run id (sent by the client, or made up and returned), see
+# app/agents/checkpoints.py. Retrying with the same run_id resumes a failed
+# run, or returns the payload of one that already succeeded.
+
+
+def new_run_id(run_id):
+    return run_id or (str(uuid.uuid4()) if workflow().checkpointer else None)
+
+
+async def finished_run_payload(key):
+    """ Payload of an earlier success of this run, if it is still kept """
+    checkpointer = workflow().checkpointer
+    if checkpointer is None:
+        return None
+    payload = await anyio.to_thread.run_sync(checkpointer.finished_payload, key)
+    if payload is not None:
+        checkpointer.replayed += 1
+    return payload
+
+
+async def run_graph(make_input_state, key):
+    """
+    Runs the graph on `await make_input_state()`. With checkpoints, a run
+    that stopped part-way resumes after its last completed node instead of
+    starting over at START. The input is only built once the run is
+    claimed, and never for a resumed run: an /evaluate delta was already
+    applied by the attempt that failed.
+    """
+    wf = await load_workflow()
+    checkpointer, checkpointed_chain = wf.checkpointer, wf.checkpointed_chain
+    if checkpointed_chain is None:
+        return await wf.chain.ainvoke(await make_input_state())
+
+    # The checkpointer's own calls run in a worker thread, like its async saver methods
+    if not await anyio.to_thread.run_sync(checkpointer.claim, key):
+        raise HTTPException(status_code=409, detail=f"Run {key} is already in progress")
+    try:
+        config = {"configurable": {"thread_id": key}}
+        snapshot = await checkpointed_chain.aget_state(config)
+        if snapshot.next:
+            print(f"↻ Resuming run {key} at {list(snapshot.next)}")
+            checkpointer.resumed += 1
+            # The refine deadline counts from this attempt, not from the one that failed
+            config = await checkpointed_chain.aupdate_state(
+                config, {"deadline": time.time() + wf.REFINE_DEADLINE_SECONDS}
+            )
+            return await checkpointed_chain.ainvoke(None, config)
+        if snapshot.values:
+            # The run finished, but the process stopped before its payload was kept
+            return snapshot.values
+        return await checkpointed_chain.ainvoke(await make_input_state(), config)
+    finally:
+        await anyio.to_thread.run_sync(checkpointer.release, key)
+
+
+# --------------------------
+# COALESCED RUNS
+# --------------------------
+# Double-clicks and client retries after a timeout send the same /generate
+# or /evaluate body while the first run is still going. Such a request
+# awaits the run already in flight instead of starting its own graph run.
+# Every caller then builds its own payload from a copy of the result, so
+# each gets its own stored version and section ids. Coalescing is per
+# worker process.
+
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+_in_flight_runs = {}  # request hash -> (run_id, task running the graph, its trace)
+coalesce_stats = {"started": 0, "coalesced": 0}
+
+
+def request_hash(kind, graph_input):
+    """ Canonical hash of a request's graph input: key order and formatting of the body don't matter """
+    canonical = json.dumps([kind, graph_input], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def join_or_start_run(kind, graph_input, run_id, trace, start_run):
+    """
+    (run_id, task, trace) of the identical run already in flight, or of a
+    new task running `start_run(run_id)` and recording into `trace`. A
+    request that joins takes over the run_id of the run it joined, so its
+    retries resume that run, and its trace, which is the one that has the
+    nodes and LLM calls.
+    """
+    digest = request_hash(kind, graph_input)
+    if COALESCE_REQUESTS and digest in _in_flight_runs:
+        coalesce_stats["coalesced"] += 1
+        GRAPH_RUN_REQUESTS.inc(endpoint=kind, run="coalesced")
+        return _in_flight_runs[digest]
+
+    # The task copies this request's context: its trace and LLM lane
+    task = asyncio.ensure_future(start_run(run_id))
+    coalesce_stats["started"] += 1
+    GRAPH_RUN_REQUESTS.inc(endpoint=kind, run="started")
+    if COALESCE_REQUESTS:
+        _in_flight_runs[digest] = (run_id, task, trace)
+
+        def done(finished):
+            _in_flight_runs.pop(digest, None)
+            # Marks a failure as retrieved even if every caller went away
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(done)
+    return run_id, task, trace
+
+
+async def run_result(task):
+    """ A copy of the run's result for one caller: building a payload writes section ids into it """
+    # A caller that disconnects doesn't cancel the run the others are waiting on
+    return copy.deepcopy(await asyncio.shield(task))
+
+
+async def finish_run(key, run_id, payload):
+    checkpointer = workflow().checkpointer
+    if checkpointer is not None:
+        payload["run_id"] = run_id
+        await anyio.to_thread.run_sync(checkpointer.finish, key, payload)
+    return payload
+
+
 @app.post("/generate")  
-async def generate_document(req: GenerateStateInput):  ## Payload of necessary fields is auto validated
+async def generate_document(req: GenerateStateInput, debug: bool = False):  ## Payload of necessary fields is auto validated
     """
     Triggers full graph execution:
     supervisor → initial draft → evaluator → refinements → final draft
+
+    `?debug=true` attaches the per-node trace of this run to the response.
     """
 
     # ---- 1. Early validation ----
@@ -46,44 +318,214 @@ async def generate_document(req: GenerateStateInput):  ## Payload of necessary f
             detail="Missing required field: main_topic"
         )
 
-    # ---- 2. Prepare graph input ----
-    input_state = {
-        "supervisor_state": {"trigger_action": "generate"},
-        "user_state": req.model_dump()
-    }
-
-    # ---- 3. Run graph ----
+    # ---- 2. Prepare graph run ----
+    await load_workflow()
+    run_id = new_run_id(req.run_id)
+    key = f"generate:{run_id}"
+    if (payload := await finished_run_payload(key)) is not None:
+        return payload
+
+    async def input_state():
+        return generate_input_state(req)
+
+    # ---- 3. Run graph (or resume it, see RESUMABLE RUNS), or join the identical run in flight ----
+    own_trace = start_trace()
+    run_id, run, trace = join_or_start_run(
+        "generate", req.model_dump(mode="json", exclude={"run_id"}), run_id, own_trace,
+        lambda run_id: run_graph(input_state, f"generate:{run_id}"),
+    )
+    key = f"generate:{run_id}"
     try:
-        result = chain.invoke(input_state)
+        result = await run_result(run)
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Graph execution error ONLY (500)
         raise HTTPException(
             status_code=500,
             detail={
                 "error": "GraphExecutionError",
-                "message": str(e)
+                "message": str(e),
+                "run_id": run_id,
+            }
+        )
+
+    return_payload = await finish_run(key, run_id, await build_generate_payload(result))
+    if debug:
+        # A request that joined another's run shows that run's trace
+        return_payload["trace"] = {**trace.to_dict(), "coalesced": trace is not own_trace}
+    return return_payload
+
+
+def generate_input_state(req: GenerateStateInput):
+    return generate_input_state_from(req.model_dump(exclude={"run_id"}))
+
+
+def generate_input_state_from(user_state):
+    return {
+        "supervisor_state": {"trigger_action": "generate"},
+        "user_state": user_state,
+        **workflow().new_run_budget(),
+    }
+
+
+@app.post("/generate/batch")
+async def generate_batch(req: GenerateBatchRequest):
+    """
+    Generates many documents in one request, at most GENERATE_BATCH_CONCURRENCY
+    graph runs at a time. Items sharing topic/constraints/context run back to back.
+    Each item gets its own result or error; one failure doesn't fail the batch.
+    """
+    if not req.items:
+        raise HTTPException(status_code=400, detail="No items to generate.")
+    if len(req.items) > GENERATE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {GENERATE_BATCH_MAX_ITEMS} items per batch.")
+
+    concurrency = min(req.max_concurrency or GENERATE_BATCH_CONCURRENCY, GENERATE_BATCH_CONCURRENCY)
+    results = [None] * len(req.items)
+    valid = []
+    for i, item in enumerate(req.items):
+        if not item.main_topic or item.main_topic.strip() == "":
+            results[i] = {
+                "index": i,
+                "status": "failed",
+                "error": {"error": "ValidationError", "message": "Missing required field: main_topic"},
             }
+        else:
+            valid.append(i)
+
+    set_llm_lane("bulk")
+    start = time.perf_counter()
+    batch_results = await run_batch(
+        (await load_workflow()).chain,
+        [req.items[i].model_dump(exclude={"run_id"}) for i in valid],
+        generate_input_state_from,
+        build_generate_payload,
+        concurrency,
+    )
+    for i, result in zip(valid, batch_results):
+        result["index"] = i
+        results[i] = result
+
+    return {
+        "results": results,
+        "succeeded": sum(1 for r in results if r["status"] == "succeeded"),
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def evaluate_input_state(user_state, generated_content, previous_evaluation=None, document_id=None):
+    return {
+        "supervisor_state": {"trigger_action": "evaluate"},
+        "user_state": user_state,
+        "generated_state": {"generated_content": generated_content},
+        "previous_evaluation": previous_evaluation,
+        "document_id": document_id,
+        **workflow().new_run_budget(),
+    }
+
+
+def check_evaluate_request(req: EvalStateInput):
+    """ 400 for a body that has neither a document_id nor the content to evaluate """
+    if req.document_id is not None:
+        return
+    if not req.main_topic or req.main_topic.strip() == "":
+        raise HTTPException(
+            status_code=400,
+            detail="Missing required field: main_topic"
         )
+    if req.generated_content is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Missing required field: generated_content (or document_id)"
+        )
+
 
+async def resolve_evaluate_request(req: EvalStateInput):
+    """
+    Returns (user_state, generated_content, previous_evaluation, document_id)
+    from the request body, or from the stored document after applying `delta`.
+    A stored document falls back to its last evaluation_snapshot.
+    """
+    check_evaluate_request(req)
+    request_fields = {"generated_content", "previous_evaluation", "document_id", "delta", "run_id"}
+    previous_evaluation = req.previous_evaluation.model_dump() if req.previous_evaluation else None
+
+    if req.document_id is None:
+        generated_content = [item.model_dump() for item in req.generated_content]
+        return req.model_dump(exclude=request_fields), generated_content, previous_evaluation, None
+
+    # Only the user fields the request sets replace the stored ones; unset fields keep their stored value
+    user_fields = req.model_dump(exclude_unset=True, exclude=request_fields)
+    if not (req.main_topic and req.main_topic.strip()):
+        user_fields.pop("main_topic", None)
+    document = await load_document(req.document_id, req.delta, user_fields=user_fields)
+    generated_content = [
+        {"section_name": section["section_name"], "content": section["content"]}
+        for section in document["sections"]
+    ]
+    return document["user_state"], generated_content, previous_evaluation or document["evaluation"], document["id"]
+
+
+async def load_document(document_id, delta=None, version=None, user_fields=None):
+    try:
+        if delta is not None or user_fields:
+            return await in_document_store("apply_delta", document_id, delta or DocumentDelta(), user_fields)
+        return await in_document_store("get", document_id, version)
+    except DocumentNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except InvalidDeltaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def store_result(result, source, document_id=None):
+    """ Saves a run's output as the next document version and gives sections their stored ids """
+    generated_content = result["generated_state"]["generated_content"]
+    document = await in_document_store(
+        "save_result",
+        document_id,
+        result["user_state"],
+        generated_content,
+        source,
+        evaluator_history=[
+            {
+                "coherency_score": entry["coherency_score"],
+                "evaluator_diagnostic_summary": entry["evaluator_diagnostic_summary"],
+            }
+            for entry in result.get("evaluator_history", [])
+        ],
+        snapshot=workflow().evaluation_snapshot(generated_content, result["evaluator_state"]),
+        stop_reason=result.get("stop_reason"),
+    )
+    for entry, section in zip(generated_content, document["sections"]):
+        entry["id"] = section["id"]
+    return document
+
+
+async def build_generate_payload(result):
     generated_content = result["generated_state"]["generated_content"]
-    for entry in generated_content:
-        entry["id"] = str(uuid.uuid4())
+    document = await store_result(result, "generate")
 
     return_payload = {
+        "document_id": document["id"],
+        "version": document["version"],
         "generated_content" : generated_content,
         "coherency_score": result["evaluator_state"]["coherency_score"],
         "evaluator_diagnostic_summary": result["evaluator_history"][-1]["evaluator_diagnostic_summary"],
+        "stop_reason": result.get("stop_reason"),
+        "iterations": result.get("iteration", 0),
     }
     return return_payload
 
 
-
-@app.post("/evaluate")  
-async def evaluate_document(req: EvalStateInput):  ## Payload of necessary fields is auto validated
+@app.post("/generate/stream")
+async def generate_document_stream(req: GenerateStateInput):
     """
-    Triggers full graph execution:
-    supervisor → initial draft → evaluator → refinements → final draft
+    Streaming variant of /generate (Server-Sent Events).
+    Emits node_start / node_end per graph node, `partial` section content
+    as tokens arrive, and the regular /generate payload as the final `result` event.
     """
 
     # ---- 1. Early validation ----
@@ -92,29 +534,82 @@ async def evaluate_document(req: EvalStateInput):  ## Payload of necessary field
             status_code=400,
             detail="Missing required field: main_topic"
         )
-    
 
     # ---- 2. Prepare graph input ----
-    input_state = {
-        "supervisor_state": {"trigger_action": "evaluate"},
-        "user_state": req.model_dump(exclude={"generated_content"}),
-        "generated_state": {"generated_content": [item.model_dump() for item in req.generated_content]}
-    }
+    wf = await load_workflow()
+    input_state = generate_input_state(req)
+
+    # ---- 3. Stream graph events ----
+    return StreamingResponse(
+        stream_graph_events(wf.chain, input_state, build_generate_payload),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 
-    # ---- 3. Run graph ----
+@app.post("/evaluate")  
+async def evaluate_document(req: EvalStateInput, debug: bool = False):  ## Payload of necessary fields is auto validated
+    """
+    Triggers full graph execution:
+    supervisor → initial draft → evaluator → refinements → final draft
+
+    `?debug=true` attaches the per-node trace of this run to the response.
+    """
+
+    # ---- 1. Early validation ----
+    check_evaluate_request(req)
+
+    # ---- 2. Prepare graph run ----
+    await load_workflow()
+    # A user is waiting on this edit: its LLM calls go ahead of bulk work
+    set_llm_lane("interactive")
+    run_id = new_run_id(req.run_id)
+    key = f"evaluate:{run_id}"
+    if (payload := await finished_run_payload(key)) is not None:
+        return payload
+
+    # ---- 3. Run graph (or resume it, see RESUMABLE RUNS), or join the identical run in flight ----
+    # Keyed on the request as sent: only the run that owns it loads the document and applies the delta
+    own_trace = start_trace()
+    run_id, run, trace = join_or_start_run(
+        "evaluate", req.model_dump(mode="json", exclude={"run_id"}), run_id, own_trace,
+        lambda run_id: evaluate_run(req, f"evaluate:{run_id}"),
+    )
+    key = f"evaluate:{run_id}"
     try:
-        result = chain.invoke(input_state)
+        result = await run_result(run)
 
+    except HTTPException:
+        raise
     except Exception as e:
         # Graph execution error ONLY (500)
         raise HTTPException(
             status_code=500,
             detail={
                 "error": "GraphExecutionError",
-                "message": str(e)
+                "message": str(e),
+                "run_id": run_id,
             }
         )
 
+    return_payload = await finish_run(key, run_id, await build_evaluate_payload(result))
+    if debug:
+        # A request that joined another's run shows that run's trace
+        return_payload["trace"] = {**trace.to_dict(), "coalesced": trace is not own_trace}
+    return return_payload
+
+
+async def evaluate_run(req: EvalStateInput, key):
+    """ Runs the graph on the request's content, or on the stored document once the delta is applied """
+
+    async def input_state():
+        return evaluate_input_state(*await resolve_evaluate_request(req))
+
+    return await run_graph(input_state, key)
+
+
+async def build_evaluate_payload(result):
     eval_hist_payload = []
     for eval_hist in result["evaluator_history"]:
         eval_hist_payload.append(
@@ -124,50 +619,199 @@ async def evaluate_document(req: EvalStateInput):  ## Payload of necessary field
             }
         )
     generated_content = result["generated_state"]["generated_content"]
-    for entry in generated_content:
-        entry["id"] = str(uuid.uuid4())
+    snapshot = workflow().evaluation_snapshot(generated_content, result["evaluator_state"])
+    document = await store_result(result, "evaluate", result.get("document_id"))
 
     return_payload = {
+        "document_id": document["id"],
+        "version": document["version"],
         "generated_content" : generated_content,
         "eval_hist_payload": eval_hist_payload,
+        "evaluation_snapshot": snapshot,
+        "stop_reason": result.get("stop_reason"),
+        "iterations": result.get("iteration", 0),
     }
     return return_payload
 
 
+# --------------------------
+# BACKGROUND JOBS
+# --------------------------
+@app.post("/jobs/generate", status_code=202)
+async def submit_generate_job(req: GenerateStateInput):
+    """ Queues a /generate run and returns its job id immediately """
+    if not req.main_topic or req.main_topic.strip() == "":
+        raise HTTPException(
+            status_code=400,
+            detail="Missing required field: main_topic"
+        )
+
+    async def input_state():
+        return generate_input_state(req)
+
+    return await submit_job("generate", input_state, build_generate_payload)
+
+
+@app.post("/jobs/evaluate", status_code=202)
+async def submit_evaluate_job(req: EvalStateInput):
+    """ Queues an /evaluate run and returns its job id immediately """
+    check_evaluate_request(req)
+
+    # The delta is applied when the job starts: a job rejected as 429 saves nothing
+    async def input_state():
+        return evaluate_input_state(*await resolve_evaluate_request(req))
+
+    return await submit_job("evaluate", input_state, build_evaluate_payload)
+
+
+async def submit_job(kind, make_input_state, build_payload):
+    try:
+        job = await job_manager.submit(kind, make_input_state, build_payload)
+    except QueueFullError as e:
+        # Admission control: shed load instead of queueing unbounded work
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# --------------------------
+# STORED DOCUMENTS
+# --------------------------
+@app.post("/documents", status_code=201)
+async def create_document(req: DocumentCreate):
+    """ Stores client-side content so later /evaluate and /export calls can send just its id """
+    user_state = req.model_dump(exclude={"generated_content"})
+    generated_content = [item.model_dump() for item in req.generated_content]
+    return await in_document_store("create", user_state, generated_content)
+
+
+@app.get("/documents/{document_id}")
+async def get_document(document_id: str, version: Optional[int] = None):
+    return await load_document(document_id, version=version)
+
+
+@app.get("/documents/{document_id}/history")
+async def get_document_history(document_id: str):
+    try:
+        return await in_document_store("history", document_id)
+    except DocumentNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 
 @app.post("/export")
-def export_file(req: GenerateRequest):
+async def export_file(req: GenerateRequest):
     file_type = req.type.lower()
 
-    if file_type not in ["doc", "ppt"]:
+    if file_type not in EXPORT_FORMATS:
         raise HTTPException(status_code=400, detail="Type must be 'doc' or 'ppt'.")
 
-    buffer = io.BytesIO()
+    if req.document_id is not None:
+        if req.version is not None and req.delta is not None:
+            raise HTTPException(status_code=400, detail="Send either version or delta, not both.")
+        document = await load_document(req.document_id, version=req.version)
+        stored = document["sections"]
+        if req.delta is not None:
+            # Exported as edited, but not saved: an export never writes to the store
+            try:
+                stored = delta_sections(stored, req.delta)
+            except InvalidDeltaError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        sections = [
+            Section(id=section["id"] or "", section_name=section["section_name"] or "", content=section["content"] or "")
+            for section in stored
+        ]
+    elif req.generated_content is not None:
+        sections = req.generated_content
+    else:
+        raise HTTPException(status_code=400, detail="Missing required field: generated_content (or document_id)")
 
     # --------------------------
-    # DOCX GENERATION
+    # DOCX / PPTX GENERATION
     # --------------------------
-    if file_type == "doc":
-        build_docx(req.generated_content, buffer)
-        
-        return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={
-                "Content-Disposition": "attachment; filename=output.docx"
-            }
-        )
+    try:
+        spool, size = await build_export(sections, file_type, req.template)
+    except ExportTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except TemplateNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    _, media_type, extension = EXPORT_FORMATS[file_type]
+    return StreamingResponse(
+        iter_spool(spool),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename=output.{extension}",
+            "Content-Length": str(size),
+        }
+    )
+
+
+@app.post("/export/batch")
+async def export_batch(req: BatchExportRequest):
+    """
+    Exports many documents, each in every requested format, as one zip
+    archive streamed while the entries are built in a process pool.
+    """
+    file_types = list(dict.fromkeys(t.lower() for t in req.types))
+    if not file_types or any(t not in EXPORT_FORMATS for t in file_types):
+        raise HTTPException(status_code=400, detail="Types must be 'doc' and/or 'ppt'.")
+    if not req.items:
+        raise HTTPException(status_code=400, detail="No items to export.")
+    if len(req.items) > EXPORT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {EXPORT_BATCH_MAX_ITEMS} items per batch.")
+
+    # Fail before streaming starts; later per-entry errors go to manifest.json
+    template_cache = await load_template_cache()
+    try:
+        for item in req.items:
+            for file_type in file_types:
+                template_cache.check(EXPORT_FORMATS[file_type][2], item.template)
+    except TemplateNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-    # --------------------------
-    # PPTX GENERATION
-    # --------------------------
-    if file_type == "ppt":
-        build_pptx(req.generated_content, buffer)
-
-        return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-            headers={
-                "Content-Disposition": "attachment; filename=output.pptx"
-            }
-        )
\ No newline at end of file
+    return StreamingResponse(
+        stream_export_batch(req.items, file_types),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=export.zip"},
+    )
+
+
+@app.post("/export/templates")
+async def upload_template(file: UploadFile, name: Optional[str] = None):
+    """
+    Uploads a .docx or .pptx template. It is compiled once and cached;
+    pass its name as `template` on /export to use it.
+    """
+    stem, _, extension = (file.filename or "").rpartition(".")
+    extension = extension.lower()
+    if extension not in ("docx", "pptx"):
+        raise HTTPException(status_code=400, detail="Template must be a .docx or .pptx file.")
+
+    # Reads one byte past the limit, so an oversized upload is never loaded into memory in full
+    data = await file.read(EXPORT_TEMPLATE_MAX_BYTES + 1)
+    if len(data) > EXPORT_TEMPLATE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Templates are limited to {EXPORT_TEMPLATE_MAX_BYTES} bytes.")
+    template_cache = await load_template_cache()
+    try:
+        await anyio.to_thread.run_sync(template_cache.add, extension, name or stem, data)
+    except TemplateNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not load template: {e}")
+
+    return {"template": name or stem, "type": "doc" if extension == "docx" else "ppt"}
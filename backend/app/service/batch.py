@@ -0,0 +1,62 @@
+import asyncio
+import os
+import time
+
+
+################### BATCH GENERATION #########################
+# ------------------------------------------------------ #
+
+# Graph runs in flight per batch (each run makes several LLM calls)
+GENERATE_BATCH_CONCURRENCY = int(os.getenv("GENERATE_BATCH_CONCURRENCY", "4"))
+GENERATE_BATCH_MAX_ITEMS = int(os.getenv("GENERATE_BATCH_MAX_ITEMS", "50"))
+
+
+def schedule_order(user_states):
+    """
+    Indices of `user_states` with items that share a format_user_config
+    prefix (topic, constraints, context) next to each other. Groups keep
+    the order of their first item, and items keep their order within a
+    group. Runs start in this order, so prompts with the same prefix reach
+    the provider close together, while its prompt cache is warm.
+    """
+    # Imported here: app.main imports this module before the workflow is warmed up
+    from app.agents.workflow import shared_prefix_key
+
+    groups = {}
+    for i, user_state in enumerate(user_states):
+        groups.setdefault(shared_prefix_key(user_state), []).append(i)
+    return [i for group in groups.values() for i in group]
+
+
+async def run_batch(chain, user_states, make_input_state, build_payload, concurrency=GENERATE_BATCH_CONCURRENCY, order=None):
+    """
+    Runs one graph per user state with at most `concurrency` in flight and
+    returns per-item results in request order. A failed item doesn't fail
+    the batch: it gets {"status": "failed", "error": ...}.
+
+    Input states are built when a run starts (not when the batch arrives),
+    so time spent waiting for a slot doesn't eat into the run's refine deadline.
+    `chain.abatch` would build them all up front, so it isn't used here.
+    """
+    order = schedule_order(user_states) if order is None else order
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results = [None] * len(user_states)
+
+    async def run_one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                final_state = await chain.ainvoke(make_input_state(user_states[i]))
+                payload = await build_payload(final_state)
+                results[i] = {"index": i, "status": "succeeded", **payload}
+            except Exception as e:
+                results[i] = {
+                    "index": i,
+                    "status": "failed",
+                    "error": {"error": "GraphExecutionError", "message": str(e)},
+                }
+            results[i]["seconds"] = round(time.perf_counter() - start, 3)
+
+    # Tasks queue on the semaphore in creation order (asyncio locks are FIFO)
+    await asyncio.gather(*(run_one(i) for i in order))
+    return results
@@ -0,0 +1,336 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from app.agents.sections import section_hash
+
+
+################### DOCUMENT STORE #########################
+# ------------------------------------------------------ #
+# Server-side documents keyed by id, so /evaluate and /export can take a
+# document id plus an optional delta instead of the full content.
+#
+# Every change creates a new document version. A document version is an
+# ordered list of (section id, section version) pairs. A section only
+# gets a new version when its name or content changes, so unchanged
+# sections are shared between document versions. Evaluator history and
+# the latest `evaluation_snapshot` are kept per document version.
+#
+# Every /generate and /evaluate result is stored, so documents nobody
+# writes to for DOCUMENT_TTL_SECONDS are deleted with all their versions.
+
+# Relative paths are resolved against backend/, not the working directory
+DOCUMENT_STORE_PATH = os.getenv("DOCUMENT_STORE_PATH", "documents.db")
+# 0 keeps documents forever
+DOCUMENT_TTL_SECONDS = float(os.getenv("DOCUMENT_TTL_SECONDS", "604800"))
+_PURGE_INTERVAL_SECONDS = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    user_state TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_versions (
+    document_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    sections TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (document_id, version)
+);
+CREATE TABLE IF NOT EXISTS section_versions (
+    document_id TEXT NOT NULL,
+    section_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    section_name TEXT,
+    content TEXT,
+    hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (document_id, section_id, version)
+);
+CREATE TABLE IF NOT EXISTS evaluations (
+    document_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    history TEXT NOT NULL,
+    snapshot TEXT,
+    stop_reason TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evaluations_by_document ON evaluations (document_id, version);
+CREATE INDEX IF NOT EXISTS documents_by_update ON documents (updated_at);
+"""
+
+
+class DocumentNotFoundError(Exception):
+    """ Unknown document id or version """
+
+
+class InvalidDeltaError(Exception):
+    """ A delta references sections the document doesn't have """
+
+
+class DocumentStore:
+    """
+    Blocking SQLite calls, safe from any thread; async handlers call it
+    through anyio.to_thread.
+    """
+
+    def __init__(self, path, ttl_seconds=DOCUMENT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # ---- reads ----
+
+    def get(self, document_id, version=None):
+        """
+        Returns {"id", "version", "user_state", "sections": [{"id", "version",
+        "section_name", "content"}], "evaluation"}; `evaluation` is the latest
+        evaluation_snapshot recorded at or before that version.
+        """
+        with self._lock:
+            return self._load(document_id, version)
+
+    def history(self, document_id):
+        """ Document versions (section ids/versions per version) and evaluator history """
+        with self._lock:
+            self._document_row(document_id)
+            versions = [
+                {"version": v, "source": source, "created_at": created_at, "sections": json.loads(sections)}
+                for v, sections, source, created_at in self._conn.execute(
+                    "SELECT version, sections, source, created_at FROM document_versions "
+                    "WHERE document_id = ? ORDER BY version", (document_id,)
+                )
+            ]
+            evaluations = [
+                {"version": v, "history": json.loads(history), "stop_reason": stop_reason, "created_at": created_at}
+                for v, history, stop_reason, created_at in self._conn.execute(
+                    "SELECT version, history, stop_reason, created_at FROM evaluations "
+                    "WHERE document_id = ? ORDER BY rowid", (document_id,)
+                )
+            ]
+        return {"id": document_id, "versions": versions, "evaluations": evaluations}
+
+    # ---- writes ----
+
+    def create(self, user_state, sections, source="create"):
+        """ Stores a new document from [{"section_name", "content"}] and returns it """
+        self._purge()
+        document_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO documents (id, user_state, version, created_at, updated_at) VALUES (?, ?, 0, ?, ?)",
+                (document_id, json.dumps(user_state), now, now),
+            )
+            self._write_version(document_id, 0, [], self._as_new(sections), source)
+            return self._load(document_id)
+
+    def apply_delta(self, document_id, delta, user_fields=None):
+        """
+        Applies a DocumentDelta (`sections` edits/additions, `removed` ids,
+        optional `order`) and returns the new version. No-op deltas don't
+        create a version. `user_fields` replace only those fields of the
+        stored user_state.
+        """
+        with self._lock, self._conn:
+            current = self._load(document_id)
+            user_state = {**current["user_state"], **user_fields} if user_fields else None
+            return self._save(current, delta_sections(current["sections"], delta), "delta", user_state)
+
+    def save_result(self, document_id, user_state, generated_content, source,
+                    evaluator_history=None, snapshot=None, stop_reason=None):
+        """
+        Stores a graph run's output as the next version of `document_id`
+        (or of a new document when it is None), plus its evaluator history.
+        Output sections keep the id of the same-named section they replace.
+        """
+        if document_id is None:
+            document = self.create(user_state, generated_content, source)
+            document_id = document["id"]
+            with self._lock, self._conn:
+                self._record_evaluation(document_id, document["version"], evaluator_history, snapshot, stop_reason)
+                return self._load(document_id)
+
+        with self._lock, self._conn:
+            current = self._load(document_id)
+            unused = {}
+            for section in current["sections"]:
+                unused.setdefault(section["section_name"], []).append(section["id"])
+
+            sections = []
+            for item in generated_content:
+                ids = unused.get(item.get("section_name")) or [None]
+                sections.append({"id": ids.pop(0), "section_name": item.get("section_name"), "content": item.get("content") or ""})
+
+            document = self._save(current, sections, source, user_state)
+            self._record_evaluation(document_id, document["version"], evaluator_history, snapshot, stop_reason)
+            return self._load(document_id)
+
+    def _purge(self):
+        """ Deletes documents nobody wrote to for ttl_seconds, at most once a minute """
+        now = time.time()
+        if not self.ttl_seconds or now - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        with self._lock, self._conn:
+            expired = "SELECT id FROM documents WHERE updated_at <= ?"
+            cutoff = (now - self.ttl_seconds,)
+            for table in ("document_versions", "section_versions", "evaluations"):
+                self._conn.execute(f"DELETE FROM {table} WHERE document_id IN ({expired})", cutoff)
+            self._conn.execute("DELETE FROM documents WHERE updated_at <= ?", cutoff)
+
+    # ---- internals (caller holds the lock) ----
+
+    def _document_row(self, document_id):
+        row = self._conn.execute(
+            "SELECT user_state, version FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        if row is None:
+            raise DocumentNotFoundError(f"No document with id {document_id!r}")
+        return row
+
+    def _load(self, document_id, version=None):
+        user_state, latest = self._document_row(document_id)
+        version = latest if version is None else version
+        row = self._conn.execute(
+            "SELECT sections FROM document_versions WHERE document_id = ? AND version = ?",
+            (document_id, version),
+        ).fetchone()
+        if row is None:
+            raise DocumentNotFoundError(f"Document {document_id!r} has no version {version}")
+
+        sections = []
+        for section_id, section_version in json.loads(row[0]):
+            name, content = self._conn.execute(
+                "SELECT section_name, content FROM section_versions "
+                "WHERE document_id = ? AND section_id = ? AND version = ?",
+                (document_id, section_id, section_version),
+            ).fetchone()
+            sections.append({"id": section_id, "version": section_version, "section_name": name, "content": content})
+
+        evaluation = self._conn.execute(
+            "SELECT snapshot FROM evaluations WHERE document_id = ? AND version <= ? AND snapshot IS NOT NULL "
+            "ORDER BY version DESC, rowid DESC LIMIT 1",
+            (document_id, version),
+        ).fetchone()
+
+        return {
+            "id": document_id,
+            "version": version,
+            "user_state": json.loads(user_state),
+            "sections": sections,
+            "evaluation": json.loads(evaluation[0]) if evaluation else None,
+        }
+
+    @staticmethod
+    def _as_new(sections):
+        return [
+            {"id": None, "section_name": s.get("section_name"), "content": s.get("content") or ""}
+            for s in sections
+        ]
+
+    def _save(self, current, sections, source, user_state=None):
+        """ Writes `sections` as the next version unless nothing changed """
+        document_id = current["id"]
+        if user_state is not None and user_state != current["user_state"]:
+            self._conn.execute(
+                "UPDATE documents SET user_state = ? WHERE id = ?", (json.dumps(user_state), document_id)
+            )
+            current = {**current, "user_state": user_state}
+        previous = [(s["id"], s["section_name"], s["content"]) for s in current["sections"]]
+        if [(s["id"], s["section_name"], s["content"]) for s in sections] == previous:
+            return current
+
+        version = current["version"] + 1
+        self._write_version(document_id, version, current["sections"], sections, source)
+        self._conn.execute(
+            "UPDATE documents SET version = ?, updated_at = ? WHERE id = ?", (version, time.time(), document_id)
+        )
+        return self._load(document_id)
+
+    def _write_version(self, document_id, version, previous_sections, sections, source):
+        previous = {s["id"]: s for s in previous_sections}
+        now = time.time()
+        refs = []
+        for section in sections:
+            section_id = section["id"] or str(uuid.uuid4())
+            before = previous.get(section_id)
+            if before is not None and (before["section_name"], before["content"]) == (section["section_name"], section["content"]):
+                refs.append([section_id, before["version"]])
+                continue
+
+            section_version = before["version"] + 1 if before is not None else 0
+            self._conn.execute(
+                "INSERT INTO section_versions (document_id, section_id, version, section_name, content, hash, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (document_id, section_id, section_version, section["section_name"], section["content"],
+                 section_hash(section), now),
+            )
+            refs.append([section_id, section_version])
+
+        self._conn.execute(
+            "INSERT INTO document_versions (document_id, version, sections, source, created_at) VALUES (?, ?, ?, ?, ?)",
+            (document_id, version, json.dumps(refs), source, now),
+        )
+
+    def _record_evaluation(self, document_id, version, evaluator_history, snapshot, stop_reason):
+        if not evaluator_history and snapshot is None:
+            return
+        # An evaluation that changed nothing still counts as use of the document
+        self._conn.execute("UPDATE documents SET updated_at = ? WHERE id = ?", (time.time(), document_id))
+        self._conn.execute(
+            "INSERT INTO evaluations (document_id, version, history, snapshot, stop_reason, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (document_id, version, json.dumps(evaluator_history or []),
+             json.dumps(snapshot) if snapshot is not None else None, stop_reason, time.time()),
+        )
+
+
+def delta_sections(sections, delta):
+    """
+    The sections after applying a DocumentDelta, without storing them.
+    Added sections have id None until they are saved.
+    """
+    sections = [dict(s) for s in sections]
+    by_id = {s["id"]: s for s in sections}
+
+    unknown = [sid for sid in delta.removed if sid not in by_id]
+    unknown += [edit.id for edit in delta.sections if edit.id is not None and edit.id not in by_id]
+    if unknown:
+        raise InvalidDeltaError(f"Unknown section ids: {', '.join(unknown)}")
+
+    removed = set(delta.removed)
+    sections = [s for s in sections if s["id"] not in removed]
+    for edit in delta.sections:
+        if edit.id is None:
+            sections.append({"id": None, "section_name": edit.section_name, "content": edit.content or ""})
+            continue
+        section = by_id[edit.id]
+        if edit.section_name is not None:
+            section["section_name"] = edit.section_name
+        if edit.content is not None:
+            section["content"] = edit.content
+
+    if delta.order:
+        rank = {sid: i for i, sid in enumerate(delta.order)}
+        sections.sort(key=lambda s: rank.get(s["id"], len(rank)))
+    return sections
+
+
+def open_document_store(path=DOCUMENT_STORE_PATH):
+    """ The store at `path`; a relative path is taken from backend/ """
+    return DocumentStore(str(Path(__file__).resolve().parents[2] / path))
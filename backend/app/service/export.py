@@ -0,0 +1,270 @@
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import anyio
+
+from app.service.format_output_file import build_docx, build_pptx
+
+
+################### STREAMING EXPORT #########################
+# ------------------------------------------------------ #
+
+EXPORT_FORMATS = {
+    "doc": (build_docx, "application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+    "ppt": (build_pptx, "application/vnd.openxmlformats-officedocument.presentationml.presentation", "pptx"),
+}
+
+# Built files larger than this spill from memory to a temp file on disk
+EXPORT_SPOOL_MAX_BYTES = int(os.getenv("EXPORT_SPOOL_MAX_BYTES", str(2 * 1024 * 1024)))
+# Memory budget shared by all in-flight exports in this worker process
+EXPORT_MEMORY_CEILING_MB = int(os.getenv("EXPORT_MEMORY_CEILING_MB", "512"))
+# Threads dedicated to export builds, so they don't starve the default threadpool
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "4"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+# Rough python-docx / python-pptx footprint: fixed package DOM plus a
+# multiple of the text size (measured on generated documents).
+_BASE_BUILD_BYTES = 16 * 1024 * 1024
+_BYTES_PER_TEXT_BYTE = 30
+
+
+# Largest accepted template upload (POST /export/templates)
+EXPORT_TEMPLATE_MAX_BYTES = int(os.getenv("EXPORT_TEMPLATE_MAX_BYTES", str(10 * 1024 * 1024)))
+
+
+class ExportTooLargeError(Exception):
+    """ A single export would exceed the per-worker memory ceiling """
+
+
+class TemplateNotFoundError(Exception):
+    """ Unknown or invalid user template name """
+
+
+class MemoryBudget:
+    """ Async weighted semaphore over an estimated byte budget """
+
+    def __init__(self, ceiling_bytes):
+        self.ceiling = ceiling_bytes
+        self.in_use = 0
+        self._cond = None
+
+    def _condition(self):
+        # Created lazily so it binds to the running event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self, amount):
+        if amount > self.ceiling:
+            raise ExportTooLargeError(
+                f"Export needs ~{amount // 2**20} MB, above the {self.ceiling // 2**20} MB ceiling"
+            )
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_use + amount <= self.ceiling)
+            self.in_use += amount
+
+    async def release(self, amount):
+        cond = self._condition()
+        async with cond:
+            self.in_use -= amount
+            cond.notify_all()
+
+
+memory_budget = MemoryBudget(EXPORT_MEMORY_CEILING_MB * 1024 * 1024)
+_export_limiter = None
+
+
+def _limiter():
+    global _export_limiter
+    if _export_limiter is None:
+        _export_limiter = anyio.CapacityLimiter(EXPORT_WORKERS)
+    return _export_limiter
+
+
+def estimate_build_bytes(sections):
+    text_bytes = sum(len(s.section_name) + len(s.content) for s in sections)
+    return _BASE_BUILD_BYTES + _BYTES_PER_TEXT_BYTE * text_bytes
+
+
+def _build_to_spool(builder, sections, template=None):
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    try:
+        builder(sections, spool, template)
+        size = spool.seek(0, os.SEEK_END)
+        spool.seek(0)
+        return spool, size
+    except BaseException:
+        spool.close()
+        raise
+
+
+async def build_export(sections, file_type, template=None):
+    """
+    Builds the document off the event loop, within the memory budget, into a
+    spooled temp file. The python-docx/pptx DOM is freed before streaming starts.
+
+    Returns (spool, size); stream it with `iter_spool`.
+    """
+    builder = EXPORT_FORMATS[file_type][0]
+    needed = estimate_build_bytes(sections)
+
+    await memory_budget.acquire(needed)
+    try:
+        return await anyio.to_thread.run_sync(_build_to_spool, builder, sections, template, limiter=_limiter())
+    finally:
+        await memory_budget.release(needed)
+
+
+async def iter_spool(spool):
+    """ Streams a built file in chunks and closes (deletes) it afterwards """
+    try:
+        while True:
+            chunk = spool.read(EXPORT_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+################### BATCH EXPORT (PROCESS POOL + STREAMED ZIP) #########################
+# ------------------------------------------------------ #
+# python-docx/pptx builds are CPU-bound pure Python and hold the GIL, so
+# threads don't parallelize them. Batch entries are built in worker
+# processes (each compiles its templates once) and written into a zip
+# archive that is streamed out as each entry finishes.
+
+EXPORT_PROCESSES = int(os.getenv("EXPORT_PROCESSES", str(os.cpu_count() or 2)))
+EXPORT_BATCH_MAX_ITEMS = int(os.getenv("EXPORT_BATCH_MAX_ITEMS", "200"))
+
+_process_pool = None
+
+
+def _pool():
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=EXPORT_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+    return _process_pool
+
+
+def _warm_worker():
+    from app.service.export_engine import template_cache
+    template_cache.warm()
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def build_export_bytes(sections, file_type, template=None):
+    """ Builds one export in a worker process and returns the file bytes """
+    buffer = io.BytesIO()
+    EXPORT_FORMATS[file_type][0](sections, buffer, template)
+    return buffer.getvalue()
+
+
+class _ZipStream:
+    """
+    Non-seekable sink for zipfile: written bytes are collected until
+    drained. zipfile detects the missing tell()/seek() and writes data
+    descriptors after each entry instead of patching local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _entry_name(index, name, extension):
+    stem = re.sub(r"[^A-Za-z0-9_.-]+", "-", name or "").strip("-.") or "document"
+    return f"{index + 1:03d}-{stem[:64]}.{extension}"
+
+
+async def stream_export_batch(items, file_types):
+    """
+    Async generator of zip archive bytes. Every item is exported in every
+    format; entries are added in completion order and a manifest.json
+    (entry names and per-entry errors) closes the archive.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pool()
+    jobs = [(i, item, file_type) for i, item in enumerate(items) for file_type in file_types]
+    # Bound finished-but-unsent results held in memory
+    window = EXPORT_PROCESSES * 2
+
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    manifest = []
+    pending = {}
+    next_job = 0
+
+    try:
+        while next_job < len(jobs) or pending:
+            while next_job < len(jobs) and len(pending) < window:
+                i, item, file_type = jobs[next_job]
+                future = loop.run_in_executor(
+                    pool, build_export_bytes, item.generated_content, file_type, item.template
+                )
+                pending[future] = jobs[next_job]
+                next_job += 1
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                i, item, file_type = pending.pop(future)
+                name = _entry_name(i, item.name, EXPORT_FORMATS[file_type][2])
+                try:
+                    data = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    manifest.append({"item": i, "type": file_type, "error": f"{type(e).__name__}: {e}"})
+                    continue
+
+                # docx/pptx are zip files already; storing avoids recompressing
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                archive.writestr(info, data)
+                manifest.append({"item": i, "type": file_type, "file": name, "bytes": len(data)})
+                yield sink.drain()
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+        archive.close()
+        yield sink.drain()
+
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); the next batch starts a fresh pool
+        shutdown_process_pool()
+        raise
+
+    finally:
+        # Client went away or a write failed: drop builds that haven't started
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,493 @@
+import io
+import math
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn as dqn
+from docx.oxml.table import CT_Tbl
+from docx.shared import Pt as DPt
+from lxml.etree import SubElement
+from pptx import Presentation
+from pptx.oxml.ns import qn as pqn
+from pptx.util import Pt as PPt
+
+from app.service.export import TemplateNotFoundError
+from app.service.markdown_render import MAX_LIST_LEVEL, iter_blocks, parse_inline
+
+
+################### TEMPLATE-PRECOMPILED EXPORT ENGINE #########################
+# ------------------------------------------------------ #
+# Templates are parsed and styled once, serialized to bytes and cached.
+# Every export then re-opens the cached bytes and writes paragraphs that
+# reference precompiled styles, instead of styling each run one by one.
+# Section content is markdown and is rendered block by block while it is
+# parsed (see markdown_render.py).
+
+HEADING_STYLE = "MiniDocs Heading"
+BODY_STYLE = "MiniDocs Body"
+CODE_STYLE = "MiniDocs Code"
+CODE_FONT = "Courier New"
+
+_W_P, _W_PPR, _W_PSTYLE, _W_R, _W_RPR, _W_T, _W_BR = (
+    dqn(tag) for tag in ("w:p", "w:pPr", "w:pStyle", "w:r", "w:rPr", "w:t", "w:br")
+)
+_W_RFONTS, _W_B, _W_I, _W_NUMPR, _W_ILVL, _W_NUMID = (
+    dqn(tag) for tag in ("w:rFonts", "w:b", "w:i", "w:numPr", "w:ilvl", "w:numId")
+)
+_W_VAL, _W_TYPE, _W_ASCII, _W_HANSI = (dqn(attr) for attr in ("w:val", "w:type", "w:ascii", "w:hAnsi"))
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+_A_P, _A_PPR, _A_R, _A_RPR, _A_T, _A_LATIN, _A_BUNONE, _A_BUAUTONUM = (
+    pqn(tag) for tag in ("a:p", "a:pPr", "a:r", "a:rPr", "a:t", "a:latin", "a:buNone", "a:buAutoNum")
+)
+
+# PPTX overflow: body text beyond this many (estimated) lines moves to a continuation slide
+PPTX_MAX_LINES = int(os.getenv("PPTX_MAX_LINES", "12"))
+PPTX_CHARS_PER_LINE = int(os.getenv("PPTX_CHARS_PER_LINE", "80"))
+
+# User-supplied templates: <EXPORT_TEMPLATE_DIR>/<name>.docx|.pptx, a relative path is taken from backend/
+EXPORT_TEMPLATE_DIR = os.getenv("EXPORT_TEMPLATE_DIR", "templates")
+_TEMPLATE_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _ensure_paragraph_style(styles, name, base, size, space_after=None, font=None):
+    """ Adds a paragraph style unless the template already defines it (user templates win) """
+    if name in [s.name for s in styles]:
+        return styles[name]
+    style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+    style.base_style = styles[base]
+    style.font.size = DPt(size)
+    if font is not None:
+        style.font.name = font
+    if space_after is not None:
+        style.paragraph_format.space_after = DPt(space_after)
+    return style
+
+
+def _style_id(styles, name, fallback):
+    """ Style id by name, or `fallback` when a user template doesn't define the style """
+    for style in styles:
+        if style.name == name:
+            return style.style_id
+    return fallback
+
+
+class DocxTemplate:
+    def __init__(self, source=None):
+        doc = Document(source)
+        styles = doc.styles
+        heading = _ensure_paragraph_style(styles, HEADING_STYLE, "Heading 1", 24, space_after=12)
+        body = _ensure_paragraph_style(styles, BODY_STYLE, "Normal", 14)
+        code = _ensure_paragraph_style(styles, CODE_STYLE, "Normal", 10, font=CODE_FONT)
+        # Resolved once; per-request lookups by style name are linear in the style count
+        self.heading_style_id = heading.style_id
+        self.body_style_id = body.style_id
+        self.block_style_ids = {
+            "paragraph": body.style_id,
+            "quote": _style_id(styles, "Quote", body.style_id),
+            "code": code.style_id,
+        }
+        # Markdown headings sit one level below the section heading
+        self.md_heading_style_ids = {
+            level: _style_id(styles, f"Heading {level + 1}", body.style_id) for level in range(1, 7)
+        }
+        self.list_style_ids = {}
+        for kind, name in (("bullet", "List Bullet"), ("number", "List Number")):
+            for level in range(MAX_LIST_LEVEL + 1):
+                suffix = f" {level + 1}" if level else ""
+                self.list_style_ids[(kind, level)] = _style_id(styles, name + suffix, body.style_id)
+        self.table_style_id = _style_id(styles, "Table Grid", None)
+        self.number_abstract_id = self._list_number_abstract_id(doc)
+        self.block_width = doc._block_width
+
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        self.compiled = buffer.getvalue()
+
+    @staticmethod
+    def _list_number_abstract_id(doc):
+        """ Numbering definition behind "List Number", so each markdown list can restart at 1 """
+        style_id = _style_id(doc.styles, "List Number", None)
+        if style_id is None:
+            return None
+        try:
+            num_id = doc.styles.element.get_by_id(style_id).pPr.numPr.numId.val
+            numbering = doc.part.numbering_part.element
+            return numbering.num_having_numId(num_id).abstractNumId.val
+        except (AttributeError, KeyError, NotImplementedError):
+            return None
+
+    def new_document(self):
+        return Document(io.BytesIO(self.compiled))
+
+    @staticmethod
+    def add_paragraph(body, style_id, text=""):
+        """ Appends a styled paragraph with literal text (newlines become breaks) """
+        p = SubElement(body, _W_P)
+        SubElement(SubElement(p, _W_PPR), _W_PSTYLE).set(_W_VAL, style_id)
+        if text:
+            r = SubElement(p, _W_R)
+            for i, line in enumerate(text.split("\n")):
+                if i:
+                    SubElement(r, _W_BR)
+                if line:
+                    _docx_text(r, line)
+        return p
+
+    @staticmethod
+    def add_runs(p, text, bold=False):
+        """ Appends markdown inline text as formatted runs """
+        for chunk, is_bold, italic, code in parse_inline(text, bold=bold):
+            r = SubElement(p, _W_R)
+            if is_bold or italic or code:
+                rPr = SubElement(r, _W_RPR)
+                # CT_RPr child order: rFonts, b, i
+                if code:
+                    fonts = SubElement(rPr, _W_RFONTS)
+                    fonts.set(_W_ASCII, CODE_FONT)
+                    fonts.set(_W_HANSI, CODE_FONT)
+                if is_bold:
+                    SubElement(rPr, _W_B)
+                if italic:
+                    SubElement(rPr, _W_I)
+            _docx_text(r, chunk)
+
+    def add_table(self, body, rows):
+        cols = max(len(row) for row in rows)
+        tbl = CT_Tbl.new_tbl(len(rows), cols, self.block_width)
+        body.append(tbl)
+        if self.table_style_id is not None:
+            tbl.tblPr.style = self.table_style_id
+        for row_index, (tr, cells) in enumerate(zip(tbl.tr_lst, rows)):
+            for tc, text in zip(tr.tc_lst, cells):
+                self.add_runs(tc.p_lst[0], text, bold=row_index == 0)
+
+    def render_markdown(self, doc, body, text):
+        numbering = doc.part.numbering_part.element if self.number_abstract_id is not None else None
+        list_num_id = None
+
+        for kind, level, payload in iter_blocks(text):
+            if kind != "number":
+                list_num_id = None
+
+            if kind == "table":
+                self.add_table(body, payload)
+                continue
+            if kind == "code":
+                self.add_paragraph(body, self.block_style_ids["code"], payload)
+                continue
+
+            if kind == "heading":
+                style_id = self.md_heading_style_ids[level]
+            elif kind in ("bullet", "number"):
+                style_id = self.list_style_ids[(kind, level)]
+            else:
+                style_id = self.block_style_ids[kind]
+            p = SubElement(body, _W_P)
+            pPr = SubElement(p, _W_PPR)
+            SubElement(pPr, _W_PSTYLE).set(_W_VAL, style_id)
+
+            if kind == "number" and numbering is not None:
+                # A fresh w:num per list restarts numbering; nested levels follow the list's ilvl
+                if list_num_id is None:
+                    num = numbering.add_num(self.number_abstract_id)
+                    num.add_lvlOverride(ilvl=0).add_startOverride(1)
+                    list_num_id = str(num.numId)
+                numPr = SubElement(pPr, _W_NUMPR)
+                SubElement(numPr, _W_ILVL).set(_W_VAL, str(level))
+                SubElement(numPr, _W_NUMID).set(_W_VAL, list_num_id)
+
+            self.add_runs(p, payload)
+
+    def render(self, sections, buffer):
+        doc = self.new_document()
+        body = doc.element.body
+        # Blocks are appended at the end of the body; python-docx's own
+        # add_p() rescans the body for w:sectPr on every call (quadratic).
+        sectPr = body.sectPr
+        if sectPr is not None:
+            body.remove(sectPr)
+
+        for section in sections:
+            self.add_paragraph(body, self.heading_style_id, section.section_name)
+            self.render_markdown(doc, body, section.content)
+            # Page break after each section
+            SubElement(SubElement(SubElement(body, _W_P), _W_R), _W_BR).set(_W_TYPE, "page")
+
+        if sectPr is not None:
+            body.append(sectPr)
+        doc.save(buffer)
+        buffer.seek(0)
+
+
+def _docx_text(r, text):
+    t = SubElement(r, _W_T)
+    t.text = text
+    if text != text.strip():
+        t.set(_XML_SPACE, "preserve")
+
+
+def _set_placeholder_defaults(placeholder, size, margin_top=None):
+    """ Writes level-1 font size (and top inset) into a layout placeholder, inherited by every slide """
+    txBody = placeholder.text_frame._txBody
+    lstStyle = txBody.find(pqn("a:lstStyle"))
+    if lstStyle is None:
+        lstStyle = txBody.makeelement(pqn("a:lstStyle"), {})
+        txBody.insert(1, lstStyle)
+    lvl1 = lstStyle.find(pqn("a:lvl1pPr"))
+    if lvl1 is None:
+        lvl1 = lstStyle.makeelement(pqn("a:lvl1pPr"), {})
+        lstStyle.insert(0, lvl1)
+    defRPr = lvl1.find(pqn("a:defRPr"))
+    if defRPr is None:
+        defRPr = lvl1.makeelement(pqn("a:defRPr"), {})
+        lvl1.append(defRPr)
+    defRPr.set("sz", str(int(size.pt * 100)))
+    if margin_top is not None:
+        placeholder.text_frame.margin_top = margin_top
+
+
+class PptxTemplate:
+    def __init__(self, source=None):
+        prs = Presentation(source)
+        self.layout_index = self._title_and_content_layout(prs)
+
+        if source is None:
+            # Built-in template: bake MiniDocs sizes into the layout once.
+            # User templates keep their own typography.
+            layout = prs.slide_layouts[self.layout_index]
+            placeholders = {ph.placeholder_format.idx: ph for ph in layout.placeholders}
+            _set_placeholder_defaults(placeholders[0], PPt(24))
+            _set_placeholder_defaults(placeholders[1], PPt(14), margin_top=PPt(12))
+
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        self.compiled = buffer.getvalue()
+
+    @staticmethod
+    def _title_and_content_layout(prs):
+        for i, layout in enumerate(prs.slide_layouts):
+            idxs = {ph.placeholder_format.idx for ph in layout.placeholders}
+            if {0, 1} <= idxs:
+                return i
+        raise ValueError("Template has no layout with a title and a body placeholder")
+
+    def new_presentation(self):
+        prs = Presentation(io.BytesIO(self.compiled))
+        return prs, prs.slide_layouts[self.layout_index]
+
+    def render(self, sections, buffer):
+        prs, layout = self.new_presentation()
+
+        for section in sections:
+            writer = _SlideWriter(prs, layout, section.section_name)
+            for block in iter_blocks(section.content):
+                writer.add_block(block)
+
+        prs.save(buffer)
+        buffer.seek(0)
+
+
+def _estimate_lines(text):
+    return max(1, math.ceil(len(text) / PPTX_CHARS_PER_LINE))
+
+
+def _split_words(text, max_chars):
+    """ Splits an over-long paragraph at word boundaries into slide-sized pieces """
+    pieces, current = [], []
+    length = 0
+    for word in text.split(" "):
+        if current and length + len(word) > max_chars:
+            pieces.append(" ".join(current))
+            current, length = [], 0
+        current.append(word)
+        length += len(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+class _SlideWriter:
+    """
+    Writes one section's markdown blocks onto slides, opening a
+    "(cont.)" slide whenever the body runs out of (estimated) lines.
+    Tables get a table shape in place of the body placeholder.
+    """
+
+    def __init__(self, prs, layout, title):
+        self.prs = prs
+        self.layout = layout
+        self.title = title
+        self.slides = 0
+        self.text_frame = None
+        self.lines = 0
+        self._new_slide()
+
+    def _new_slide(self):
+        slide = self.prs.slides.add_slide(self.layout)
+        slide.shapes.title.text = self.title if not self.slides else f"{self.title} (cont.)"
+        self.slides += 1
+        self.slide = slide
+        self.body = slide.placeholders[1]
+        self.text_frame = self.body.text_frame._txBody
+        self.lines = 0
+
+    def _paragraph(self, cost, kind, level=0):
+        """ Next a:p of the body, on a continuation slide if this one is full """
+        if self.text_frame is None or (self.lines and self.lines + cost > PPTX_MAX_LINES):
+            self._new_slide()
+        self.lines += cost
+        if self.lines == cost:
+            p = self.text_frame.find(_A_P)  # the placeholder's empty first paragraph
+        else:
+            p = SubElement(self.text_frame, _A_P)
+
+        pPr = SubElement(p, _A_PPR)
+        if level:
+            pPr.set("lvl", str(level))
+        if kind == "number":
+            SubElement(pPr, _A_BUAUTONUM).set("type", "arabicPeriod")
+        elif kind != "bullet":
+            SubElement(pPr, _A_BUNONE)
+        return p
+
+    @staticmethod
+    def _add_runs(p, text, bold=False, italic=False, size=None):
+        for chunk, is_bold, is_italic, is_code in parse_inline(text, bold=bold, italic=italic):
+            _pptx_run(p, chunk, is_bold, is_italic, is_code, size)
+
+    def add_block(self, block):
+        kind, level, payload = block
+        if kind == "table":
+            self._add_table(payload)
+            return
+        if kind == "code":
+            for line in payload.split("\n"):
+                p = self._paragraph(_estimate_lines(line), kind)
+                _pptx_run(p, line, code=True, size=1100)
+            return
+
+        max_chars = PPTX_MAX_LINES * PPTX_CHARS_PER_LINE
+        for piece in _split_words(payload, max_chars) if len(payload) > max_chars else [payload]:
+            p = self._paragraph(_estimate_lines(piece), kind, level)
+            if kind == "heading":
+                self._add_runs(p, piece, bold=True, size=1800)
+            else:
+                self._add_runs(p, piece, italic=kind == "quote")
+
+    def _add_table(self, rows):
+        header, body_rows = rows[0], rows[1:]
+        cols = max(len(row) for row in rows)
+        per_slide = max(1, PPTX_MAX_LINES - 1)
+
+        for start in range(0, max(len(body_rows), 1), per_slide):
+            chunk = [header] + body_rows[start:start + per_slide]
+            # Tables replace the body placeholder, so each one starts on a fresh slide
+            if self.text_frame is None or self.lines:
+                self._new_slide()
+            body = self.body
+            shape = self.slide.shapes.add_table(len(chunk), cols, body.left, body.top, body.width, body.height)
+            body._element.getparent().remove(body._element)
+            table = shape.table
+            for r, row in enumerate(chunk):
+                for c in range(cols):
+                    p = table.cell(r, c).text_frame.paragraphs[0]._p
+                    self._add_runs(p, row[c] if c < len(row) else "", bold=r == 0, size=1200)
+            # Anything after the table goes on the next slide
+            self.text_frame = None
+
+
+def _pptx_run(p, text, bold=False, italic=False, code=False, size=None):
+    """ Appends an a:r; `size` is in hundredths of a point """
+    r = SubElement(p, _A_R)
+    rPr = SubElement(r, _A_RPR, lang="en-US")
+    if size is not None:
+        rPr.set("sz", str(size))
+    if bold:
+        rPr.set("b", "1")
+    if italic:
+        rPr.set("i", "1")
+    if code:
+        SubElement(rPr, _A_LATIN, typeface=CODE_FONT)
+    SubElement(r, _A_T).text = text
+
+
+class TemplateCache:
+    """
+    Compiles each template (built-in or user-supplied) once per process.
+
+    A user template is kept with the (mtime, size) of its file and compiled
+    again when the file changes, so a re-upload reaches every process that
+    serves exports (workers, batch export processes).
+    """
+
+    _KINDS = {"docx": DocxTemplate, "pptx": PptxTemplate}
+
+    def __init__(self, template_dir=EXPORT_TEMPLATE_DIR):
+        self.template_dir = str(Path(__file__).resolve().parents[2] / template_dir)
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, kind, name):
+        if not _TEMPLATE_NAME.match(name or ""):
+            raise TemplateNotFoundError(f"Invalid template name: {name!r}")
+        return os.path.join(self.template_dir, f"{name}.{kind}")
+
+    def _stamp(self, kind, name):
+        """ (mtime, size) of a user template's file; None for the built-in one """
+        if name is None:
+            return None
+        try:
+            stat = os.stat(self.path_for(kind, name))
+        except FileNotFoundError:
+            raise TemplateNotFoundError(f"No {kind} template named {name!r}") from None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, kind, name=None):
+        key = (kind, name)
+        stamp = self._stamp(kind, name)
+        cached = self._templates.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        with self._lock:
+            cached = self._templates.get(key)
+            if cached is None or cached[0] != stamp:
+                source = None if name is None else self.path_for(kind, name)
+                cached = self._templates[key] = (stamp, self._KINDS[kind](source))
+            return cached[1]
+
+    def check(self, kind, name=None):
+        """ Raises TemplateNotFoundError unless the template is built in or has been uploaded """
+        self._stamp(kind, name)
+
+    def add(self, kind, name, data):
+        """ Stores an uploaded template file and compiles it (raises if it can't be parsed) """
+        path = self.path_for(kind, name)
+        template = self._KINDS[kind](io.BytesIO(data))
+        os.makedirs(self.template_dir, exist_ok=True)
+        # Written aside and renamed, so another process never compiles half a file
+        fd, tmp_path = tempfile.mkstemp(dir=self.template_dir, suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._templates[(kind, name)] = (self._stamp(kind, name), template)
+        return template
+
+    def warm(self):
+        """ Compiles the built-in templates ahead of the first export """
+        for kind in self._KINDS:
+            self.get(kind)
+
+
+template_cache = TemplateCache()
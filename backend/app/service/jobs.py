@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import anyio
+
+from app.agents.rate_limit import set_llm_lane
+
+
+################### BACKGROUND GRAPH JOBS #########################
+# ------------------------------------------------------ #
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "64"))
+# Finished jobs are kept this long for polling, then dropped
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+
+class QueueFullError(Exception):
+    """ Raised when the job queue is at capacity (admission control) """
+
+
+class Job:
+    def __init__(self, kind, make_input_state, build_payload):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at = None
+        self.progress = {"node": None, "iteration": 0, "coherency_score": None}
+        self.result = None
+        self.error = None
+        # Awaited when the job starts, so queue time doesn't eat into the run's
+        # deadline and a rejected job never touches the document store
+        self.make_input_state = make_input_state
+        self.build_payload = build_payload
+        self.task = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    In-process worker pool running graph jobs from a bounded queue.
+
+    `submit` rejects new jobs once the queue is full instead of letting
+    latency grow without bound. Progress is tracked from the graph's
+    `updates` stream; running jobs are cancelled by cancelling their task.
+    `load_chain` is awaited when a job starts, so the graph can be
+    compiled after the manager is created.
+
+    With a shared state backend, every job's status is also published
+    there, so a poll or cancel that lands on another API worker still
+    finds it. A cancel from another worker leaves a flag that the owning
+    worker checks between graph steps.
+    """
+
+    def __init__(self, load_chain, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE, state=None):
+        self.load_chain = load_chain
+        self.workers = workers
+        self.max_queue = max_queue
+        self.state = state
+        self.jobs = {}
+        self._queue = None
+        self._worker_tasks = []
+
+    def _ensure_started(self):
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, kind, make_input_state, build_payload):
+        self._ensure_started()
+        self._prune()
+
+        job = Job(kind, make_input_state, build_payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.max_queue} pending)")
+        self.jobs[job.id] = job
+        await self._publish(job)
+        return job
+
+    async def get(self, job_id):
+        """ The job's status dict, from this worker or the shared state; None if unknown """
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.state is not None:
+            record = await anyio.to_thread.run_sync(self.state.get, f"job:{job_id}")
+            return json.loads(record) if record else None
+        return None
+
+    async def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return await self._cancel_remote(job_id)
+        if job.status in ("succeeded", "failed", "cancelled"):
+            return job.to_dict()
+
+        if job.task is not None:
+            job.task.cancel()
+        # Queued jobs are skipped by the worker when dequeued
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        await self._publish(job)
+        return job.to_dict()
+
+    # The shared state is called in a worker thread, off the event loop
+
+    async def _cancel_remote(self, job_id):
+        record = await self.get(job_id)
+        if record is None or record["status"] in ("succeeded", "failed", "cancelled"):
+            return record
+        await anyio.to_thread.run_sync(self.state.set, f"job-cancel:{job_id}", "1", JOB_TTL_SECONDS)
+        return {**record, "status": "cancelled"}
+
+    async def _publish(self, job):
+        if self.state is not None:
+            await anyio.to_thread.run_sync(self.state.set, f"job:{job.id}", json.dumps(job.to_dict()), JOB_TTL_SECONDS)
+
+    async def _cancel_requested(self, job):
+        if self.state is None:
+            return False
+        return await anyio.to_thread.run_sync(self.state.get, f"job-cancel:{job.id}") is not None
+
+    async def shutdown(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def stats(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "jobs": counts,
+        }
+
+    def _prune(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at and now - job.finished_at > JOB_TTL_SECONDS
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == "cancelled" or await self._cancel_requested(job):
+                    job.status = "cancelled"
+                    job.finished_at = time.time()
+                    await self._publish(job)
+                    continue
+                job.task = asyncio.create_task(self._run(job))
+                try:
+                    await job.task
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise  # the worker itself is shutting down
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        job.status = "running"
+        await self._publish(job)
+        # Background work yields to interactive requests at the rate limiter
+        set_llm_lane("bulk")
+        final_state = None
+        try:
+            chain = await self.load_chain()
+            input_state = await job.make_input_state()
+            async for mode, chunk in chain.astream(input_state, stream_mode=["updates", "values"]):
+                if mode == "values":
+                    final_state = chunk
+                    continue
+                for node, update in chunk.items():
+                    job.progress["node"] = node
+                    if not isinstance(update, dict):
+                        continue
+                    if "iteration" in update:
+                        job.progress["iteration"] = update["iteration"]
+                    if update.get("evaluator_state"):
+                        job.progress["coherency_score"] = update["evaluator_state"]["coherency_score"]
+                if await self._cancel_requested(job):
+                    raise asyncio.CancelledError()
+                await self._publish(job)
+
+            job.result = await job.build_payload(final_state)
+            job.status = "succeeded"
+
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+
+        except Exception as e:
+            job.status = "failed"
+            job.error = {"error": "GraphExecutionError", "message": str(e)}
+
+        finally:
+            job.finished_at = time.time()
+            await self._publish(job)
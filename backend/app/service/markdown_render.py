@@ -0,0 +1,168 @@
+import re
+
+
+################### SINGLE-PASS MARKDOWN PARSER #########################
+# ------------------------------------------------------ #
+# Section content is written by the model in markdown. `iter_blocks` walks
+# the text once, line by line, and yields blocks as soon as they are
+# complete, so renderers write OOXML while parsing instead of building a
+# full document tree first. `parse_inline` splits a block's text into
+# formatted runs.
+#
+# Blocks are tuples:
+#   ("heading", level, text)   ("paragraph", 0, text)   ("quote", 0, text)
+#   ("bullet", level, text)    ("number", level, text)
+#   ("code", 0, text)          ("table", 0, rows)   rows[0] is the header row
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+_NUMBER = re.compile(r"^(\s*)\d{1,9}[.)]\s+(.*)$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_QUOTE = re.compile(r"^\s*>\s?(.*)$")
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+# Nested list depth is capped to what the output styles support
+MAX_LIST_LEVEL = 2
+
+
+def _list_level(indent):
+    return min(len(indent.replace("\t", "    ")) // 2, MAX_LIST_LEVEL)
+
+
+def _split_row(line):
+    cells = line.strip().strip("|").split("|")
+    return [cell.strip() for cell in cells]
+
+
+def iter_blocks(text):
+    lines = (text or "").splitlines()
+    pending = None  # open paragraph / quote / list item: [kind, level, [lines]]
+    i = 0
+
+    def flush():
+        nonlocal pending
+        block = None
+        if pending is not None:
+            block = (pending[0], pending[1], " ".join(pending[2]))
+        pending = None
+        return block
+
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+
+        # ---- 1. fenced code: copied verbatim up to the closing fence ----
+        fence = _FENCE.match(line)
+        if fence:
+            block = flush()
+            if block:
+                yield block
+            code = []
+            while i < len(lines) and not lines[i].strip().startswith(fence.group(1)):
+                code.append(lines[i])
+                i += 1
+            i += 1  # closing fence (or end of text)
+            yield ("code", 0, "\n".join(code))
+            continue
+
+        stripped = line.strip()
+        if not stripped or _RULE.match(line):
+            block = flush()
+            if block:
+                yield block
+            continue
+
+        # ---- 2. tables need one line of lookahead for the separator row ----
+        if _TABLE_ROW.match(line) and i < len(lines) and _TABLE_SEPARATOR.match(lines[i]):
+            block = flush()
+            if block:
+                yield block
+            rows = [_split_row(line)]
+            i += 1
+            while i < len(lines) and _TABLE_ROW.match(lines[i]):
+                rows.append(_split_row(lines[i]))
+                i += 1
+            yield ("table", 0, rows)
+            continue
+
+        # ---- 3. single-line and list-item blocks ----
+        heading = _HEADING.match(line)
+        if heading:
+            block = flush()
+            if block:
+                yield block
+            yield ("heading", len(heading.group(1)), heading.group(2))
+            continue
+
+        item = _BULLET.match(line) or _NUMBER.match(line)
+        if item:
+            block = flush()
+            if block:
+                yield block
+            kind = "bullet" if item.re is _BULLET else "number"
+            pending = [kind, _list_level(item.group(1)), [item.group(2).strip()]]
+            continue
+
+        quote = _QUOTE.match(line)
+        if quote:
+            if pending is None or pending[0] != "quote":
+                block = flush()
+                if block:
+                    yield block
+                pending = ["quote", 0, []]
+            pending[2].append(quote.group(1).strip())
+            continue
+
+        # ---- 4. plain text: continues the open paragraph or list item ----
+        if pending is None or pending[0] == "quote":
+            block = flush()
+            if block:
+                yield block
+            pending = ["paragraph", 0, []]
+        pending[2].append(stripped)
+
+    block = flush()
+    if block:
+        yield block
+
+
+_INLINE = re.compile(
+    r"\*\*\*(?P<bi>.+?)\*\*\*"
+    r"|\*\*(?P<b>.+?)\*\*"
+    r"|__(?P<b2>.+?)__"
+    # Lazy, so an italic run ends at the first closing marker, not the last one on the line
+    r"|\*(?P<i>[^\s*](?:.*?[^\s*])??)\*"
+    r"|(?<!\w)_(?P<i2>[^\s_](?:.*?[^\s_])??)_(?!\w)"
+    r"|`(?P<code>[^`]+)`"
+    r"|\[(?P<link>[^\]]+)\]\([^)]*\)"
+)
+
+
+def parse_inline(text, bold=False, italic=False):
+    """
+    Splits markdown inline text into (text, bold, italic, code) runs.
+    Unpaired markers are kept as literal text.
+    """
+    runs = []
+    pos = 0
+    for match in _INLINE.finditer(text):
+        if match.start() > pos:
+            runs.append((text[pos:match.start()], bold, italic, False))
+        kind = match.lastgroup
+        inner = match.group(kind)
+        if kind == "code":
+            runs.append((inner, bold, italic, True))
+        elif kind == "bi":
+            runs.extend(parse_inline(inner, True, True))
+        elif kind in ("b", "b2"):
+            runs.extend(parse_inline(inner, True, italic))
+        elif kind in ("i", "i2"):
+            runs.extend(parse_inline(inner, bold, True))
+        else:  # link: keep the label
+            runs.extend(parse_inline(inner, bold, italic))
+        pos = match.end()
+    if pos < len(text):
+        runs.append((text[pos:], bold, italic, False))
+    return runs
@@ -0,0 +1,68 @@
+import json
+
+from langchain_core.utils.json import parse_partial_json
+
+
+GRAPH_NODES = {
+    "generate_initial_draft", "evaluator", "semantic_refine", "structural_refine",
+    "outline_sections", "generate_section", "stitch_sections",
+}
+
+# Nodes whose LLM output is GeneratedState JSON (and therefore section content)
+CONTENT_NODES = {"generate_initial_draft", "structural_refine"}
+# Nodes whose LLM output is a single GeneratedConfig section
+SECTION_NODES = {"generate_section", "semantic_refine"}
+
+
+def format_sse(event, data):
+    """ Encode one Server-Sent Event frame """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_graph_events(chain, input_state, build_payload):
+    """
+    Runs the graph with `astream_events` and yields SSE frames:
+
+    - node_start / node_end  for every graph node
+    - partial                current sections of a content node as tokens arrive
+    - result                 the regular endpoint payload, built by `build_payload`
+    - error                  if graph execution fails
+    """
+    buffers = {}
+    last_partial = {}
+
+    try:
+        async for ev in chain.astream_events(input_state, version="v2"):
+            kind = ev["event"]
+            parents = ev.get("parent_ids", [])
+            node = ev.get("metadata", {}).get("langgraph_node")
+            # Node runs are direct children of the graph run
+            is_node_run = len(parents) == 1 and ev["name"] in GRAPH_NODES
+
+            if kind == "on_chain_start" and is_node_run:
+                yield format_sse("node_start", {"node": ev["name"]})
+
+            elif kind == "on_chain_end" and is_node_run:
+                yield format_sse("node_end", {"node": ev["name"]})
+
+            elif kind == "on_chat_model_stream" and node in CONTENT_NODES | SECTION_NODES:
+                # Accumulate the raw JSON text per LLM call and surface the sections parsed so far
+                llm_run = ev["run_id"]
+                text = buffers.get(llm_run, "") + (ev["data"]["chunk"].content or "")
+                buffers[llm_run] = text
+
+                parsed = parse_partial_json(text) if text else None
+                if node in SECTION_NODES:
+                    sections = [parsed] if isinstance(parsed, dict) and parsed.get("content") else None
+                else:
+                    sections = parsed.get("generated_content") if isinstance(parsed, dict) else None
+                if sections and sections != last_partial.get(llm_run):
+                    last_partial[llm_run] = sections
+                    yield format_sse("partial", {"node": node, "generated_content": sections})
+
+            elif kind == "on_chain_end" and not parents:
+                # Top-level graph finished: emit the same payload as the blocking endpoint
+                yield format_sse("result", await build_payload(ev["data"]["output"]))
+
+    except Exception as e:
+        yield format_sse("error", {"error": "GraphExecutionError", "message": str(e)})
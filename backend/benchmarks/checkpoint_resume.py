@@ -0,0 +1,155 @@
+"""
+Benchmark: LLM work repeated by a retried /generate, with and without run
+checkpoints (CHECKPOINT_DB_PATH), on the fake LLM.
+
+For every LLM call position k of a run, the k-th call fails with no
+retries left (think provider outage past the retry budget, or a deploy),
+so /generate returns 500. The client then retries with the same run_id.
+Without checkpoints the retry starts over at START; with them it resumes
+after the last completed node. Reports the LLM calls and tokens the
+retry spent, averaged over all failure positions, and the per-run cost of
+checkpointing (latency, SQLite writes) on runs that don't fail.
+
+Run from backend/:
+    uv run python -m benchmarks.checkpoint_resume --refine-depth 3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from typing import ClassVar, Optional
+
+import httpx
+
+import app.agents.workflow as workflow
+from app.agents.checkpoints import StateCheckpointer
+from app.agents.fake_llm import FakeChatModel, FakeLLMError, fake_llm_config
+from app.agents.llm_cache import CACHEABLE_NODES, prompt_text
+from app.agents.llm_registry import llm_registry
+from app.agents.rate_limit import RateLimiter
+from app.agents.shared_state import SQLiteState
+from app.main import app
+
+
+class FailingFakeLLM(FakeChatModel):
+    """ Fails the `fail_at`-th call (1-based) """
+
+    calls: ClassVar[int] = 0
+    tokens: ClassVar[int] = 0
+    fail_at: ClassVar[Optional[int]] = None
+
+    async def ainvoke(self, prompt):
+        FailingFakeLLM.calls += 1
+        if FailingFakeLLM.calls == FailingFakeLLM.fail_at:
+            raise FakeLLMError("503 UNAVAILABLE (injected)", 503)
+        message = await super().ainvoke(prompt)
+        FailingFakeLLM.tokens += len(prompt_text(prompt)) // 4 + message.usage_metadata["output_tokens"]
+        return message
+
+
+def document(label):
+    return {
+        "main_topic": f"Annual operations review {label}",
+        "constraints": "Formal tone, under 300 words per section.",
+        "sections": [{"section_name": f"Part {n}", "description": f"Topic {n} of the review"} for n in range(1, 6)],
+    }
+
+
+class CountingCheckpointer(StateCheckpointer):
+    puts = 0
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        CountingCheckpointer.puts += 1
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        CountingCheckpointer.puts += 1
+        return super().put_writes(config, writes, task_id, task_path)
+
+
+def use_checkpoints(path):
+    checkpointer = CountingCheckpointer(SQLiteState(path)) if path else None
+    workflow.checkpointer = checkpointer
+    workflow.checkpointed_chain = workflow.graph.compile(checkpointer=checkpointer) if checkpointer else None
+
+
+def reset_counts(fail_at=None):
+    FailingFakeLLM.calls = FailingFakeLLM.tokens = 0
+    FailingFakeLLM.fail_at = fail_at
+
+
+async def post(client, body):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await client.post("/generate", json=body)
+
+
+async def retry_cost(client, label, fail_at):
+    """ (calls, tokens) the retry spends after the run failed at call `fail_at` """
+    body = {**document(label), "run_id": f"run-{label}"}
+    reset_counts(fail_at)
+    first = await post(client, body)
+    assert first.status_code == 500, first.text
+    # Sibling calls of the failed one (same gather) are still finishing
+    await asyncio.sleep(0.2)
+    reset_counts()
+    retry = await post(client, body)
+    assert retry.status_code == 200, retry.text
+    return FailingFakeLLM.calls, FailingFakeLLM.tokens
+
+
+async def run(db_dir, runs):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        use_checkpoints(None)
+        reset_counts()
+        await post(client, document("clean"))
+        total_calls, total_tokens = FailingFakeLLM.calls, FailingFakeLLM.tokens
+        print(f"clean run: {total_calls} LLM calls, {total_tokens:,} tokens\n")
+
+        print(f"{'checkpoints':>11} | {'retry calls':>11} | {'retry tokens':>12} | {'of a clean run':>14}")
+        for label, path in [("off", None), ("sqlite", os.path.join(db_dir, "resume.db"))]:
+            use_checkpoints(path)
+            costs = [await retry_cost(client, f"{label}-{k}", k) for k in range(1, total_calls + 1)]
+            calls = statistics.mean(c for c, _ in costs)
+            tokens = statistics.mean(t for _, t in costs)
+            print(f"{label:>11} | {calls:>11.2f} | {tokens:>12,.0f} | {tokens / total_tokens:>14.0%}")
+
+        print(f"\nOverhead on {runs} runs that don't fail:")
+        print(f"{'checkpoints':>11} | {'mean run s':>10} | {'sqlite writes/run':>17}")
+        for label, path in [("off", None), ("sqlite", os.path.join(db_dir, "overhead.db"))]:
+            use_checkpoints(path)
+            CountingCheckpointer.puts = 0
+            start = time.perf_counter()
+            for i in range(runs):
+                await post(client, {**document(f"overhead-{label}-{i}"), "run_id": f"overhead-{label}-{i}"})
+            elapsed = (time.perf_counter() - start) / runs
+            print(f"{label:>11} | {elapsed:>10.3f} | {CountingCheckpointer.puts / runs:>17.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--refine-depth", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=20, help="runs for the overhead measurement")
+    args = parser.parse_args()
+
+    fake_llm_config.latency_median = 0.005
+    fake_llm_config.tokens_per_second = 1e6
+    fake_llm_config.refine_depth = args.refine_depth
+    llm_registry.set_factory(FailingFakeLLM)
+    CACHEABLE_NODES.clear()
+    workflow.LLM_MAX_RETRIES = 0
+    workflow.MAX_REFINE_ITERATIONS = args.refine_depth
+    workflow.CONVERGENCE_THRESHOLD = -1.0
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=10**9, default_tpm=10**12)
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        asyncio.run(run(db_dir, args.runs))
+
+
+if __name__ == "__main__":
+    main()
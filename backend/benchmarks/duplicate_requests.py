@@ -0,0 +1,113 @@
+"""
+Benchmark: bursts of identical /generate requests (double-clicks, client
+retries after a timeout), with and without coalescing
+(COALESCE_REQUESTS), on the fake LLM.
+
+Each of --documents documents is sent --copies times, the copies a few
+milliseconds apart so they overlap in flight. The LLM response cache
+stays on: it only answers a prompt once the first run has finished, so
+it doesn't catch copies that are already running. Reports the graph runs
+started, the LLM calls and tokens paid for, and the latency per request.
+
+Run from backend/:
+    uv run python -m benchmarks.duplicate_requests --documents 8 --copies 3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+
+from typing import ClassVar
+
+import httpx
+
+import app.agents.workflow as workflow
+import app.main as main_module
+from app.agents.fake_llm import FakeChatModel, fake_llm_config
+from app.agents.llm_cache import prompt_text
+from app.agents.llm_registry import llm_registry
+from app.agents.rate_limit import RateLimiter
+from app.main import app
+
+
+class CountingFakeLLM(FakeChatModel):
+    """ Counts the calls that reach the model, i.e. that weren't cache hits """
+
+    calls: ClassVar[int] = 0
+    tokens: ClassVar[int] = 0
+
+    async def ainvoke(self, prompt):
+        CountingFakeLLM.calls += 1
+        message = await super().ainvoke(prompt)
+        CountingFakeLLM.tokens += len(prompt_text(prompt)) // 4 + message.usage_metadata["output_tokens"]
+        return message
+
+
+def document(label, i):
+    return {
+        "main_topic": f"Annual operations review {label} {i}",
+        "constraints": "Formal tone, under 300 words per section.",
+        "sections": [{"section_name": f"Part {n}", "description": f"Topic {n} of the review"} for n in range(1, 6)],
+    }
+
+
+async def run(client, label, documents, copies, gap):
+    latencies = []
+    failed = 0
+
+    async def one(i, copy):
+        nonlocal failed
+        await asyncio.sleep(copy * gap)
+        start = time.perf_counter()
+        response = await client.post("/generate", json=document(label, i))
+        latencies.append(time.perf_counter() - start)
+        failed += response.status_code != 200
+
+    CountingFakeLLM.calls = CountingFakeLLM.tokens = 0
+    started = main_module.coalesce_stats["started"]
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one(i, copy) for i in range(documents) for copy in range(copies)))
+    return {
+        "runs": main_module.coalesce_stats["started"] - started,
+        "calls": CountingFakeLLM.calls,
+        "tokens": CountingFakeLLM.tokens,
+        "p50": statistics.median(latencies),
+        "seconds": time.perf_counter() - start,
+        "failed": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=8)
+    parser.add_argument("--copies", type=int, default=3, help="identical requests per document")
+    parser.add_argument("--gap", type=float, default=0.005, help="seconds between the copies of a document")
+    parser.add_argument("--ttft", type=float, default=0.05, help="median seconds to first token")
+    args = parser.parse_args()
+
+    fake_llm_config.latency_median = args.ttft
+    llm_registry.set_factory(CountingFakeLLM)
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=10**9, default_tpm=10**12)
+
+    async def compare():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"{args.documents} documents x {args.copies} identical requests, {args.gap * 1000:g} ms apart\n")
+            print(f"{'coalescing':>10} | {'runs':>4} | {'LLM calls':>9} | {'LLM tokens':>10} | {'p50 s':>6} | {'total s':>7} | failed")
+            for enabled in (False, True):
+                main_module.COALESCE_REQUESTS = enabled
+                # Fresh topics per row, so the second row doesn't hit the first one's cache entries
+                result = await run(client, "on" if enabled else "off", args.documents, args.copies, args.gap)
+                print(
+                    f"{'on' if enabled else 'off':>10} | {result['runs']:>4} | {result['calls']:>9,} | "
+                    f"{result['tokens']:>10,} | {result['p50']:>6.2f} | {result['seconds']:>7.2f} | {result['failed']}"
+                )
+
+    asyncio.run(compare())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+End-to-end benchmark: /generate, /evaluate and /export through the
+FastAPI app at increasing concurrency, on the deterministic fake LLM
+(app/agents/fake_llm.py). Reports p50/p95/p99 latency and throughput.
+
+Each level sends `--requests` requests (default: 4x the concurrency,
+at least 8) with at most `concurrency` in flight. Topics differ per
+request, across levels too, so the LLM response cache doesn't
+short-circuit the graph. The rate limiter is lifted; this measures the
+pipeline, not the quota.
+
+The fake model's behaviour comes from the FAKE_LLM_* env vars; --ttft
+and --tokens-per-second override the two that set latency.
+
+Run from backend/:
+    uv run python -m benchmarks.e2e --concurrency 1,4,16,64
+    FAKE_LLM_REFINE_DEPTH=2 FAKE_LLM_FAILURE_RATE=0.02 uv run python -m benchmarks.e2e
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import time
+
+import httpx
+
+import app.agents.workflow as workflow
+from app.agents.fake_llm import FakeChatModel, fake_llm_config
+from app.agents.llm_registry import llm_registry
+from app.agents.rate_limit import RateLimiter
+from app.main import app
+
+SECTIONS = [
+    {"section_name": "Introduction", "description": "What the report covers"},
+    {"section_name": "Findings", "description": "Main results"},
+    {"section_name": "Recommendations", "description": "What to do next"},
+]
+
+
+def generate_body(i):
+    return {"main_topic": f"Quarterly report {i}", "constraints": "Formal tone.", "sections": SECTIONS}
+
+
+def evaluate_body(i, content):
+    return {**generate_body(i), "generated_content": content}
+
+
+def percentile(sorted_values, q):
+    """ Nearest-rank percentile """
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, round(q / 100 * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+# Unique per request across all levels, so no two requests share a prompt
+_request_ids = itertools.count()
+
+
+async def run_level(client, concurrency, n, make_request):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(next(_request_ids))
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "rps": n / elapsed,
+        "errors": errors,
+    }
+
+
+async def run(levels, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # A first-draft document (revision 0) for /evaluate and /export
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = await client.post("/generate", json=generate_body(-1))
+        content = response.json()["generated_content"]
+        draft = [{**sec, "content": sec["content"].split(" (revision")[0]} for sec in content]
+
+        endpoints = {
+            "/generate": lambda i: client.post("/generate", json=generate_body(i)),
+            "/evaluate": lambda i: client.post("/evaluate", json=evaluate_body(i, draft)),
+            "/export": lambda i: client.post("/export", json={"generated_content": draft, "type": "doc"}),
+        }
+
+        print(f"{'endpoint':>10} | {'conc':>4} | {'reqs':>4} | {'p50 s':>6} | {'p95 s':>6} | {'p99 s':>6} | {'req/s':>7} | errors")
+        for name, make_request in endpoints.items():
+            for concurrency in levels:
+                n = requests or max(8, 4 * concurrency)
+                llm_registry.clear()  # new clients start their prompt counts over
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = await run_level(client, concurrency, n, make_request)
+                print(
+                    f"{name:>10} | {concurrency:>4} | {n:>4} | {result['p50']:>6.2f} | {result['p95']:>6.2f} | "
+                    f"{result['p99']:>6.2f} | {result['rps']:>7.2f} | {result['errors']}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default 4x concurrency)")
+    parser.add_argument("--ttft", type=float, default=None, help="median seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.ttft is not None:
+        fake_llm_config.latency_median = args.ttft
+    if args.tokens_per_second is not None:
+        fake_llm_config.tokens_per_second = args.tokens_per_second
+    llm_registry.set_factory(FakeChatModel)
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=10**9, default_tpm=10**12)
+
+    c = fake_llm_config
+    print(
+        f"fake LLM: ttft median {c.latency_median}s (sigma {c.latency_sigma}), {c.tokens_per_second:g} tok/s, "
+        f"refine depth {c.refine_depth}, failure rate {c.failure_rate}, 429 rate {c.rate_limit_rate}"
+    )
+    asyncio.run(run([int(x) for x in args.concurrency.split(",")], args.requests))
+
+
+if __name__ == "__main__":
+    main()
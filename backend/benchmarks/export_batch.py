@@ -0,0 +1,82 @@
+"""
+Benchmark: /export/batch (process pool, streamed zip) vs one /export
+round trip per document and format.
+
+The per-document path goes through the FastAPI app over an in-process
+ASGI transport. The batch path drives `stream_export_batch` (the
+/export/batch body) directly, because httpx's ASGI transport buffers the
+whole response and would hide when the first archive bytes are sent.
+
+Run from backend/:
+    uv run python -m benchmarks.export_batch --documents 8 32 --sections 10
+"""
+import argparse
+import asyncio
+import io
+import time
+import zipfile
+
+import httpx
+
+from app.datamodels import BatchExportRequest
+from app.main import app, lifespan
+from app.service.export import EXPORT_PROCESSES, stream_export_batch
+
+
+def document(i, sections):
+    return {
+        "name": f"Report {i}",
+        "generated_content": [
+            {"section_name": f"Section {s}", "content": "## Findings\n\n- **point** one\n- point two\n\n" + "Generated paragraph text. " * 60, "id": str(s)}
+            for s in range(sections)
+        ],
+    }
+
+
+async def sequential(client, docs, types):
+    start = time.perf_counter()
+    for doc in docs:
+        for file_type in types:
+            response = await client.post("/export", json={"type": file_type, "generated_content": doc["generated_content"]})
+            response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def batch(docs, types):
+    items = BatchExportRequest(items=docs, types=types).items
+    start = time.perf_counter()
+    first_byte = None
+    body = io.BytesIO()
+    async for chunk in stream_export_batch(items, types):
+        if first_byte is None and chunk:
+            first_byte = time.perf_counter() - start
+        body.write(chunk)
+    elapsed = time.perf_counter() - start
+    entries = len(zipfile.ZipFile(body).namelist()) - 1  # minus manifest.json
+    return elapsed, first_byte, entries
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--sections", type=int, default=10)
+    args = parser.parse_args()
+    types = ["doc", "ppt"]
+
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+            # Start the worker processes (spawn + template warm-up) outside the timings
+            await batch([document(i, 1) for i in range(EXPORT_PROCESSES)], types)
+
+            print(f"processes: {EXPORT_PROCESSES}")
+            print(f"{'docs':>5} | {'files':>5} | {'sequential s':>12} | {'batch s':>8} | {'first byte s':>12} | speedup")
+            for n in args.documents:
+                docs = [document(i, args.sections) for i in range(n)]
+                seq = await sequential(client, docs, types)
+                elapsed, first_byte, entries = await batch(docs, types)
+                print(f"{n:>5} | {entries:>5} | {seq:>12.2f} | {elapsed:>8.2f} | {first_byte:>12.2f} | {seq / elapsed:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
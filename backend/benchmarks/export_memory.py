@@ -0,0 +1,81 @@
+"""
+Benchmark: /export peak RSS and latency by section count.
+
+Each scenario runs in a fresh subprocess so ru_maxrss reflects only that
+scenario. `--concurrency` fires that many exports at once to show the
+effect of the per-worker memory ceiling (EXPORT_MEMORY_CEILING_MB).
+
+Run from backend/:
+    uv run python -m benchmarks.export_memory --sections 10 100 300 --concurrency 1 8
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+def section_payload(n, file_type):
+    return {
+        "type": file_type,
+        "generated_content": [
+            {"section_name": f"Section {i}", "content": "Generated paragraph text. " * 80, "id": str(i)}
+            for i in range(n)
+        ],
+    }
+
+
+async def run_scenario(n, file_type, concurrency):
+    import httpx
+    from app.main import app
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    payload = section_payload(n, file_type)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/export", json=payload) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "latency_s": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "rss_growth_mb": round((peak_rss - baseline_rss) / 1024, 1),
+        "file_kb": round(len(responses[0].content) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--types", nargs="+", default=["doc", "ppt"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--scenario", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        n, file_type, concurrency = args.scenario
+        print(json.dumps(asyncio.run(run_scenario(int(n), file_type, int(concurrency)))))
+        return
+
+    print(f"{'type':>4} | {'sections':>8} | {'concurrent':>10} | {'latency':>8} | {'peak RSS':>9} | {'RSS growth':>10} | file")
+    for file_type in args.types:
+        for n in args.sections:
+            for concurrency in args.concurrency:
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.export_memory", "--scenario", str(n), file_type, str(concurrency)],
+                    capture_output=True, text=True, check=True,
+                )
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                print(
+                    f"{file_type:>4} | {n:>8} | {concurrency:>10} | {r['latency_s']:>7.2f}s | "
+                    f"{r['peak_rss_mb']:>6.1f} MB | {r['rss_growth_mb']:>7.1f} MB | {r['file_kb']} KB"
+                )
+
+
+if __name__ == "__main__":
+    main()
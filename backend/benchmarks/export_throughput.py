@@ -0,0 +1,85 @@
+"""
+Benchmark: exports per second, template-precompiled engine vs the
+previous per-request builders (fresh Document()/Presentation(), style
+lookups by name and per-run font sizing).
+
+Run from backend/:
+    uv run python -m benchmarks.export_throughput --sections 10 50 --seconds 3
+"""
+import argparse
+import io
+import time
+
+from docx import Document
+from docx.shared import Pt as DPt
+from pptx import Presentation
+from pptx.util import Pt as PPt
+
+from app.datamodels import Section
+from app.service.format_output_file import build_docx, build_pptx
+from app.service.export_engine import template_cache
+
+
+def legacy_build_docx(sections, buffer):
+    doc = Document()
+    for section in sections:
+        heading = doc.add_heading(section.section_name, level=1)
+        for run in heading.runs:
+            run.font.size = DPt(24)
+        doc.add_paragraph("")
+        p = doc.add_paragraph(section.content)
+        for run in p.runs:
+            run.font.size = DPt(14)
+        doc.add_page_break()
+    doc.save(buffer)
+    buffer.seek(0)
+
+
+def legacy_build_pptx(sections, buffer):
+    prs = Presentation()
+    for section in sections:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        title = slide.shapes.title
+        title.text = section.section_name
+        title.text_frame.paragraphs[0].font.size = PPt(24)
+        tf = slide.placeholders[1].text_frame
+        tf.clear()
+        p = tf.add_paragraph()
+        p.text = section.content
+        p.font.size = PPt(14)
+        tf.margin_top = PPt(12)
+    prs.save(buffer)
+    buffer.seek(0)
+
+
+def exports_per_second(builder, sections, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        builder(sections, io.BytesIO())
+        count += 1
+    return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    template_cache.warm()
+
+    print(f"{'format':>6} | {'sections':>8} | {'legacy/s':>8} | {'engine/s':>8} | speedup")
+    for n in args.sections:
+        sections = [
+            Section(section_name=f"Section {i}", content="Generated paragraph text. " * 40, id=str(i))
+            for i in range(n)
+        ]
+        for name, legacy, engine in (("docx", legacy_build_docx, build_docx), ("pptx", legacy_build_pptx, build_pptx)):
+            old = exports_per_second(legacy, sections, args.seconds)
+            new = exports_per_second(engine, sections, args.seconds)
+            print(f"{name:>6} | {n:>8} | {old:>8.1f} | {new:>8.1f} | {new / old:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: documents per minute for /generate/batch vs one /generate
+call per document.
+
+The stub LLM simulates provider-side prompt caching. It remembers the
+shared prefix (everything before the per-document sections in
+format_user_config) of its last few prompts. A cached prefix is charged
+at 25% of the normal per-character cost. Documents are per-region
+reports: `--topics` groups share a long context and arrive interleaved
+(A, B, C, A, B, C, ...). That shows the effect of grouping them.
+
+Run from backend/:
+    uv run python -m benchmarks.generate_batch --documents 24 --topics 3 --concurrency 4
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from collections import OrderedDict
+
+import httpx
+
+import app.agents.workflow as workflow
+from app.agents.llm_registry import llm_registry
+from app.agents.llm_cache import CACHEABLE_NODES, prompt_text
+from app.agents.rate_limit import RateLimiter
+from app.main import app
+import app.service.batch as batch_module
+
+
+class PrefixCacheStubLLM:
+    round_trip = 0.2
+    chars_per_second = 100_000
+    cached_cost = 0.25
+    cache_slots = 2
+    _cache = OrderedDict()
+    hits = 0
+    calls = 0
+
+    def __init__(self, **kwargs):
+        self.temperature = kwargs.get("temperature", 0)
+
+    @staticmethod
+    def shared_prefix(prompt):
+        for marker in ("## Number of Sections User Expects", "## User Defined Sample Sections"):
+            prompt = prompt.split(marker)[0]
+        return prompt
+
+    def _latency(self, prompt):
+        cls = PrefixCacheStubLLM
+        prefix = self.shared_prefix(prompt)
+        cls.calls += 1
+        if prefix in cls._cache:
+            cls.hits += 1
+            cls._cache.move_to_end(prefix)
+            cost = len(prefix) * cls.cached_cost + (len(prompt) - len(prefix))
+        else:
+            cls._cache[prefix] = True
+            while len(cls._cache) > cls.cache_slots:
+                cls._cache.popitem(last=False)
+            cost = len(prompt)
+        return cls.round_trip + cost / cls.chars_per_second
+
+    def _reply(self):
+        if self.temperature > 0:  # evaluator
+            payload = {
+                "coherency_score": 0.9,
+                "semantic_issues": "None",
+                "structural_changes": "None",
+                "next_action": "no_action",
+                "evaluator_diagnostic_summary": "Stubbed evaluation.",
+            }
+        else:
+            payload = {"generated_content": [{"section_name": "Overview", "content": "Stubbed content."}]}
+        return type("Reply", (), {"content": json.dumps(payload)})()
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self._latency(prompt_text(prompt)))
+        return self._reply()
+
+    @classmethod
+    def reset(cls):
+        cls._cache.clear()
+        cls.hits = cls.calls = 0
+
+
+def documents(n, topics, context_chars):
+    return [
+        {
+            "main_topic": f"Quarterly market report {i % topics}",
+            "constraints": "Formal tone, cite figures.",
+            "context": f"Topic {i % topics} background. " * (context_chars // 25),
+            "sections": [{"section_name": "Overview", "description": f"Region {i}"}],
+        }
+        for i in range(n)
+    ]
+
+
+async def timed(fn):
+    PrefixCacheStubLLM.reset()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await fn()
+    elapsed = time.perf_counter() - start
+    hit_rate = PrefixCacheStubLLM.hits / max(PrefixCacheStubLLM.calls, 1)
+    return elapsed, hit_rate
+
+
+async def run(n, topics, concurrency, context_chars):
+    docs = documents(n, topics, context_chars)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+
+        async def sequential():
+            for doc in docs:
+                response = await client.post("/generate", json=doc)
+                assert response.status_code == 200, response.text
+
+        async def batch():
+            response = await client.post("/generate/batch", json={"items": docs, "max_concurrency": concurrency})
+            assert response.status_code == 200 and response.json()["failed"] == 0, response.text
+
+        scenarios = [("sequential /generate", sequential), ("batch, arrival order", batch), ("batch, grouped", batch)]
+        print(f"{n} documents, {topics} topics, concurrency {concurrency}")
+        print(f"{'scenario':>22} | {'seconds':>7} | {'docs/min':>8} | prefix cache hits")
+        for name, fn in scenarios:
+            grouped = batch_module.schedule_order
+            if name == "batch, arrival order":
+                batch_module.schedule_order = lambda states: list(range(len(states)))
+            try:
+                elapsed, hit_rate = await timed(fn)
+            finally:
+                batch_module.schedule_order = grouped
+            print(f"{name:>22} | {elapsed:>7.2f} | {n / elapsed * 60:>8.1f} | {hit_rate:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=24)
+    parser.add_argument("--topics", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--context-chars", type=int, default=40_000)
+    args = parser.parse_args()
+
+    llm_registry.set_factory(PrefixCacheStubLLM)
+    CACHEABLE_NODES.clear()
+    # The stub reports no usage, so every call keeps its full token reservation; with the default
+    # quota the scenarios would queue on each other's minute instead of measuring scheduling
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=10**9, default_tpm=10**12)
+    asyncio.run(run(args.documents, args.topics, args.concurrency, args.context_chars))
+
+
+if __name__ == "__main__":
+    main()
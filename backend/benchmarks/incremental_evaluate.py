@@ -0,0 +1,93 @@
+"""
+Benchmark: full vs incremental /evaluate after a one-section edit.
+
+The stub LLM charges a round trip plus prompt-size-proportional time
+(input tokens dominate evaluator latency on large documents). Reports the
+evaluator prompt size and wall-clock time for both paths.
+
+Run from backend/:
+    uv run python -m benchmarks.incremental_evaluate --sections 30 --section-chars 3000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+import httpx
+
+from app.agents.llm_registry import llm_registry
+from app.agents.llm_cache import CACHEABLE_NODES, prompt_text
+from app.main import app
+
+
+class PromptSizeStubLLM:
+    round_trip = 0.2
+    chars_per_second = 50_000
+    prompt_chars = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    async def ainvoke(self, prompt):
+        prompt = prompt_text(prompt)
+        PromptSizeStubLLM.prompt_chars.append(len(prompt))
+        await asyncio.sleep(self.round_trip + len(prompt) / self.chars_per_second)
+        payload = {
+            "coherency_score": 0.9,
+            "semantic_issues": "None",
+            "structural_changes": "None",
+            "next_action": "no_action",
+            "evaluator_diagnostic_summary": "Stubbed evaluation.",
+        }
+        return type("Reply", (), {"content": json.dumps(payload)})()
+
+
+async def timed_evaluate(client, body):
+    PromptSizeStubLLM.prompt_chars.clear()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = await client.post("/evaluate", json=body)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    return elapsed, sum(PromptSizeStubLLM.prompt_chars), response.json()
+
+
+async def run(n, section_chars):
+    body = {
+        "main_topic": "Incremental evaluation",
+        "generated_content": [
+            {"section_name": f"Section {i}", "content": f"Paragraph {i}. " * (section_chars // 14)}
+            for i in range(n)
+        ],
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        _, _, first = await timed_evaluate(client, body)
+
+        # The user edits one paragraph of one section
+        body["generated_content"][n // 2]["content"] += " One more edited sentence."
+        full_time, full_chars, _ = await timed_evaluate(client, body)
+
+        body["previous_evaluation"] = first["evaluation_snapshot"]
+        inc_time, inc_chars, _ = await timed_evaluate(client, body)
+
+    print(f"full evaluation        : {full_time:.2f}s, {full_chars:,} prompt chars")
+    print(f"incremental evaluation : {inc_time:.2f}s, {inc_chars:,} prompt chars")
+    print(f"speedup                : {full_time / inc_time:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, default=30)
+    parser.add_argument("--section-chars", type=int, default=3000)
+    args = parser.parse_args()
+
+    CACHEABLE_NODES.clear()
+    llm_registry.set_factory(PromptSizeStubLLM)
+    asyncio.run(run(args.sections, args.section_chars))
+
+
+if __name__ == "__main__":
+    main()
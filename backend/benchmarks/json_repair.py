@@ -0,0 +1,113 @@
+"""
+Benchmark: LLM work lost to unreadable replies, with and without reply
+repair (JSON_REPAIR), on the fake LLM.
+
+A share of the fake model's replies (--malformed-rates) come back cut off
+or with one item's JSON broken. With strict parsing the run fails and the
+client re-sends the whole /generate request (up to --attempts times);
+with repair, the readable sections are kept and only the broken ones are
+requested again. Reports LLM calls and tokens per document, the extra
+work over a clean run, whole requests the client had to re-send, and
+documents that still failed.
+
+The response cache is off, so a re-sent request pays for its calls again.
+
+Run from backend/:
+    uv run python -m benchmarks.json_repair --documents 40
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+
+from typing import ClassVar
+
+import httpx
+
+import app.agents.workflow as workflow
+from app.agents.fake_llm import FakeChatModel, fake_llm_config
+from app.agents.llm_cache import CACHEABLE_NODES, prompt_text
+from app.agents.llm_registry import llm_registry
+from app.agents.rate_limit import RateLimiter
+from app.main import app
+
+
+class CountingFakeLLM(FakeChatModel):
+    calls: ClassVar[int] = 0
+    tokens: ClassVar[int] = 0
+
+    async def ainvoke(self, prompt):
+        message = await super().ainvoke(prompt)
+        CountingFakeLLM.calls += 1
+        CountingFakeLLM.tokens += len(prompt_text(prompt)) // 4 + message.usage_metadata["output_tokens"]
+        return message
+
+
+def document(i):
+    return {
+        "main_topic": f"Annual operations review {i}",
+        "constraints": "Formal tone, under 300 words per section.",
+        "sections": [{"section_name": f"Part {n}", "description": f"Topic {n} of the review"} for n in range(1, 6)],
+    }
+
+
+async def run(documents, attempts):
+    CountingFakeLLM.calls = CountingFakeLLM.tokens = 0
+    failed = resent = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def one(i):
+            nonlocal failed, resent
+            for attempt in range(attempts):
+                resent += attempt > 0
+                response = await client.post("/generate", json=document(i))
+                if response.status_code == 200:
+                    return
+            failed += 1
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(one(i) for i in range(documents)))
+    return {
+        "calls": CountingFakeLLM.calls / documents,
+        "tokens": CountingFakeLLM.tokens / documents,
+        "failed": failed,
+        "resent": resent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--malformed-rates", default="0.05,0.1,0.2", help="comma-separated")
+    parser.add_argument("--attempts", type=int, default=5, help="whole-request attempts per document")
+    args = parser.parse_args()
+
+    fake_llm_config.latency_median = 0.01
+    fake_llm_config.tokens_per_second = 1e6
+    fake_llm_config.refine_depth = 1
+    llm_registry.set_factory(CountingFakeLLM)
+    CACHEABLE_NODES.clear()
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=10**9, default_tpm=10**12)
+
+    fake_llm_config.malformed_rate = 0
+    llm_registry.clear()  # new clients start their prompt counts over
+    clean = asyncio.run(run(args.documents, 1))
+    print(f"clean run: {clean['calls']:.2f} LLM calls, {clean['tokens']:,.0f} tokens per document\n")
+
+    print(f"{'malformed':>9} | {'parsing':>7} | {'calls/doc':>9} | {'tokens/doc':>10} | {'extra work':>10} | {'re-sent':>7} | failed docs")
+    for rate in [float(r) for r in args.malformed_rates.split(",")]:
+        fake_llm_config.malformed_rate = rate
+        for label, repair in [("strict", False), ("repair", True)]:
+            workflow.JSON_REPAIR = repair
+            llm_registry.clear()  # new clients start their prompt counts over
+            result = asyncio.run(run(args.documents, args.attempts))
+            extra = result["tokens"] / clean["tokens"] - 1
+            print(
+                f"{rate:>9.0%} | {label:>7} | {result['calls']:>9.2f} | {result['tokens']:>10,.0f} | "
+                f"{extra:>+10.1%} | {result['resent']:>7} | {result['failed']}/{args.documents}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Load test: N concurrent /generate requests against a stubbed LLM.
+
+The stub sleeps for a fixed latency on every call (like a real provider
+round trip) and returns schema-valid JSON. With the async graph, N
+concurrent requests should finish in roughly the time of one.
+
+Run from backend/:
+    uv run python -m benchmarks.load_concurrent_generate --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from app.agents.llm_registry import llm_registry
+from app.agents.llm_cache import CACHEABLE_NODES
+from app.main import app
+
+
+class StubLLM:
+    """ Stand-in for ChatGoogleGenerativeAI with a fixed per-call latency """
+
+    latency = 0.5
+
+    def __init__(self, **kwargs):
+        self.temperature = kwargs.get("temperature", 0)
+
+    def _reply(self):
+        if self.temperature > 0:  # evaluator
+            payload = {
+                "coherency_score": 0.9,
+                "semantic_issues": "None",
+                "structural_changes": "None",
+                "next_action": "no_action",
+                "evaluator_diagnostic_summary": "Stubbed evaluation.",
+            }
+        else:
+            payload = {"generated_content": [{"section_name": "Intro", "content": "Stubbed content."}]}
+        return type("Reply", (), {"content": json.dumps(payload)})()
+
+    def invoke(self, prompt):
+        time.sleep(self.latency)
+        return self._reply()
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return self._reply()
+
+
+PAYLOAD = {"main_topic": "Load testing", "sections": [{"section_name": "Intro", "description": "Short intro"}]}
+
+
+async def run(concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        start = time.perf_counter()
+        await client.post("/generate", json=PAYLOAD)
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/generate", json=PAYLOAD) for _ in range(concurrency)))
+        burst = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+    return single, burst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM latency per call (s)")
+    args = parser.parse_args()
+
+    StubLLM.latency = args.latency
+    # Measure real (stubbed) LLM work, not response-cache hits
+    CACHEABLE_NODES.clear()
+    llm_registry.set_factory(StubLLM)
+
+    single, burst = asyncio.run(run(args.concurrency))
+    print(f"1 request            : {single:.2f}s")
+    print(f"{args.concurrency} concurrent requests: {burst:.2f}s  ({burst / single:.2f}x a single request)")
+    print(f"LLM clients          : {llm_registry.stats()}")
+
+
+if __name__ == "__main__":
+    main()
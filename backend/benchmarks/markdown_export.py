@@ -0,0 +1,95 @@
+"""
+Benchmark: markdown-aware export throughput on large generated documents.
+
+Every section mixes headings, inline formatting, bullet/numbered lists,
+a code block and a table, and is long enough to spill onto PPTX
+continuation slides. Reports parse-only blocks/s and full exports/s
+(with MB/s of markdown consumed) per format.
+
+Run from backend/:
+    uv run python -m benchmarks.markdown_export --sections 10 50 --paragraphs 20 --seconds 3
+"""
+import argparse
+import io
+import time
+
+from pptx import Presentation
+
+from app.datamodels import Section
+from app.service.export_engine import template_cache
+from app.service.format_output_file import build_docx, build_pptx
+from app.service.markdown_render import iter_blocks, parse_inline
+
+
+def section_markdown(i, paragraphs):
+    parts = [f"## Part {i}", ""]
+    for p in range(paragraphs):
+        parts.append(
+            f"Paragraph {p} covers **key findings**, *caveats* and `metric_{p}` values, "
+            "with enough running text to wrap across several lines of a slide body. " * 2
+        )
+        parts.append("")
+        if p % 5 == 0:
+            parts += ["- first point", "- second **bold** point", "  - nested detail", ""]
+            parts += ["1. step one", "2. step two", ""]
+        if p % 10 == 0:
+            parts += ["```", "for row in rows:", "    total += row.value", "```", ""]
+            parts += ["| Region | Q1 | Q2 |", "|---|---:|---:|"]
+            parts += [f"| R{r} | {r * 10} | **{r * 12}** |" for r in range(6)]
+            parts.append("")
+    return "\n".join(parts)
+
+
+def per_second(fn, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / seconds
+
+
+def parse_all(sections):
+    blocks = 0
+    for section in sections:
+        for _, _, payload in iter_blocks(section.content):
+            if isinstance(payload, str):
+                parse_inline(payload)
+            blocks += 1
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--paragraphs", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    template_cache.warm()
+
+    print(f"{'sections':>8} | {'md KB':>7} | {'parse blk/s':>11} | {'docx/s':>7} | {'docx MB/s':>9} | {'pptx/s':>7} | {'pptx MB/s':>9} | slides")
+    for n in args.sections:
+        sections = [
+            Section(section_name=f"Section {i}", content=section_markdown(i, args.paragraphs), id=str(i))
+            for i in range(n)
+        ]
+        md_mb = sum(len(s.content) for s in sections) / 2**20
+        blocks = parse_all(sections)
+        parse_rate = per_second(lambda: parse_all(sections), args.seconds) * blocks
+
+        docx_rate = per_second(lambda: build_docx(sections, io.BytesIO()), args.seconds)
+        pptx_rate = per_second(lambda: build_pptx(sections, io.BytesIO()), args.seconds)
+
+        buffer = io.BytesIO()
+        build_pptx(sections, buffer)
+        slides = len(Presentation(buffer).slides)
+
+        print(
+            f"{n:>8} | {md_mb * 1024:>7.0f} | {parse_rate:>11.0f} | {docx_rate:>7.2f} | {docx_rate * md_mb:>9.2f} "
+            f"| {pptx_rate:>7.2f} | {pptx_rate * md_mb:>9.2f} | {slides}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: evaluator triage and provider fallback.
+
+1. Evaluator triage. Each stub document has a hidden quality score. The
+   large model reports it exactly; the small triage model reports it
+   with noise (sd 0.08) at a tenth of the latency. Compares large-only
+   scoring with triage + grey-zone escalation: latency, cost, escalation
+   rate, and how often the final next_action matches the large model's.
+2. Fallback. The primary model hangs until the node timeout, and calls
+   fall back to a second provider. Per-call latency is shown with the
+   circuit breaker effectively off and at its default.
+
+Run from backend/:
+    uv run python -m benchmarks.model_routing --documents 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import re
+import statistics
+import time
+
+import app.agents.model_routing as model_routing
+import app.agents.workflow as workflow
+from app.agents.llm_cache import CACHEABLE_NODES
+from app.agents.llm_registry import llm_registry
+from app.agents.model_routing import model_router
+from app.agents.rate_limit import RateLimiter
+
+SMALL = "groq:llama-3.1-8b-instant"
+LARGE = "google:gemini-2.5-pro"
+PRIMARY = "google:gemini-2.5-flash"
+FALLBACK = "vertexai:gemini-2.5-pro"
+PASS_SCORE = 0.75
+
+
+class RoutedStubLLM:
+    """ Behaves according to the model it was built for """
+
+    latency = {"llama-3.1-8b-instant": 0.05, "gemini-2.5-pro": 0.5, "gemini-2.5-flash": 0.2}
+    hanging = set()
+    rng = random.Random(7)
+
+    def __init__(self, **kwargs):
+        self.model = kwargs["model"]
+        self.timeout = kwargs.get("timeout")
+
+    def _score(self, prompt):
+        quality = float(re.search(r"quality=([0-9.]+)", prompt).group(1))
+        if self.model == "llama-3.1-8b-instant":
+            quality = min(1.0, max(0.0, quality + self.rng.gauss(0, 0.08)))
+        return round(quality, 3)
+
+    async def ainvoke(self, prompt):
+        if self.model in self.hanging:
+            await asyncio.sleep(self.timeout)
+            raise TimeoutError(f"{self.model} timed out")
+        await asyncio.sleep(self.latency[self.model])
+        score = self._score(prompt)
+        payload = {
+            "coherency_score": score,
+            "semantic_issues": "None",
+            "structural_changes": "None",
+            "next_action": "no_action" if score >= PASS_SCORE else "semantic_refine",
+            "evaluator_diagnostic_summary": "Stubbed evaluation.",
+        }
+        usage = {"input_tokens": len(prompt) // 4, "output_tokens": 300}
+        return type("Reply", (), {"content": json.dumps(payload), "usage_metadata": usage})()
+
+
+def prompt_for(quality):
+    return f"Evaluate this document.\nquality={quality:.3f}\n" + "Section text. " * 600
+
+
+def total_cost():
+    return sum(c["cost_usd"] for c in model_router.stats()["calls"])
+
+
+async def timed_eval(prompt):
+    start = time.perf_counter()
+    eval_data = await workflow.aevaluate_llm(prompt)
+    return time.perf_counter() - start, eval_data["next_action"]
+
+
+async def triage_benchmark(n):
+    qualities = [random.Random(i).uniform(0.3, 1.0) for i in range(n)]
+    print(f"1. Evaluator triage: {n} documents, grey zone 0.6-0.85")
+    print(f"{'routing':>20} | {'mean s':>6} | {'cost $':>8} | {'escalated':>9} | same next_action as large")
+
+    reference = None
+    for name, config in [
+        ("large only", {"nodes": {"evaluator": {"models": [LARGE]}}}),
+        ("triage + escalation", {"nodes": {"evaluator": {
+            "models": [LARGE], "triage": {"models": [SMALL], "grey_zone": [0.6, 0.85]},
+        }}}),
+    ]:
+        model_router.configure(config)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = await asyncio.gather(*(timed_eval(prompt_for(q)) for q in qualities))
+        actions = [action for _, action in results]
+        reference = reference or actions
+        agreement = sum(a == b for a, b in zip(actions, reference)) / n
+        triage = model_router.stats()["triage"]
+        escalated = f"{triage['escalated'] / n:.0%}" if triage else "-"
+        mean = statistics.mean(seconds for seconds, _ in results)
+        print(f"{name:>20} | {mean:>6.3f} | {total_cost():>8.4f} | {escalated:>9} | {agreement:.1%}")
+
+
+async def fallback_benchmark(calls, timeout):
+    print(f"\n2. Fallback: {PRIMARY} hangs until the {timeout}s timeout, {FALLBACK} answers; {calls} sequential calls")
+    print(f"{'circuit breaker':>20} | {'p50 s':>6} | {'max s':>6} | {'total s':>7}")
+    RoutedStubLLM.hanging = {"gemini-2.5-flash"}
+    for name, failures in [("off", 10**9), ("after 3 failures", 3)]:
+        model_routing.LLM_CIRCUIT_FAILURES = failures
+        model_router.configure({"nodes": {"generate_initial_draft": {"models": [PRIMARY, FALLBACK], "timeout": timeout}}})
+        latencies = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(calls):
+                start = time.perf_counter()
+                await workflow.ainvoke_llm("generate_initial_draft", prompt_for(0.9))
+                latencies.append(time.perf_counter() - start)
+        print(f"{name:>20} | {statistics.median(latencies):>6.2f} | {max(latencies):>6.2f} | {sum(latencies):>7.2f}")
+    RoutedStubLLM.hanging = set()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    llm_registry.set_factory(RoutedStubLLM)
+    CACHEABLE_NODES.clear()
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=10**9, default_tpm=10**12)
+    asyncio.run(triage_benchmark(args.documents))
+    asyncio.run(fallback_benchmark(args.calls, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: N API worker processes, with per-process state vs a shared
+state backend (SHARED_STATE_URL), on the fake LLM.
+
+Starts N uvicorn processes on their own ports (workers behind a load
+balancer) and sends --documents distinct /generate requests round-robin,
+then the same documents again, each to a different worker than the first
+time (client retries, regenerating after a lost response). With
+per-process state the second pass repeats every LLM call on the other
+worker; with a shared backend the response cache answers it. The redis
+row runs against benchmarks/resp_server.py, the local Redis-protocol
+stand-in.
+
+Reports requests per second and the LLM calls and tokens paid for,
+summed over the workers' /metrics.
+
+Run from backend/:
+    uv run python -m benchmarks.multi_worker --workers 4 --documents 24
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.agents.shared_state import MemoryState
+from benchmarks.resp_server import RESPServer
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def document(i):
+    return {
+        "main_topic": f"Annual operations review {i}",
+        "constraints": "Formal tone, under 300 words per section.",
+        # Distinct section names too, so documents don't share prompts
+        "sections": [
+            {"section_name": f"Part {n} of review {i}", "description": f"Topic {n} of the review"} for n in range(1, 6)
+        ],
+    }
+
+
+def start_workers(count, state_url, work_dir):
+    env = {
+        **os.environ,
+        "FAKE_LLM": "true",
+        "FAKE_LLM_LATENCY_MEDIAN": "0.05",
+        "FAKE_LLM_TOKENS_PER_SECOND": "1000000",
+        "SHARED_STATE_URL": state_url,
+        "DOCUMENT_STORE_PATH": os.path.join(work_dir, "documents.db"),
+        "LLM_CACHE_SQLITE_PATH": "",
+    }
+    ports = [free_port() for _ in range(count)]
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        for port in ports
+    ]
+    return ports, processes
+
+
+async def wait_ready(client, ports):
+    deadline = time.monotonic() + 60
+    for port in ports:
+        while True:
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Worker on port {port} did not start")
+            await asyncio.sleep(0.2)
+
+
+def metric_total(text, name, **labels):
+    total = 0.0
+    for line in text.splitlines():
+        if not line.startswith(name + "{") and not line.startswith(name + " "):
+            continue
+        if all(f'{k}="{v}"' in line for k, v in labels.items()):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def run(ports, documents, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    failed = 0
+    async with httpx.AsyncClient(timeout=None) as client:
+        await wait_ready(client, ports)
+
+        async def one(i, shift):
+            nonlocal failed
+            port = ports[(i + shift) % len(ports)]
+            async with limit:
+                response = await client.post(f"http://127.0.0.1:{port}/generate", json=document(i))
+            failed += response.status_code != 200
+
+        start = time.perf_counter()
+        # The second pass sends every document to the next worker over
+        for shift in (0, 1):
+            await asyncio.gather(*(one(i, shift) for i in range(documents)))
+        elapsed = time.perf_counter() - start
+
+        # Cache hits aren't in the call histogram: it counts the calls paid for
+        calls = tokens = 0.0
+        for port in ports:
+            text = (await client.get(f"http://127.0.0.1:{port}/metrics")).text
+            calls += metric_total(text, "minidocs_llm_call_duration_seconds_count")
+            tokens += metric_total(text, "minidocs_llm_tokens_total")
+    return {
+        "requests_per_second": 2 * documents / elapsed,
+        "llm_calls": calls,
+        "tokens": tokens,
+        "failed": failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--documents", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    resp_server = RESPServer().start_in_thread()
+    print(f"{args.documents} documents, each sent twice (to different workers), {args.concurrency} in flight\n")
+    print(f"{'workers':>7} | {'state':>14} | {'req/s':>6} | {'LLM calls':>9} | {'LLM tokens':>10} | failed")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for workers, label, url in [
+            (1, "memory", "memory://"),
+            (args.workers, "memory", "memory://"),
+            (args.workers, "sqlite", f"sqlite:///{work_dir}/state.db"),
+            (args.workers, "redis stand-in", resp_server.url),
+        ]:
+            resp_server.state = MemoryState()
+            run_dir = tempfile.mkdtemp(dir=work_dir)
+            ports, processes = start_workers(workers, url.replace(work_dir, run_dir), run_dir)
+            try:
+                result = asyncio.run(run(ports, args.documents, args.concurrency))
+            finally:
+                for process in processes:
+                    process.terminate()
+                for process in processes:
+                    process.wait()
+            print(
+                f"{workers:>7} | {label:>14} | {result['requests_per_second']:>6.1f} | {result['llm_calls']:>9,.0f} | "
+                f"{result['tokens']:>10,.0f} | {result['failed']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
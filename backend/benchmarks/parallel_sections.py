@@ -0,0 +1,92 @@
+"""
+Benchmark: single-shot vs section-parallel initial generation.
+
+The stub LLM models output-bound latency: every call costs a fixed
+round trip plus a per-section generation time, so a single prompt that
+writes N sections takes ~N times longer than a prompt that writes one.
+
+Run from backend/:
+    uv run python -m benchmarks.parallel_sections --sections 3 10 30
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from app.agents.llm_registry import llm_registry
+from app.agents.llm_cache import CACHEABLE_NODES, prompt_text
+from app.agents.workflow import chain, new_run_budget
+
+
+class SectionStubLLM:
+    round_trip = 0.2
+    per_section = 0.15
+
+    def __init__(self, **kwargs):
+        self.schema = kwargs["response_schema"].get("title")
+
+    async def ainvoke(self, prompt):
+        prompt = prompt_text(prompt)
+        if self.schema == "EvaluatorState":
+            await asyncio.sleep(self.round_trip)
+            payload = {
+                "coherency_score": 0.9,
+                "semantic_issues": "None",
+                "structural_changes": "None",
+                "next_action": "no_action",
+                "evaluator_diagnostic_summary": "Stubbed evaluation.",
+            }
+        elif self.schema == "GeneratedConfig":
+            await asyncio.sleep(self.round_trip + self.per_section)
+            payload = {"section_name": "stub", "content": "Stubbed section."}
+        else:
+            n = prompt.count("Description of section")
+            await asyncio.sleep(self.round_trip + self.per_section * n)
+            payload = {"generated_content": [{"section_name": f"S{i}", "content": "Stubbed section."} for i in range(n)]}
+        return type("Reply", (), {"content": json.dumps(payload)})()
+
+
+def input_state(n, parallel):
+    return {
+        "supervisor_state": {"trigger_action": "generate"},
+        "user_state": {
+            "main_topic": "Benchmark",
+            "dynamic_generation": "false",
+            "expected_sections_count": "",
+            "sections": [{"section_name": f"S{i}", "description": f"Description of section {i}"} for i in range(n)],
+            "constraints": "",
+            "context": "",
+            "parallel_sections": "true" if parallel else "false",
+        },
+        **new_run_budget(),
+    }
+
+
+async def timed_run(n, parallel):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = await chain.ainvoke(input_state(n, parallel))
+    assert len(result["generated_state"]["generated_content"]) == n
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sections", type=int, nargs="+", default=[3, 10, 30])
+    args = parser.parse_args()
+
+    # Measure real (stubbed) LLM work, not response-cache hits
+    CACHEABLE_NODES.clear()
+    llm_registry.set_factory(SectionStubLLM)
+
+    print(f"{'sections':>8} | {'single-shot':>11} | {'parallel':>8} | speedup")
+    for n in args.sections:
+        single = asyncio.run(timed_run(n, parallel=False))
+        parallel = asyncio.run(timed_run(n, parallel=True))
+        print(f"{n:>8} | {single:>10.2f}s | {parallel:>7.2f}s | {single / parallel:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: input tokens per node for one /generate run with a long
+`context`, on the fake LLM (two semantic refine rounds).
+
+For every LLM call it measures the prompt size and how much of it is a
+prefix already sent by an earlier call. That is roughly what provider
+prompt caching can serve from cache; Gemini needs at least 1024 tokens of
+shared prefix (--min-cached-tokens). "uncached" = input - cacheable.
+
+Compares the loop context budget (LOOP_CONTEXT_TOKEN_BUDGET) off and on.
+
+Run from backend/:
+    uv run python -m benchmarks.prompt_compaction --context-chars 60000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+from collections import defaultdict
+
+import httpx
+
+import app.agents.workflow as workflow
+from app.agents.fake_llm import FakeChatModel, fake_llm_config
+from app.agents.llm_cache import CACHEABLE_NODES, prompt_text
+from app.agents.llm_registry import llm_registry
+from app.main import app
+
+
+def document(context_chars):
+    paragraph = "Background: the regional teams report steady growth, rising costs and new risks. " * 8
+    return {
+        "main_topic": "Annual operations review",
+        "constraints": "Formal tone, under 300 words per section.",
+        "context": "\n\n".join([paragraph] * (context_chars // len(paragraph) + 1))[:context_chars],
+        "sections": [{"section_name": f"Part {i}", "description": f"Topic {i} of the review"} for i in range(1, 6)],
+    }
+
+
+async def measure(body, min_cached_tokens):
+    calls = []
+    ainvoke_llm = workflow.ainvoke_llm
+
+    async def recording(node, prompt):
+        calls.append((node, prompt_text(prompt)))
+        return await ainvoke_llm(node, prompt)
+
+    workflow.ainvoke_llm = recording
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = await client.post("/generate", json=body)
+            assert response.status_code == 200, response.text
+    finally:
+        workflow.ainvoke_llm = ainvoke_llm
+
+    per_node = defaultdict(lambda: {"calls": 0, "input": 0, "cacheable": 0})
+    for i, (node, text) in enumerate(calls):
+        shared = max((len(os.path.commonprefix([text, earlier])) for _, earlier in calls[:i]), default=0)
+        cacheable = shared // 4 if shared // 4 >= min_cached_tokens else 0
+        stats = per_node[node]
+        stats["calls"] += 1
+        stats["input"] += len(text) // 4
+        stats["cacheable"] += cacheable
+    return per_node
+
+
+def print_table(title, per_node):
+    print(title)
+    print(f"{'node':>22} | {'calls':>5} | {'input tok':>9} | {'cacheable':>9} | {'uncached':>8}")
+    totals = {"calls": 0, "input": 0, "cacheable": 0}
+    for node, stats in per_node.items():
+        for k in totals:
+            totals[k] += stats[k]
+        print(f"{node:>22} | {stats['calls']:>5} | {stats['input']:>9,} | {stats['cacheable']:>9,} | {stats['input'] - stats['cacheable']:>8,}")
+    print(f"{'total':>22} | {totals['calls']:>5} | {totals['input']:>9,} | {totals['cacheable']:>9,} | {totals['input'] - totals['cacheable']:>8,}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--context-chars", type=int, default=60_000)
+    parser.add_argument("--min-cached-tokens", type=int, default=1024)
+    args = parser.parse_args()
+
+    fake_llm_config.latency_median = 0.01
+    fake_llm_config.tokens_per_second = 1e6
+    fake_llm_config.refine_depth = 2
+    llm_registry.set_factory(FakeChatModel)
+    CACHEABLE_NODES.clear()
+
+    body = document(args.context_chars)
+    budget = workflow.LOOP_CONTEXT_TOKEN_BUDGET
+    for label, loop_budget in [("loop context budget off", 0), (f"loop context budget {budget} tokens", budget)]:
+        workflow.LOOP_CONTEXT_TOKEN_BUDGET = loop_budget
+        llm_registry.clear()  # new clients start their prompt counts over
+        print_table(f"{label} ({args.context_chars:,} chars of context)", asyncio.run(measure(body, args.min_cached_tokens)))
+
+
+if __name__ == "__main__":
+    main()
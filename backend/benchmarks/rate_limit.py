@@ -0,0 +1,162 @@
+"""
+Load test: the shared LLM rate limiter against a fake provider that
+answers 429 once its requests-per-minute quota is used up.
+
+Scenarios:
+  1. limiter effectively off (quota far above the provider's): concurrent
+     /generate runs hit 429s, retry, and some fail outright
+  2. limiter set to the provider quota: calls queue instead of failing
+  3. priority lanes: an /evaluate request arriving during a /generate/batch
+     backlog larger than one minute of quota, with and without the
+     interactive lane
+
+Run from backend/:
+    uv run python -m benchmarks.rate_limit --quota-rpm 30 --documents 20 --backlog 40
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from collections import deque
+
+import httpx
+
+import app.agents.workflow as workflow
+import app.main as main_module
+from app.agents.llm_registry import llm_registry
+from app.agents.llm_cache import CACHEABLE_NODES
+from app.agents.rate_limit import RateLimiter
+from app.main import app
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+class Fake429LLM:
+    """ Provider stand-in with a sliding one-minute request quota """
+
+    quota_rpm = 30
+    latency = 0.3
+    _calls = deque()
+    rejected = 0
+
+    def __init__(self, **kwargs):
+        self.temperature = kwargs.get("temperature", 0)
+
+    def _admit(self):
+        now = time.monotonic()
+        while Fake429LLM._calls and now - Fake429LLM._calls[0] > 60:
+            Fake429LLM._calls.popleft()
+        if len(Fake429LLM._calls) >= Fake429LLM.quota_rpm:
+            Fake429LLM.rejected += 1
+            raise FakeRateLimitError("429 RESOURCE_EXHAUSTED: quota exceeded")
+        Fake429LLM._calls.append(now)
+
+    def _reply(self):
+        if self.temperature > 0:  # evaluator
+            payload = {
+                "coherency_score": 0.9,
+                "semantic_issues": "None",
+                "structural_changes": "None",
+                "next_action": "no_action",
+                "evaluator_diagnostic_summary": "Stubbed evaluation.",
+            }
+        else:
+            payload = {"generated_content": [{"section_name": "Intro", "content": "Stubbed content."}]}
+        return type("Reply", (), {"content": json.dumps(payload)})()
+
+    async def ainvoke(self, prompt):
+        self._admit()
+        await asyncio.sleep(self.latency)
+        return self._reply()
+
+    @classmethod
+    def reset(cls):
+        cls._calls.clear()
+        cls.rejected = 0
+
+
+def use_limiter(rpm):
+    # Provider-side usage starts from zero for every scenario
+    Fake429LLM.reset()
+    workflow.rate_limiter = RateLimiter(limits={}, default_rpm=rpm, default_tpm=10**9)
+
+
+GENERATE = {"main_topic": "Rate limits", "sections": [{"section_name": "Intro", "description": "Short intro"}]}
+EVALUATE = {"main_topic": "Rate limits", "generated_content": [{"section_name": "Intro", "content": "Edited text."}]}
+
+
+async def concurrent_generate(client, n):
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(client.post("/generate", json=GENERATE) for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for r in responses if r.status_code != 200)
+    return elapsed, failed
+
+
+async def evaluate_during_backlog(client, n, lanes):
+    set_lane, cap = main_module.set_llm_lane, main_module.GENERATE_BATCH_CONCURRENCY
+    if not lanes:
+        main_module.set_llm_lane = lambda lane: None
+    # All batch runs in flight at once, so their calls use up the quota and queue
+    main_module.GENERATE_BATCH_CONCURRENCY = n
+    try:
+        backlog = asyncio.create_task(
+            client.post("/generate/batch", json={"items": [GENERATE] * n, "max_concurrency": n})
+        )
+        await asyncio.sleep(1)
+
+        start = time.perf_counter()
+        response = await client.post("/evaluate", json=EVALUATE)
+        assert response.status_code == 200, response.text
+        latency = time.perf_counter() - start
+        await backlog
+    finally:
+        main_module.set_llm_lane, main_module.GENERATE_BATCH_CONCURRENCY = set_lane, cap
+    return latency
+
+
+async def run(quota_rpm, n, backlog):
+    Fake429LLM.quota_rpm = quota_rpm
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        with contextlib.redirect_stdout(io.StringIO()):
+            use_limiter(quota_rpm * 100)
+            off_time, off_failed = await concurrent_generate(client, n)
+            off_rejected = Fake429LLM.rejected
+
+            use_limiter(quota_rpm)
+            on_time, on_failed = await concurrent_generate(client, n)
+            on_rejected = Fake429LLM.rejected
+
+        print(f"provider quota {quota_rpm} rpm, {n} concurrent /generate (2 LLM calls each)")
+        print(f"{'limiter':>18} | {'seconds':>7} | {'429s':>4} | failed requests")
+        print(f"{'off':>18} | {off_time:>7.1f} | {off_rejected:>4} | {off_failed}")
+        print(f"{'at quota':>18} | {on_time:>7.1f} | {on_rejected:>4} | {on_failed}")
+
+        print(f"\n/evaluate latency while a {backlog}-document /generate/batch is queued")
+        for lanes in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                use_limiter(quota_rpm)
+                latency = await evaluate_during_backlog(client, backlog, lanes)
+            label = "interactive lane" if lanes else "no lanes"
+            print(f"{label:>18} | {latency:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quota-rpm", type=int, default=30)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--backlog", type=int, default=40)
+    args = parser.parse_args()
+
+    llm_registry.set_factory(Fake429LLM)
+    CACHEABLE_NODES.clear()
+    asyncio.run(run(args.quota_rpm, args.documents, args.backlog))
+
+
+if __name__ == "__main__":
+    main()
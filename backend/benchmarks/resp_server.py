@@ -0,0 +1,147 @@
+"""
+Local stand-in for a Redis server: speaks enough of the Redis protocol
+(RESP2) for SHARED_STATE_URL=redis://... (PING, GET, MGET, SET with
+PX/EX/NX, DEL, INCRBY, DBSIZE, SELECT, AUTH, FLUSHDB), keeping the data
+in a MemoryState. For benchmarks and local multi-worker runs where no
+Redis is installed; it also counts commands by key prefix.
+
+Run from backend/:
+    uv run python -m benchmarks.resp_server --port 6379
+"""
+import argparse
+import asyncio
+import threading
+from collections import Counter
+
+from app.agents.shared_state import MemoryState
+
+
+class Status(str):
+    """ A simple-string reply (+OK) rather than a bulk string """
+
+
+class RESPServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.state = MemoryState()
+        # (command, key prefix) -> count, e.g. ("SET", "llm-cache")
+        self.commands = Counter()
+        self._server = None
+
+    async def _read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command (e.g. typed into telnet)
+            return line.decode().split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+        return args
+
+    @staticmethod
+    def _encode(reply):
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, Status):
+            return f"+{reply}\r\n".encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(RESPServer._encode(item) for item in reply)
+        if isinstance(reply, Exception):
+            return f"-ERR {reply}\r\n".encode()
+        data = reply.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    def _execute(self, args):
+        name, args = args[0].upper(), args[1:]
+        if args:
+            self.commands[(name, args[0].split(":")[0])] += 1
+        if name == "PING":
+            return Status("PONG")
+        if name in ("SELECT", "AUTH"):
+            return Status("OK")
+        if name == "GET":
+            return self.state.get(args[0])
+        if name == "MGET":
+            return self.state.get_many(args)
+        if name == "SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            ttl = None
+            if "PX" in options:
+                ttl = int(args[2 + options.index("PX") + 1]) / 1000
+            elif "EX" in options:
+                ttl = int(args[2 + options.index("EX") + 1])
+            if "NX" in options:
+                return Status("OK") if self.state.add(key, value, ttl) else None
+            self.state.set(key, value, ttl)
+            return Status("OK")
+        if name == "DEL":
+            existing = sum(value is not None for value in self.state.get_many(args))
+            self.state.delete(*args)
+            return existing
+        if name == "INCRBY":
+            return self.state.incr(args[0], int(args[1]))
+        if name == "DBSIZE":
+            return self.state.stats()["keys"]
+        if name == "FLUSHDB":
+            self.state = MemoryState()
+            return Status("OK")
+        return ValueError(f"unknown command '{name}'")
+
+    async def _handle(self, reader, writer):
+        try:
+            while (args := await self._read_command(reader)) is not None:
+                if not args:
+                    continue
+                writer.write(self._encode(self._execute(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"RESP stand-in listening on redis://{self.host}:{self.port}/0")
+        async with self._server:
+            await self._server.serve_forever()
+
+    def start_in_thread(self):
+        """ Runs the server on its own event loop in a daemon thread; returns once it listens """
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self
+
+    @property
+    def url(self):
+        return f"redis://{self.host}:{self.port}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    asyncio.run(RESPServer(args.host, args.port).serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: API cold start, with a regression threshold.
+
+1. `python -X importtime -c "import app.main"`, best of --runs: total
+   import time, the slowest top-level imports, and whether any module
+   that should load lazily (workflow, LangGraph, provider SDKs,
+   python-docx/pptx) was imported eagerly.
+2. One uvicorn worker on the fake LLM: seconds from process start until
+   `/` answers, and until the background warm-up has finished
+   (/stats → warm_up).
+
+Exits with status 1 when the import takes longer than
+--max-import-seconds or a lazy module is imported eagerly, so it can
+gate CI.
+
+Run from backend/:
+    uv run python -m benchmarks.startup --max-import-seconds 1.0
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+# Loaded on first use or by the warm-up, never by `import app.main`
+LAZY_MODULES = [
+    "app.agents.workflow",
+    "langgraph",
+    "langchain_google_genai",
+    "google.genai",
+    "docx",
+    "pptx",
+]
+
+
+def import_profile():
+    """ {module: (self µs, cumulative µs, depth)} from one fresh interpreter """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        profile[name.strip()] = (int(own), int(cumulative), depth)
+    return profile
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_ready(timeout=60):
+    """ (seconds until `/` answers, seconds until the warm-up is done) for one new worker """
+    port = free_port()
+    env = {**os.environ, "FAKE_LLM": "true"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    first_response = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    client.get("/")
+                    first_response = time.perf_counter() - start
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+            while time.perf_counter() - start < timeout:
+                if client.get("/stats").json()["warm_up"]["done"]:
+                    return first_response, time.perf_counter() - start
+                time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait()
+    raise RuntimeError("Worker did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-import-seconds", type=float, default=1.0)
+    parser.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    profile = min(profiles, key=lambda p: p["app.main"][1])
+    import_seconds = profile["app.main"][1] / 1e6
+    eager = [name for name in LAZY_MODULES if name in profile]
+
+    print(f"import app.main: {import_seconds:.3f}s (best of {args.runs}), {len(profile)} modules")
+    top_level = sorted(
+        ((cumulative, name) for name, (_, cumulative, depth) in profile.items() if depth == 1),
+        reverse=True,
+    )
+    for cumulative, name in top_level[:args.top]:
+        print(f"  {cumulative / 1e6:>7.3f}s  {name}")
+    print(f"lazy modules imported eagerly: {', '.join(eager) or 'none'}")
+
+    first_response, warm = time_to_ready()
+    print(f"\nnew worker: `/` answers after {first_response:.2f}s, warm-up done after {warm:.2f}s")
+
+    failed = False
+    if import_seconds > args.max_import_seconds:
+        print(f"\nFAIL: import takes {import_seconds:.3f}s, over the {args.max_import_seconds}s threshold")
+        failed = True
+    if eager:
+        print(f"\nFAIL: imported at startup instead of lazily: {', '.join(eager)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    """ `@pytest.mark.anyio` tests run on asyncio, like the app """
+    return "asyncio"
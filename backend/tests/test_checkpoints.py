@@ -0,0 +1,128 @@
+import operator
+from types import SimpleNamespace
+from typing import Annotated, List, TypedDict
+
+import pytest
+from fastapi import HTTPException
+from langgraph.graph import END, START, StateGraph
+
+from app import main
+from app.agents.checkpoints import StateCheckpointer
+from app.agents.shared_state import MemoryState, SQLiteState
+
+
+class State(TypedDict):
+    topic: str
+    steps: Annotated[List[str], operator.add]
+    deadline: float
+
+
+class Flaky:
+    """ A two-node graph whose second node fails while `fail` is set """
+
+    def __init__(self, checkpointer):
+        self.fail = True
+        self.calls = []
+        graph = StateGraph(State)
+        graph.add_node("draft", self.draft)
+        graph.add_node("review", self.review)
+        graph.add_edge(START, "draft")
+        graph.add_edge("draft", "review")
+        graph.add_edge("review", END)
+        self.chain = graph.compile(checkpointer=checkpointer)
+
+    async def draft(self, state):
+        self.calls.append("draft")
+        return {"steps": ["draft"]}
+
+    async def review(self, state):
+        self.calls.append("review")
+        if self.fail:
+            raise RuntimeError("provider down")
+        return {"steps": ["review"]}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def checkpointer(request, tmp_path):
+    state = MemoryState() if request.param == "memory" else SQLiteState(str(tmp_path / "checkpoints.db"))
+    return StateCheckpointer(state)
+
+
+@pytest.fixture
+def graph(checkpointer, monkeypatch):
+    flaky = Flaky(checkpointer)
+    wf = SimpleNamespace(
+        checkpointer=checkpointer, checkpointed_chain=flaky.chain, chain=flaky.chain, REFINE_DEADLINE_SECONDS=60,
+    )
+
+    async def load_workflow():
+        return wf
+
+    monkeypatch.setattr(main, "load_workflow", load_workflow)
+    monkeypatch.setattr(main, "workflow", lambda: wf)
+    return flaky
+
+
+def input_factory():
+    built = []
+
+    async def make_input_state():
+        built.append(1)
+        return {"topic": "T", "steps": [], "deadline": 0}
+
+    return make_input_state, built
+
+
+# ---- claims ----
+
+def test_a_run_can_only_be_claimed_once(checkpointer):
+    assert checkpointer.claim("generate:r1")
+    assert not checkpointer.claim("generate:r1")
+    assert checkpointer.claim("generate:r2")
+    checkpointer.release("generate:r1")
+    assert checkpointer.claim("generate:r1")
+
+
+@pytest.mark.anyio
+async def test_run_in_progress_is_refused_with_409(graph, checkpointer):
+    checkpointer.claim("generate:r1")  # another worker is running it
+    make_input_state, built = input_factory()
+    with pytest.raises(HTTPException) as error:
+        await main.run_graph(make_input_state, "generate:r1")
+    assert error.value.status_code == 409
+    assert built == [] and graph.calls == []  # nothing ran, and the input wasn't built
+
+
+# ---- resume and replay ----
+
+@pytest.mark.anyio
+async def test_retry_resumes_after_the_last_completed_node(graph, checkpointer):
+    make_input_state, built = input_factory()
+    with pytest.raises(RuntimeError):
+        await main.run_graph(make_input_state, "generate:r1")
+    assert graph.calls == ["draft", "review"]
+
+    graph.fail = False
+    result = await main.run_graph(make_input_state, "generate:r1")
+    assert graph.calls == ["draft", "review", "review"]  # draft is not run again
+    assert result["steps"] == ["draft", "review"]
+    assert built == [1]  # the retry didn't build a new input
+    assert result["deadline"] > 0  # the deadline restarts on resume
+    assert checkpointer.resumed == 1
+    # The claim was released after both attempts
+    assert checkpointer.claim("generate:r1")
+
+
+@pytest.mark.anyio
+async def test_finished_run_replays_its_payload(graph, checkpointer):
+    graph.fail = False
+    make_input_state, _ = input_factory()
+    await main.run_graph(make_input_state, "generate:r1")
+    assert await main.finished_run_payload("generate:r1") is None
+
+    payload = await main.finish_run("generate:r1", "r1", {"version": 1})
+    assert payload == {"version": 1, "run_id": "r1"}
+    assert await main.finished_run_payload("generate:r1") == payload
+    assert checkpointer.replayed == 1
+    # Its checkpoints are gone once the payload is kept
+    assert checkpointer.get_tuple({"configurable": {"thread_id": "generate:r1"}}) is None
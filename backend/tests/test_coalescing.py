@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app import main
+from app.main import join_or_start_run, run_result
+
+
+@pytest.fixture(autouse=True)
+def in_flight(monkeypatch):
+    monkeypatch.setattr(main, "COALESCE_REQUESTS", True)
+    monkeypatch.setattr(main, "_in_flight_runs", {})
+    return main._in_flight_runs
+
+
+class Runs:
+    """ start_run stand-in: each run waits for `release`, then returns a result or raises """
+
+    def __init__(self):
+        self.started = []
+        self.release = asyncio.Event()
+        self.error = None
+
+    async def __call__(self, run_id):
+        self.started.append(run_id)
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return {"run_id": run_id, "generated_state": {"generated_content": [{"section_name": "A", "content": "a"}]}}
+
+
+BODY = {"main_topic": "T", "sections": [{"section_name": "A"}]}
+
+
+@pytest.mark.anyio
+async def test_identical_requests_share_one_run(in_flight):
+    runs = Runs()
+    first = join_or_start_run("generate", BODY, "run-1", "trace-1", runs)
+    # Same body with another key order: same run, and the follower takes over its run_id and trace
+    second = join_or_start_run("generate", dict(reversed(BODY.items())), "run-2", "trace-2", runs)
+    other = join_or_start_run("evaluate", BODY, "run-3", "trace-3", runs)
+
+    assert second == first
+    assert first[0] == "run-1" and first[2] == "trace-1"
+    assert other[1] is not first[1]
+    await asyncio.sleep(0)
+    assert runs.started == ["run-1", "run-3"]
+
+    runs.release.set()
+    results = await asyncio.gather(run_result(first[1]), run_result(second[1]))
+    assert results[0]["run_id"] == results[1]["run_id"] == "run-1"
+    await asyncio.sleep(0)
+    assert in_flight == {}
+
+
+@pytest.mark.anyio
+async def test_followers_get_independent_copies():
+    runs = Runs()
+    _, task, _ = join_or_start_run("generate", BODY, "run-1", None, runs)
+    _, joined, _ = join_or_start_run("generate", BODY, "run-2", None, runs)
+    runs.release.set()
+    first, second = await asyncio.gather(run_result(task), run_result(joined))
+
+    assert first == second
+    # Building a payload writes section ids into the result; the other caller must not see them
+    first["generated_state"]["generated_content"][0]["id"] = "section-1"
+    assert "id" not in second["generated_state"]["generated_content"][0]
+    assert "id" not in task.result()["generated_state"]["generated_content"][0]
+
+
+@pytest.mark.anyio
+async def test_failed_run_is_forgotten(in_flight):
+    runs = Runs()
+    runs.error = RuntimeError("provider down")
+    _, task, _ = join_or_start_run("generate", BODY, "run-1", None, runs)
+    _, joined, _ = join_or_start_run("generate", BODY, "run-2", None, runs)
+    runs.release.set()
+    for run in (task, joined):
+        with pytest.raises(RuntimeError):
+            await run_result(run)
+    await asyncio.sleep(0)
+    assert in_flight == {}
+
+    # The retry starts a fresh run instead of joining the failed one
+    runs.error = None
+    run_id, retry, _ = join_or_start_run("generate", BODY, "run-3", None, runs)
+    assert run_id == "run-3" and retry is not task
+    assert (await run_result(retry))["run_id"] == "run-3"
+    assert runs.started == ["run-1", "run-3"]
+
+
+@pytest.mark.anyio
+async def test_cancelled_caller_leaves_the_shared_run_going(in_flight):
+    runs = Runs()
+    _, task, _ = join_or_start_run("generate", BODY, "run-1", None, runs)
+    _, joined, _ = join_or_start_run("generate", BODY, "run-2", None, runs)
+
+    leaving = asyncio.create_task(run_result(task))
+    staying = asyncio.create_task(run_result(joined))
+    await asyncio.sleep(0)
+    leaving.cancel()  # the client disconnected
+    await asyncio.sleep(0)
+
+    assert leaving.cancelled()
+    assert not task.cancelled()
+    assert len(in_flight) == 1  # a new identical request still joins it
+
+    runs.release.set()
+    assert (await staying)["run_id"] == "run-1"
+    assert runs.started == ["run-1"]
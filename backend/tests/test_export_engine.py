@@ -0,0 +1,197 @@
+import io
+
+import pytest
+from docx import Document
+from docx.oxml.ns import qn
+from pptx import Presentation
+
+from app.datamodels import Section
+from app.service import export_engine
+from app.service.export_engine import DocxTemplate, PptxTemplate
+
+
+@pytest.fixture(scope="module")
+def docx_template():
+    return DocxTemplate()
+
+
+@pytest.fixture(scope="module")
+def pptx_template():
+    return PptxTemplate()
+
+
+def section(name, content):
+    return Section(id=name.lower(), section_name=name, content=content)
+
+
+def render(template, sections):
+    buffer = io.BytesIO()
+    template.render(sections, buffer)
+    return buffer
+
+
+# ---- docx ----
+
+def numbering(paragraph):
+    """ (numId, ilvl) of a list paragraph, or None """
+    numPr = paragraph._p.find(f"{qn('w:pPr')}/{qn('w:numPr')}")
+    if numPr is None:
+        return None
+    return numPr.find(qn("w:numId")).get(qn("w:val")), int(numPr.find(qn("w:ilvl")).get(qn("w:val")))
+
+
+def test_docx_sections_headings_and_text(docx_template):
+    doc = Document(render(docx_template, [
+        section("Intro", "## Background\nSome **bold** text."),
+        section("Results", "Plain paragraph."),
+    ]))
+    texts = [p.text for p in doc.paragraphs if p.text]
+    assert texts == ["Intro", "Background", "Some bold text.", "Results", "Plain paragraph."]
+    body = doc.paragraphs[2]
+    assert [(run.text, bool(run.bold)) for run in body.runs] == [("Some ", False), ("bold", True), (" text.", False)]
+
+
+def test_docx_each_numbered_list_restarts(docx_template):
+    assert docx_template.number_abstract_id is not None
+    doc = Document(render(docx_template, [
+        section("Steps", "1. one\n2. two\n   1. two.a\n\nBetween lists.\n\n1. again\n2. more"),
+    ]))
+    numbered = [(p.text, numbering(p)) for p in doc.paragraphs if numbering(p)]
+    first, second = numbered[0][1][0], numbered[3][1][0]
+    assert first != second
+    assert numbered == [
+        ("one", (first, 0)),
+        ("two", (first, 0)),
+        ("two.a", (first, 1)),
+        ("again", (second, 0)),
+        ("more", (second, 0)),
+    ]
+    # Each list's w:num restarts its first level at 1
+    nums = doc.part.numbering_part.element
+    for num_id in (first, second):
+        start = nums.num_having_numId(int(num_id)).find(f"{qn('w:lvlOverride')}/{qn('w:startOverride')}")
+        assert start.get(qn("w:val")) == "1"
+
+
+def test_docx_table_with_bold_header(docx_template):
+    doc = Document(render(docx_template, [
+        section("Data", "| Name | Score |\n|---|---|\n| A | 1 |\n| B | *2* |"),
+    ]))
+    assert len(doc.tables) == 1
+    table = doc.tables[0]
+    assert [[cell.text for cell in row.cells] for row in table.rows] == [["Name", "Score"], ["A", "1"], ["B", "2"]]
+    assert all(run.bold for run in table.rows[0].cells[0].paragraphs[0].runs)
+    assert table.rows[2].cells[1].paragraphs[0].runs[0].italic
+
+
+def test_docx_code_block_keeps_lines(docx_template):
+    doc = Document(render(docx_template, [section("Code", "```\nx = 1\ny = 2\n```")]))
+    code = [p for p in doc.paragraphs if p.style.name == export_engine.CODE_STYLE]
+    assert len(code) == 1
+    assert code[0]._p.xpath("count(.//w:br)") == 1
+
+
+# ---- pptx ----
+
+def slide_titles(prs):
+    return [slide.shapes.title.text for slide in prs.slides]
+
+
+def test_pptx_long_section_continues_on_new_slides(pptx_template):
+    content = "\n".join(f"- point {i}" for i in range(export_engine.PPTX_MAX_LINES * 2 + 1))
+    prs = Presentation(render(pptx_template, [section("Intro", "Short."), section("Points", content)]))
+    assert slide_titles(prs) == ["Intro", "Points", "Points (cont.)", "Points (cont.)"]
+    for slide in list(prs.slides)[1:]:
+        assert len(slide.placeholders[1].text_frame.paragraphs) <= export_engine.PPTX_MAX_LINES
+
+
+def test_pptx_overlong_paragraph_is_split_at_words(pptx_template):
+    words = " ".join(["word"] * (export_engine.PPTX_MAX_LINES * export_engine.PPTX_CHARS_PER_LINE // 4))
+    prs = Presentation(render(pptx_template, [section("Essay", words)]))
+    assert slide_titles(prs)[:2] == ["Essay", "Essay (cont.)"]
+    text = " ".join(slide.placeholders[1].text_frame.text for slide in prs.slides)
+    assert text.split() == words.split()
+
+
+def test_pptx_numbered_list_uses_auto_numbering(pptx_template):
+    prs = Presentation(render(pptx_template, [section("Steps", "1. one\n   1. nested\n- bullet")]))
+    paragraphs = prs.slides[0].placeholders[1].text_frame.paragraphs
+    assert [(p.text, p.level) for p in paragraphs] == [("one", 0), ("nested", 1), ("bullet", 0)]
+    auto = [p._p.find(f"{qn('a:pPr')}/{qn('a:buAutoNum')}") is not None for p in paragraphs]
+    assert auto == [True, True, False]
+
+
+def test_pptx_table_replaces_the_body_and_later_text_moves_on(pptx_template):
+    rows = "\n".join(f"| r{i} | {i} |" for i in range(export_engine.PPTX_MAX_LINES + 2))
+    content = f"Intro text.\n\n| Name | Value |\n|---|---|\n{rows}\n\nAfter the table."
+    prs = Presentation(render(pptx_template, [section("Data", content)]))
+    slides = list(prs.slides)
+    assert slide_titles(prs) == ["Data"] + ["Data (cont.)"] * 3
+
+    tables = [shape.table for slide in slides for shape in slide.shapes if shape.has_table]
+    assert len(tables) == 2  # rows beyond a slide continue in a second table
+    for table in tables:
+        assert table.cell(0, 0).text == "Name"
+        assert table.cell(0, 0).text_frame.paragraphs[0].runs[0].font.bold
+    assert sum(len(table.rows) - 1 for table in tables) == export_engine.PPTX_MAX_LINES + 2
+    assert slides[-1].placeholders[1].text_frame.text == "After the table."
+
+
+# ---- template cache ----
+
+def docx_bytes(title):
+    doc = Document()
+    doc.core_properties.title = title
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def test_relative_template_dir_is_taken_from_backend(tmp_path):
+    backend = export_engine.Path(export_engine.__file__).resolve().parents[2]
+    assert export_engine.TemplateCache("templates").template_dir == str(backend / "templates")
+    assert export_engine.TemplateCache(str(tmp_path)).template_dir == str(tmp_path)
+
+
+def test_reupload_is_picked_up_by_other_processes(tmp_path):
+    uploader, other = export_engine.TemplateCache(str(tmp_path)), export_engine.TemplateCache(str(tmp_path))
+    uploader.add("docx", "brand", docx_bytes("first"))
+    compiled = other.get("docx", "brand")
+    assert other.get("docx", "brand") is compiled  # unchanged file: compiled once
+
+    uploader.add("docx", "brand", docx_bytes("second version"))
+    assert other.get("docx", "brand") is not compiled
+    assert list(tmp_path.iterdir()) == [tmp_path / "brand.docx"]  # no upload temp file left behind
+
+
+def test_missing_or_invalid_template_names(tmp_path):
+    cache = export_engine.TemplateCache(str(tmp_path))
+    cache.check("docx")
+    for name in ("nope", "../etc"):
+        with pytest.raises(export_engine.TemplateNotFoundError):
+            cache.check("docx", name)
+        with pytest.raises(export_engine.TemplateNotFoundError):
+            cache.get("docx", name)
+
+
+@pytest.mark.anyio
+async def test_template_upload_size_limit(monkeypatch, tmp_path):
+    from fastapi import HTTPException, UploadFile
+
+    from app import main
+
+    cache = export_engine.TemplateCache(str(tmp_path))
+
+    async def load_template_cache():
+        return cache
+
+    monkeypatch.setattr(main, "load_template_cache", load_template_cache)
+    data = docx_bytes("brand")
+    monkeypatch.setattr(main, "EXPORT_TEMPLATE_MAX_BYTES", len(data) - 1)
+    with pytest.raises(HTTPException) as error:
+        await main.upload_template(UploadFile(io.BytesIO(data), filename="brand.docx"))
+    assert error.value.status_code == 413
+    assert not (tmp_path / "brand.docx").exists()
+
+    monkeypatch.setattr(main, "EXPORT_TEMPLATE_MAX_BYTES", len(data))
+    assert await main.upload_template(UploadFile(io.BytesIO(data), filename="brand.docx")) == {"template": "brand", "type": "doc"}
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from app import main
+from app.agents import fake_llm, llm_registry as registry
+from app.agents.fake_llm import FakeChatModel, FakeLLMConfig
+from app.datamodels import GenerateStateInput
+from app.service.sse import stream_graph_events
+
+
+def instant_config():
+    config = FakeLLMConfig()
+    config.latency_median = 0
+    config.tokens_per_second = 10**9
+    return config
+
+
+PROMPT = "## User Defined Sample Sections: \n\n1. Intro :\n2. Outlook :"
+
+
+# ---- FakeChatModel ----
+
+@pytest.mark.anyio
+async def test_streamed_chunks_add_up_to_the_reply():
+    model = FakeChatModel(config=instant_config())
+    chunks = [chunk async for chunk in model.astream(PROMPT)]
+    assert len(chunks) > 1
+    # Usage arrives once, with the end of the reply
+    (usage,) = [chunk.usage_metadata for chunk in chunks if chunk.usage_metadata]
+    assert usage["output_tokens"] > 0
+
+    model.reset()
+    reply = await model.ainvoke(PROMPT)
+    assert "".join(chunk.content for chunk in chunks) == reply.content
+    assert [s["section_name"] for s in json.loads(reply.content)["generated_content"]] == ["Intro", "Outlook"]
+
+
+@pytest.mark.anyio
+async def test_prompt_counts_are_per_client_and_bounded(monkeypatch):
+    monkeypatch.setattr(fake_llm, "_MAX_TRACKED_PROMPTS", 3)
+    config = instant_config()
+    config.failure_rate = 0.5
+    first, second = FakeChatModel(config=config), FakeChatModel(config=config)
+
+    async def outcome(model):
+        try:
+            return (await model.ainvoke(PROMPT)).content
+        except fake_llm.FakeLLMError as e:
+            return e.status_code
+
+    draws = [await outcome(first) for _ in range(4)]
+    # Another client starts from the first attempt, so it draws the same outcomes
+    assert [await outcome(second) for _ in range(4)] == draws
+    # Newer prompts push the oldest count out: PROMPT is drawn as a first attempt again
+    config.failure_rate = 0
+    for n in range(3):
+        await first.ainvoke(f"prompt {n}")
+    assert len(first._sent) == 3
+    config.failure_rate = 0.5
+    assert await outcome(first) == draws[0]
+
+
+# ---- streamed endpoint ----
+
+@pytest.mark.anyio
+async def test_generate_stream_emits_partial_sections(monkeypatch):
+    monkeypatch.setattr(registry.llm_registry, "_factory", lambda **kwargs: FakeChatModel(config=instant_config(), **kwargs))
+    monkeypatch.setattr(registry.llm_registry, "_clients", {})
+    wf = await main.load_workflow()
+    req = GenerateStateInput(main_topic="Quarterly review", sections=[
+        {"section_name": "Intro", "description": "a"}, {"section_name": "Outlook", "description": "b"},
+    ])
+
+    async def build_payload(result):
+        return {"sections": [s["section_name"] for s in result["generated_state"]["generated_content"]]}
+
+    frames = [frame async for frame in stream_graph_events(wf.chain, main.generate_input_state(req), build_payload)]
+    events = [frame.split("\n")[0].removeprefix("event: ") for frame in frames]
+    assert "partial" in events
+    assert events.index("partial") < events.index("result") == len(events) - 1
+    result = json.loads(frames[-1].split("data: ", 1)[1])
+    assert result == {"sections": ["Intro", "Outlook"]}
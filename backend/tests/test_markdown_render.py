@@ -0,0 +1,162 @@
+from app.service.markdown_render import MAX_LIST_LEVEL, iter_blocks, parse_inline
+
+
+def blocks(text):
+    return list(iter_blocks(text))
+
+
+# ---- iter_blocks ----
+
+def test_headings_keep_their_level_and_drop_closing_hashes():
+    assert blocks("# Title\n### Sub ###\n###### Deep") == [
+        ("heading", 1, "Title"),
+        ("heading", 3, "Sub"),
+        ("heading", 6, "Deep"),
+    ]
+
+
+def test_hash_without_space_is_paragraph_text():
+    assert blocks("#hashtag") == [("paragraph", 0, "#hashtag")]
+
+
+def test_paragraph_lines_are_joined_until_a_blank_line():
+    assert blocks("first line\nsecond line\n\nnext paragraph") == [
+        ("paragraph", 0, "first line second line"),
+        ("paragraph", 0, "next paragraph"),
+    ]
+
+
+def test_nested_bullets_take_their_level_from_the_indent():
+    text = "- top\n  - nested\n    - deeper\n        - capped"
+    assert blocks(text) == [
+        ("bullet", 0, "top"),
+        ("bullet", 1, "nested"),
+        ("bullet", 2, "deeper"),
+        ("bullet", MAX_LIST_LEVEL, "capped"),
+    ]
+
+
+def test_numbered_list_nested_in_bullets():
+    text = "* item\n  1. first\n  2) second\n+ other"
+    assert blocks(text) == [
+        ("bullet", 0, "item"),
+        ("number", 1, "first"),
+        ("number", 1, "second"),
+        ("bullet", 0, "other"),
+    ]
+
+
+def test_list_item_continues_on_the_next_plain_line():
+    assert blocks("1. starts here\nand wraps\n2. next") == [
+        ("number", 0, "starts here and wraps"),
+        ("number", 0, "next"),
+    ]
+
+
+def test_code_fence_is_copied_verbatim():
+    text = "before\n```python\n# not a heading\n- not a bullet\n\n    indented\n```\nafter"
+    assert blocks(text) == [
+        ("paragraph", 0, "before"),
+        ("code", 0, "# not a heading\n- not a bullet\n\n    indented"),
+        ("paragraph", 0, "after"),
+    ]
+
+
+def test_unclosed_fence_runs_to_the_end():
+    assert blocks("~~~\ncode\nmore") == [("code", 0, "code\nmore")]
+
+
+def test_table_needs_a_separator_row():
+    text = "| Name | Score |\n|:-----|------:|\n| A | 1 |\n| B | 2 |\nafter"
+    assert blocks(text) == [
+        ("table", 0, [["Name", "Score"], ["A", "1"], ["B", "2"]]),
+        ("paragraph", 0, "after"),
+    ]
+
+
+def test_pipe_row_without_separator_is_text():
+    assert blocks("| not | a table |\n| still | text |") == [
+        ("paragraph", 0, "| not | a table | | still | text |"),
+    ]
+
+
+def test_quote_lines_are_joined():
+    assert blocks("> one\n> two\nplain") == [
+        ("quote", 0, "one two"),
+        ("paragraph", 0, "plain"),
+    ]
+
+
+def test_horizontal_rule_ends_a_block_and_is_dropped():
+    assert blocks("above\n---\nbelow") == [
+        ("paragraph", 0, "above"),
+        ("paragraph", 0, "below"),
+    ]
+
+
+def test_empty_text():
+    assert blocks("") == []
+    assert blocks(None) == []
+
+
+# ---- parse_inline ----
+
+def test_plain_text_is_one_run():
+    assert parse_inline("just text") == [("just text", False, False, False)]
+
+
+def test_bold_italic_and_code_runs():
+    assert parse_inline("a **b** *c* `d` ***e***") == [
+        ("a ", False, False, False),
+        ("b", True, False, False),
+        (" ", False, False, False),
+        ("c", False, True, False),
+        (" ", False, False, False),
+        ("d", False, False, True),
+        (" ", False, False, False),
+        ("e", True, True, False),
+    ]
+
+
+def test_underscore_emphasis_only_at_word_boundaries():
+    assert parse_inline("__bold__ _it_ snake_case_name") == [
+        ("bold", True, False, False),
+        (" ", False, False, False),
+        ("it", False, True, False),
+        (" snake_case_name", False, False, False),
+    ]
+
+
+def test_italic_inside_bold():
+    assert parse_inline("**bold *both* bold**") == [
+        ("bold ", True, False, False),
+        ("both", True, True, False),
+        (" bold", True, False, False),
+    ]
+
+
+def test_links_keep_their_label():
+    assert parse_inline("see [the **docs**](https://example.com)") == [
+        ("see ", False, False, False),
+        ("the ", False, False, False),
+        ("docs", True, False, False),
+    ]
+
+
+def test_unpaired_markers_stay_literal():
+    assert parse_inline("2 * 3 = 6") == [("2 * 3 = 6", False, False, False)]
+    assert parse_inline("**open bold") == [("**open bold", False, False, False)]
+    assert parse_inline("a *b") == [("a *b", False, False, False)]
+
+
+def test_italic_ends_at_the_first_closing_marker():
+    assert parse_inline("*a* and *b*") == [
+        ("a", False, True, False),
+        (" and ", False, False, False),
+        ("b", False, True, False),
+    ]
+    assert parse_inline("_a_ and _b_") == [
+        ("a", False, True, False),
+        (" and ", False, False, False),
+        ("b", False, True, False),
+    ]
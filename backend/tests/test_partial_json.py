@@ -0,0 +1,162 @@
+import json
+
+import pytest
+
+from app.agents import workflow
+from app.agents.partial_json import PartialJSONError, scan_fields, scan_list
+from app.agents.workflow import GeneratedConfig, SemanticChangeConfig
+
+
+def reply(*items, key="generated_content"):
+    return '{"%s": [%s]}' % (key, ", ".join(items))
+
+
+def section(name, content):
+    return json.dumps({"section_name": name, "content": content})
+
+
+# ---- scan_list ----
+
+def test_complete_list():
+    scan = scan_list(reply(section("A", "a"), section("B", "b")), "generated_content", GeneratedConfig)
+    assert scan.items == [{"section_name": "A", "content": "a"}, {"section_name": "B", "content": "b"}]
+    assert scan.order == ["A", "B"]
+    assert (scan.found, scan.complete, scan.broken, scan.unreadable) == (True, True, [], 0)
+
+
+def test_truncated_object_keeps_the_items_before_it():
+    text = reply(section("A", "a"), section("B", "b"))[:-12]  # cut inside B's content
+    scan = scan_list(text, "generated_content", GeneratedConfig)
+    assert scan.items == [{"section_name": "A", "content": "a"}]
+    assert scan.broken == ["B"]
+    assert scan.order == ["A", "B"]
+    assert not scan.complete
+
+
+def test_truncated_before_the_name_is_unreadable():
+    text = reply(section("A", "a"))[:-2] + ', {"sect'
+    scan = scan_list(text, "generated_content", GeneratedConfig)
+    assert [item["section_name"] for item in scan.items] == ["A"]
+    assert (scan.broken, scan.unreadable, scan.complete) == ([], 1, False)
+
+
+def test_escaped_quotes_and_braces_inside_strings():
+    tricky = section('Say "hi" {now}', 'a } , {"not": "an item"} [ ]')
+    scan = scan_list(reply(tricky, section("B", "b")), "generated_content", GeneratedConfig)
+    assert [item["section_name"] for item in scan.items] == ['Say "hi" {now}', "B"]
+    assert scan.items[0]["content"] == 'a } , {"not": "an item"} [ ]'
+    assert scan.complete
+
+
+def test_broken_item_is_skipped_up_to_the_next_item():
+    broken = '{"section_name": "A", "content": "has {braces} and "bad" quotes"}'
+    scan = scan_list(reply(broken, section("B", "b"), section("C", "c")), "generated_content", GeneratedConfig)
+    assert [item["section_name"] for item in scan.items] == ["B", "C"]
+    assert scan.broken == ["A"]
+    assert scan.order == ["A", "B", "C"]
+    assert scan.complete
+
+
+def test_nested_arrays_inside_an_item():
+    item = json.dumps({"section_name": "A", "content": "a", "extra": [[1, 2], [3, [4, []]]]})
+    scan = scan_list(reply(item, section("B", "b")), "generated_content", GeneratedConfig)
+    assert scan.items == [{"section_name": "A", "content": "a"}, {"section_name": "B", "content": "b"}]
+    assert scan.complete
+
+
+def test_item_that_parses_but_fails_the_schema_is_broken():
+    scan = scan_list(
+        reply('{"section_name": "A", "content": 3}', '{"section_name": "B"}', section("C", "c")),
+        "generated_content", GeneratedConfig,
+    )
+    assert [item["section_name"] for item in scan.items] == ["C"]
+    assert scan.broken == ["A", "B"]
+    assert scan.complete
+
+
+def test_missing_key():
+    scan = scan_list('{"other": []}', "generated_content", GeneratedConfig)
+    assert (scan.found, scan.items) == (False, [])
+
+
+# ---- scan_fields ----
+
+def test_scan_fields_reads_what_decodes():
+    text = '{"coherency_score": 0.8, "tags": [["a"], ["b", ["c"]]], "next_action": "semantic_refine", "evaluator_diagnostic_summary": "cut'
+    assert scan_fields(text, ("coherency_score", "tags", "next_action", "evaluator_diagnostic_summary", "absent")) == {
+        "coherency_score": 0.8,
+        "tags": [["a"], ["b", ["c"]]],
+        "next_action": "semantic_refine",
+    }
+
+
+# ---- _salvage_evaluation ----
+
+def issue(name):
+    return json.dumps({"section_name": name, "issue": "vague", "suggestion": "be specific"})
+
+
+def test_salvage_keeps_the_readable_issues():
+    text = (
+        '{"coherency_score": 0.6, "next_action": "semantic_refine", '
+        + reply(issue("A"), issue("B"), key="semantic_issues")[1:-2]
+    )[:-10]  # cut inside B
+    eval_data = workflow._salvage_evaluation(text)
+    assert eval_data["coherency_score"] == 0.6
+    assert [i["section_name"] for i in eval_data["semantic_issues"]] == ["A"]
+    assert eval_data["structural_changes"] == "None"
+    assert eval_data["evaluator_diagnostic_summary"] == "(evaluation reply was cut off)"
+
+
+def test_salvage_gives_up_without_score_or_backing_list():
+    assert workflow._salvage_evaluation('{"next_action": "no_action", "coherency_score": "high"}') is None
+    assert workflow._salvage_evaluation('{"coherency_score": 0.6, "next_action": "semantic_refine", "semantic_issues": [{"sec') is None
+    assert workflow._salvage_evaluation('{"coherency_score": 0.6, "next_action": "maybe"}') is None
+
+
+# ---- aread_sections ----
+
+@pytest.fixture
+def resent(monkeypatch):
+    """ Replaces the LLM: every re-sent prompt gets `replies[name]` back """
+    calls = []
+    replies = {}
+
+    async def ainvoke_llm(node, prompt):
+        calls.append(prompt)
+        name = prompt.split("\n")[0]
+        return replies[name]
+
+    monkeypatch.setattr(workflow, "ainvoke_llm", ainvoke_llm)
+    monkeypatch.setattr(workflow, "JSON_REPAIR", True)
+    return calls, replies
+
+
+@pytest.mark.anyio
+async def test_aread_sections_resends_only_unreadable_replies(resent):
+    calls, replies = resent
+    replies["A"] = section("A", "fixed")
+    contents = {"A": '{"section_name": "A"}', "B": section("B", "b")}  # A parses but has no content
+    assert await workflow.aread_sections("semantic_refine", {"A": "A", "B": "B"}, contents) == {"A": "fixed", "B": "b"}
+    assert calls == [f"A\n\n{workflow.REPAIR_NOTE}"]
+
+
+@pytest.mark.anyio
+async def test_aread_sections_fails_after_the_repair_attempts(resent):
+    calls, replies = resent
+    replies["A"] = '{"section_name": "A", "content": "cut'
+    with pytest.raises(PartialJSONError):
+        await workflow.aread_sections("semantic_refine", {"A": "A"}, {"A": replies["A"]})
+    assert len(calls) == workflow.JSON_REPAIR_ATTEMPTS
+
+
+# ---- response cache ----
+
+def test_only_schema_valid_replies_are_cacheable():
+    assert workflow._valid_reply("generate_section", section("A", "a"))
+    assert not workflow._valid_reply("generate_section", '{"section_name": "A"}')
+    assert not workflow._valid_reply("generate_section", section("A", "a")[:-3])
+    issues = json.dumps({"section_name": "A", "issue": "x"})
+    evaluation = '{"coherency_score": 0.5, "semantic_issues": [%s], "structural_changes": "None", "next_action": "semantic_refine", "evaluator_diagnostic_summary": ""}'
+    assert not workflow._valid_reply("evaluator", evaluation % issues)
+    assert workflow._valid_reply("evaluator", evaluation % issue("A"))
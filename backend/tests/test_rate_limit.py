@@ -0,0 +1,204 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.agents import rate_limit, workflow
+from app.agents.fake_llm import FakeChatModel, FakeLLMConfig, FakeLLMError
+from app.agents.model_routing import model_router
+from app.agents.rate_limit import RateLimiter, SlidingWindow
+
+
+class Clock:
+    """ Stands in for the time module inside rate_limit, so windows expire on demand """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+async def settle_tasks():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def wake(limiter, model):
+    """ What a window expiring would do for the first call in line """
+    with limiter._lock:
+        limiter._wake_first(limiter._model(model))
+
+
+# ---- SlidingWindow ----
+
+def test_window_waits_until_enough_usage_expires():
+    window = SlidingWindow(10)
+    window.add(0, 6)
+    window.add(30, 4)
+    assert window.wait_for(31, 3, 1.0) == 29  # the first entry must go
+    assert window.wait_for(31, 50, 1.0) == 59  # more than the limit waits for an empty window
+    window.expire(59.9)
+    assert window.used == 10
+    window.expire(60)
+    assert window.used == 4
+    assert window.wait_for(60, 3, 1.0) == 0
+    assert window.wait_for(60, 3, 0.5) == 30  # a throttled limit of 5 needs the second entry gone too
+
+
+def test_window_adjust_only_inside_the_window():
+    window = SlidingWindow(100)
+    entry = window.add(0, 50)
+    window.adjust(10, entry, -40)
+    assert (window.used, entry[1]) == (10, 10)
+    window.adjust(61, entry, 30)
+    assert window.used == 0
+
+
+# ---- RateLimiter ----
+
+@pytest.mark.anyio
+async def test_waiting_calls_are_granted_by_lane_then_arrival(clock):
+    limiter = RateLimiter(limits={}, default_rpm=1, default_tpm=10**9)
+    await limiter.aacquire("m", 1)  # fills the one-request window
+
+    order = []
+
+    async def call(name, lane):
+        await limiter.aacquire("m", 1, lane=lane)
+        order.append(name)
+
+    lanes = [("bulk-1", "bulk"), ("default", "default"), ("interactive-1", "interactive"),
+             ("bulk-2", "bulk"), ("interactive-2", "interactive")]
+    tasks = []
+    for name, lane in lanes:
+        tasks.append(asyncio.create_task(call(name, lane)))
+        await settle_tasks()
+    assert order == []
+
+    for granted in range(1, len(lanes) + 1):
+        clock.now += 60
+        wake(limiter, "m")
+        while len(order) < granted:
+            await asyncio.sleep(0)
+        await settle_tasks()
+        assert len(order) == granted  # one request per window
+
+    assert order == ["interactive-1", "interactive-2", "default", "bulk-1", "bulk-2"]
+    await asyncio.gather(*tasks)
+    assert limiter.stats()["google:m"]["waiting"] == 0
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_leaves_the_line(clock):
+    limiter = RateLimiter(limits={}, default_rpm=1, default_tpm=10**9)
+    await limiter.aacquire("m", 1)
+    first = asyncio.create_task(limiter.aacquire("m", 1, lane="interactive"))
+    second = asyncio.create_task(limiter.aacquire("m", 1, lane="bulk"))
+    await settle_tasks()
+    first.cancel()
+    await settle_tasks()
+    clock.now += 60
+    wake(limiter, "m")
+    await asyncio.wait_for(second, 1)
+    assert limiter.stats()["google:m"]["waiting"] == 0
+
+
+@pytest.mark.anyio
+async def test_asettle_replaces_the_estimate_with_real_usage(clock):
+    limiter = RateLimiter(limits={}, default_rpm=10**6, default_tpm=1000)
+    reservation = await limiter.aacquire("m", 800)
+    model = limiter._model("m")
+    assert model.tokens.used == 800
+
+    # Doesn't fit next to the 800 estimate
+    waiter = asyncio.create_task(limiter.aacquire("m", 500))
+    await settle_tasks()
+    assert not waiter.done()
+
+    await limiter.asettle(reservation, {"input_tokens": 100, "output_tokens": 50})
+    assert reservation.entry[1] == 150
+    second = await asyncio.wait_for(waiter, 1)
+    assert model.tokens.used == 650
+    assert second.waited >= 0
+
+
+def test_429_halves_the_throttle_down_to_a_floor():
+    limiter = RateLimiter(limits={}, default_rpm=100, default_tpm=10**9)
+    limiter.on_rate_limited("m")
+    limiter.on_rate_limited("m")
+    assert limiter.stats()["google:m"]["throttle"] == 0.25
+    for _ in range(100):
+        limiter.on_rate_limited("m")
+    assert limiter.stats()["google:m"]["throttle"] == rate_limit._MIN_THROTTLE
+
+
+# ---- retries against the fake LLM ----
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """ ainvoke_llm against a FakeChatModel that answers 429, with recorded (instant) backoff """
+    config = FakeLLMConfig()
+    config.latency_median = 0
+    config.tokens_per_second = 10**9
+    config.rate_limit_rate = 1.0
+    model = FakeChatModel(response_schema={"title": "GeneratedConfig"}, config=config)
+    backoffs = []
+
+    def backoff_seconds(attempt, base):
+        backoffs.append(attempt)
+        return 0
+
+    limiter = RateLimiter(limits={}, default_rpm=10**6, default_tpm=10**9)
+    monkeypatch.setattr(workflow.llm_registry, "get", lambda *args, **kwargs: model)
+    monkeypatch.setattr(workflow, "rate_limiter", limiter)
+    monkeypatch.setattr(workflow, "backoff_seconds", backoff_seconds)
+    monkeypatch.setattr(workflow, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(model_router, "_routes", {})
+    monkeypatch.setattr(model_router, "_failures", {})
+    monkeypatch.setattr(model_router, "_open_until", {})
+    return config, limiter, backoffs
+
+
+def prompt():
+    # Unique, so the response cache never answers
+    return f"## Section: 1. {uuid.uuid4()}"
+
+
+@pytest.mark.anyio
+async def test_429s_back_off_and_throttle_until_retries_run_out(fake_llm):
+    config, limiter, backoffs = fake_llm
+    with pytest.raises(FakeLLMError) as error:
+        await workflow.ainvoke_llm("generate_section", prompt())
+    assert error.value.status_code == 429
+    assert backoffs == [0, 1]  # exponential backoff attempt numbers
+    (stats,) = limiter.stats().values()
+    assert (stats["rate_limited"], stats["granted"], stats["throttle"]) == (3, 3, 0.125)
+
+
+@pytest.mark.anyio
+async def test_call_succeeds_after_backing_off_a_429(fake_llm, monkeypatch):
+    config, limiter, backoffs = fake_llm
+
+    def backoff_seconds(attempt, base):
+        backoffs.append(attempt)
+        config.rate_limit_rate = 0  # the provider recovers while we wait
+        return 0
+
+    monkeypatch.setattr(workflow, "backoff_seconds", backoff_seconds)
+    content = await workflow.ainvoke_llm("generate_section", prompt())
+    assert workflow._valid_reply("generate_section", content)
+    assert backoffs == [0]
+    (stats,) = limiter.stats().values()
+    assert stats["rate_limited"] == 1
+    assert stats["throttle"] == 0.5 + rate_limit._THROTTLE_RECOVERY
@@ -0,0 +1,183 @@
+import io
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from app.agents.shared_state import MemoryState, RedisState, SharedStateError, SQLiteState
+
+
+# ---- RESP encoding and decoding ----
+
+def reader_for(data):
+    client = RedisState()
+    client._reader = io.BytesIO(data)
+    return client
+
+
+def test_encode_commands_as_bulk_string_arrays():
+    assert RedisState._encode(("SET", "k", "v", "PX", 1500)) == (
+        b"*5\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\nv\r\n$2\r\nPX\r\n$4\r\n1500\r\n"
+    )
+    # Lengths are in bytes, and CRLF inside a value is just data
+    assert RedisState._encode(("SET", "clé", "a\r\nb")) == "*3\r\n$3\r\nSET\r\n$4\r\nclé\r\n$4\r\na\r\nb\r\n".encode()
+
+
+def test_decode_every_reply_type():
+    client = reader_for(
+        b"+OK\r\n:42\r\n$-1\r\n$5\r\nh\xc3\xa9\r\n\r\n*-1\r\n"
+        b"*3\r\n$1\r\na\r\n$-1\r\n*2\r\n:1\r\n$0\r\n\r\n"
+    )
+    assert client._read_reply() == "OK"
+    assert client._read_reply() == 42
+    assert client._read_reply() is None
+    assert client._read_reply() == "hé\r\n"
+    assert client._read_reply() is None
+    assert client._read_reply() == ["a", None, [1, ""]]
+
+
+def test_error_reply_raises():
+    with pytest.raises(SharedStateError, match="WRONGTYPE"):
+        reader_for(b"-WRONGTYPE Operation against a key\r\n")._read_reply()
+
+
+@pytest.mark.parametrize("data", [b"", b"+OK", b"$5\r\nab", b"*2\r\n:1\r\n"])
+def test_closed_connection_mid_reply_raises(data):
+    with pytest.raises(ConnectionError):
+        reader_for(data)._read_reply()
+
+
+# ---- against a server ----
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """ Just enough of a Redis server: GET, MGET, SET (NX, PX ignored), DEL, INCRBY """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.commands = []
+        self.drop_after = None  # command name: run it, then close the connection without replying
+        self.connections = []
+
+    def run(self, command):
+        name, args = command[0].upper(), command[1:]
+        self.commands.append(name)
+        if name == "GET":
+            return self.data.get(args[0])
+        if name == "MGET":
+            return [self.data.get(key) for key in args]
+        if name == "SET":
+            if "NX" in args[2:] and args[0] in self.data:
+                return None
+            self.data[args[0]] = args[1]
+            return "+OK"
+        if name == "DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if name == "INCRBY":
+            self.data[args[0]] = str(int(self.data.get(args[0], 0)) + int(args[1]))
+            return int(self.data[args[0]])
+        raise ValueError(name)
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.connections.append(self.request)
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                command.append(self.rfile.read(length + 2)[:-2].decode())
+            reply = self.server.run(command)
+            if self.server.drop_after == command[0].upper():
+                self.request.shutdown(socket.SHUT_RDWR)
+                return
+            self.wfile.write(encode_reply(reply))
+
+
+def encode_reply(reply):
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(encode_reply(item) for item in reply)
+    if reply.startswith("+"):
+        return reply.encode() + b"\r\n"
+    data = reply.encode()
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+@pytest.fixture
+def server():
+    server = FakeRedis()
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = RedisState("127.0.0.1", server.server_address[1], timeout=2)
+    yield client
+    client._close()
+
+
+def test_commands_round_trip(client):
+    client.set("a", "1")
+    assert client.add("b", "x", ttl=10)
+    assert not client.add("b", "y", ttl=10)
+    assert client.get_many(["a", "b", "missing"]) == ["1", "x", None]
+    assert client.incr("n", 5, ttl=60) == 5
+    assert client.incr("n", 2) == 7
+    client.delete("a")
+    assert client.get("a") is None
+
+
+def test_reconnects_when_the_server_closed_an_idle_connection(client, server):
+    client.set("a", "1")
+    for connection in server.connections:
+        connection.shutdown(socket.SHUT_RDWR)
+    assert client.get("a") == "1"
+    assert len(server.connections) == 2
+
+
+def test_a_command_lost_after_sending_is_not_sent_again(client, server):
+    assert client.incr("n", 1) == 1
+    server.drop_after = "INCRBY"
+    with pytest.raises(SharedStateError):
+        client.incr("n", 1)
+    server.drop_after = None
+    # Ran once on the server; the client didn't resend it
+    assert server.commands.count("INCRBY") == 2
+    assert client.get("n") == "2"
+
+
+def test_unreachable_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(SharedStateError, match="unreachable"):
+        RedisState("127.0.0.1", port, timeout=1).get("a")
+
+
+# ---- local backends ----
+
+@pytest.mark.parametrize("make_state", [MemoryState, lambda: SQLiteState(":memory:")], ids=["memory", "sqlite"])
+def test_local_backends_share_the_interface(make_state):
+    state = make_state()
+    assert state.add("lease", "1", ttl=60)
+    assert not state.add("lease", "2", ttl=60)
+    assert state.incr("n", 3, ttl=60) == 3
+    assert state.incr("n", -1) == 2
+    state.set("a", "x")
+    assert state.get_many(["a", "lease", "missing"]) == ["x", "1", None]
+    state.delete("a", "lease")
+    assert state.get("a") is None and state.add("lease", "3")